@@ -0,0 +1,182 @@
+"""
+由逐条提问记录聚合媒体指标（media_indicators.csv）
+
+输入为逐条提问记录（CSV 或 JSONL，可多个文件或标准输入），按块流式读取，
+每块向量化分组求和后累加到按媒体的计数表中，内存占用只与媒体数×议题类别数有关；
+议题熵由计数一次算出：H = ln N − Σ nᵢ·ln nᵢ / N（自然对数）
+
+输入字段:
+    media_name        媒体名称
+    stance_label      立场标签（Counter / Aligned / Neutral，非涉台提问可为空）
+    aligned_score     一致语义得分
+    counter_score     对立语义得分
+    neutral_score     中立语义得分
+    issue_category    议题类别（如 EI_1_外国政府涉台立法，其他类别原样计入熵，缺失记为"其他"）
+    question_length   提问长度
+    is_taiwan         可选，是否涉台提问；缺失时以 stance_label 非空判断
+
+指标口径:
+    media_total_questions   全部提问数
+    media_taihai_questions  涉台提问数
+    total_questions         有立场标签的涉台提问数（以下指标均基于这部分提问）
+    *_count / *_ratio       各立场提问数及占比
+    issue_entropy           议题类别分布的熵
+    taiwan_issue_ratio      属于 EI_*/MS_* 议题的提问占比
+    EI_*/MS_*               各议题在 EI_*/MS_* 提问中的占比
+    stance_label            留空，由 convert_csv_to_json 按比例判定
+
+用法:
+    python aggregate_indicators.py questions.csv media_indicators.csv
+    python aggregate_indicators.py q1.jsonl q2.jsonl media_indicators.csv --profiles media_profiles_enhanced.json
+    cat questions.csv | python aggregate_indicators.py - media_indicators.csv
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from convert_media_data import ISSUE_COLUMNS, convert_csv_to_json
+
+STANCES = ['Counter', 'Aligned', 'Neutral']
+SCORE_COLUMNS = ['aligned_score', 'counter_score', 'neutral_score']
+OTHER_CATEGORY = '其他'
+
+# 输出列顺序（与 media_indicators.csv 一致）
+OUTPUT_COLUMNS = [
+    'media_name', 'total_questions', 'counter_count', 'aligned_count', 'neutral_count',
+    'avg_question_length', 'counter_ratio', 'aligned_ratio', 'neutral_ratio', 'issue_entropy',
+    'taiwan_issue_ratio', 'avg_aligned_score', 'avg_counter_score', 'avg_neutral_score'
+] + ISSUE_COLUMNS + ['media_total_questions', 'media_taihai_questions', 'taiwan_question_ratio', 'stance_label']
+
+
+def read_records(path, chunksize, encoding):
+    """按块读取提问记录（.jsonl/.json 为JSON Lines，其余按CSV，- 表示标准输入）"""
+    if path.endswith(('.jsonl', '.json')):
+        return pd.read_json(path, lines=True, chunksize=chunksize, dtype=False)
+    source = sys.stdin.buffer if path == '-' else path
+    return pd.read_csv(source, encoding=encoding, chunksize=chunksize)
+
+
+class IndicatorAccumulator:
+    """按媒体累加的计数与求和（各块结果相加即可合并）"""
+
+    def __init__(self):
+        self.order = {}                  # 媒体首次出现的顺序
+        self.sums = None                 # 按媒体的计数与求和
+        self.issue_counts = None         # 按(媒体, 议题类别)的计数
+        self.records = 0
+
+    @staticmethod
+    def _merge(total, part):
+        return part if total is None else total.add(part, fill_value=0)
+
+    def add_chunk(self, chunk):
+        self.records += len(chunk)
+        media = chunk['media_name'].astype(str)
+        for name in pd.unique(media):
+            self.order.setdefault(name, len(self.order))
+
+        stance = chunk['stance_label'].where(chunk['stance_label'].isin(STANCES))
+        if 'is_taiwan' in chunk:
+            taiwan = chunk['is_taiwan'].fillna(False).astype(bool)
+        else:
+            taiwan = chunk['stance_label'].notna()
+        analyzed = taiwan & stance.notna()
+
+        frame = pd.DataFrame({
+            'media_name': media,
+            'media_total_questions': 1,
+            'media_taihai_questions': taiwan.astype(np.int64),
+            'total_questions': analyzed.astype(np.int64)
+        })
+        for label in STANCES:
+            frame[f'{label.lower()}_count'] = (analyzed & (stance == label)).astype(np.int64)
+        # 长度与得分只统计纳入分析的提问，缺失值不计入均值
+        for column in ['question_length'] + SCORE_COLUMNS:
+            values = pd.to_numeric(chunk[column], errors='coerce').where(analyzed) \
+                if column in chunk else pd.Series(np.nan, index=chunk.index)
+            frame[f'{column}_sum'] = values.fillna(0.0)
+            frame[f'{column}_n'] = values.notna().astype(np.int64)
+
+        self.sums = self._merge(self.sums, frame.groupby('media_name', sort=False).sum())
+
+        category = chunk['issue_category'].where(chunk['issue_category'].notna(), OTHER_CATEGORY) \
+            if 'issue_category' in chunk else pd.Series(OTHER_CATEGORY, index=chunk.index)
+        issues = pd.DataFrame({'media_name': media[analyzed], 'issue_category': category[analyzed].astype(str)})
+        self.issue_counts = self._merge(self.issue_counts, issues.groupby(['media_name', 'issue_category']).size())
+
+    def indicators(self):
+        """由累加结果计算指标表（按媒体首次出现顺序）"""
+        if self.sums is None:
+            return pd.DataFrame(columns=OUTPUT_COLUMNS)
+        names = sorted(self.order, key=self.order.get)
+        sums = self.sums.reindex(names).fillna(0)
+        total = sums['total_questions']
+
+        def ratio(numerator, denominator):
+            return (numerator / denominator.where(denominator > 0)).fillna(0.0)
+
+        result = pd.DataFrame(index=pd.Index(names, name='media_name'))
+        result['total_questions'] = total.astype(np.int64)
+        for label in STANCES:
+            result[f'{label.lower()}_count'] = sums[f'{label.lower()}_count'].astype(np.int64)
+        result['avg_question_length'] = ratio(sums['question_length_sum'], sums['question_length_n'])
+        for label in STANCES:
+            result[f'{label.lower()}_ratio'] = ratio(sums[f'{label.lower()}_count'], total)
+
+        # 熵：H = ln N − Σ n·ln n / N，由计数向量化一次算出
+        counts = self.issue_counts[self.issue_counts > 0] if self.issue_counts is not None else pd.Series(dtype=float)
+        by_media = counts.groupby(level='media_name')
+        n_total = by_media.sum()
+        n_log_n = (counts * np.log(counts)).groupby(level='media_name').sum()
+        entropy = (np.log(n_total) - n_log_n / n_total).clip(lower=0.0)
+        result['issue_entropy'] = entropy.reindex(names).fillna(0.0)
+
+        issue_table = counts.unstack('issue_category', fill_value=0).reindex(names).fillna(0) \
+            if len(counts) else pd.DataFrame(index=names)
+        issue_table = issue_table.reindex(columns=ISSUE_COLUMNS, fill_value=0)
+        categorized = issue_table.sum(axis=1)
+        result['taiwan_issue_ratio'] = ratio(categorized, total)
+        for column in SCORE_COLUMNS:
+            result[f'avg_{column}'] = ratio(sums[f'{column}_sum'], sums[f'{column}_n'])
+        for column in ISSUE_COLUMNS:
+            result[column] = ratio(issue_table[column], categorized)
+
+        result['media_total_questions'] = sums['media_total_questions'].astype(np.int64)
+        result['media_taihai_questions'] = sums['media_taihai_questions'].astype(np.int64)
+        result['taiwan_question_ratio'] = ratio(sums['media_taihai_questions'], sums['media_total_questions'])
+        result['stance_label'] = None
+        return result.reset_index()[OUTPUT_COLUMNS]
+
+
+def aggregate_indicators(input_paths, output_csv_path, chunksize=1000000, encoding='gbk'):
+    """流式聚合提问记录并写出媒体指标CSV，返回指标表"""
+    start_time = time.perf_counter()
+    accumulator = IndicatorAccumulator()
+    for path in input_paths:
+        for chunk in read_records(path, chunksize, encoding):
+            accumulator.add_chunk(chunk)
+            print(f"已处理 {accumulator.records} 条提问记录", file=sys.stderr)
+
+    indicators = accumulator.indicators()
+    indicators.to_csv(output_csv_path, index=False, encoding=encoding)
+    print(f"已聚合 {accumulator.records} 条提问记录为 {len(indicators)} 个媒体指标"
+          f"（耗时 {time.perf_counter() - start_time:.2f}s），输出文件：{output_csv_path}")
+    return indicators
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="由逐条提问记录聚合媒体指标")
+    parser.add_argument("inputs", nargs="+", help="提问记录文件（CSV 或 JSONL，- 表示标准输入）")
+    parser.add_argument("output_csv", help="输出的媒体指标CSV")
+    parser.add_argument("--profiles", help="同时生成媒体档案JSON（增量转换）")
+    parser.add_argument("--chunksize", type=int, default=1000000, help="每次读取的记录数（默认1000000）")
+    parser.add_argument("--encoding", default="gbk", help="CSV编码（默认gbk，与 media_indicators.csv 一致）")
+    args = parser.parse_args()
+
+    aggregate_indicators(args.inputs, args.output_csv, chunksize=args.chunksize, encoding=args.encoding)
+    if args.profiles:
+        convert_csv_to_json(args.output_csv, args.profiles, encoding=args.encoding)
@@ -1,7 +1,18 @@
 import pandas as pd
+import numpy as np
+import argparse
+import hashlib
 import json
 import math
+import mmap
 import os
+import re
+import time
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，缺失时使用标准库序列化
+    orjson = None
 
 # ===================== 手动映射字典（整合 manual_mappings.py 内容） =====================
 MANUAL_COUNTRY_MAPPING = {
@@ -72,97 +83,381 @@ MANUAL_OWNERSHIP_MAPPING = {
     "香港电台": "公营"
 }
 
+# ===================== 转换配置 =====================
+# 转换规则版本：修改派生规则后递增，使已记录的内容哈希全部失效
+CONVERTER_VERSION = 2
+
+# 议题分布列（CSV列名）
+ISSUE_COLUMNS = [
+    'EI_1_外国政府涉台立法',
+    'EI_2_外国政要涉台表态或访问',
+    'EI_3_国际组织涉台表述',
+    'EI_5_外媒涉台报道争议',
+    'MS_1_外国军舰军机穿越台海',
+    'MS_2_对台军售或军事援助'
+]
+
+# 报道焦点候选议题：(CSV列名, 焦点名称)
+FOCUS_TOPICS = [
+    ('EI_1_外国政府涉台立法', '外国政府涉台立法'),
+    ('EI_2_外国政要涉台表态或访问', '外国政要涉台表态/访问'),
+    ('MS_1_外国军舰军机穿越台海', '外国军舰军机穿越台海'),
+    ('MS_2_对台军售或军事援助', '对台军售/军事援助')
+]
+
+# 主题偏好：(CSV列名, 偏好名称)，占比超过阈值时计入
+TOPIC_PREFERENCE_COLUMNS = [
+    ('EI_1_外国政府涉台立法', '立法议题'),
+    ('EI_2_外国政要涉台表态或访问', '政要表态'),
+    ('MS_1_外国军舰军机穿越台海', '军事行动'),
+    ('MS_2_对台军售或军事援助', '军售援助')
+]
+TOPIC_PREFERENCE_THRESHOLD = 0.1
+
+# 媒体类型与语言关键词（按顺序匹配，先命中者优先）
+MEDIA_TYPE_KEYWORDS = [
+    ('电视台/广播电视媒体', ['央视', '卫视', 'NHK', 'CNN', 'BBC', '电视', '广播']),
+    ('通讯社', ['新华', '路透', '共同', '美联', '法新', '俄新', '塔斯', '中新社']),
+    ('报社/纸质媒体', ['人民日报', '纽约', '时报', '日报', '晚报', '早报', '环球时报', '中国日报']),
+    ('网络新媒体', ['网', '澎湃', '界面', '腾讯', '新浪'])
+]
+LANGUAGE_KEYWORDS = [
+    ('中文', ['中国', '央视', '新华', '人民', '中评', '华语', '澎湃', '南华早报']),
+    ('英文', ['CNN', 'BBC', '纽约', '彭博', '路透', '澳大利亚人报', '环球邮报']),
+    ('日文', ['日本', 'NHK', '共同', '东京']),
+    ('俄文', ['俄新', '塔斯']),
+    ('法文', ['法新'])
+]
+
+STANCE_TO_POLITICAL = {
+    'Counter': '对立立场',
+    'Aligned': '一致立场',
+    'Mixed': '中立/混合立场'
+}
+
 # ===================== 核心转换函数 =====================
-def convert_csv_to_json(csv_filepath, output_json_path):
-    """将CSV格式的媒体指标转换为JSON格式"""
-    
-    # 读取CSV数据（指定GBK编码，适配中文Windows文件）
-    df = pd.read_csv(csv_filepath, encoding='gbk')
-    
-    # 自动创建输出文件夹（若输出路径包含子文件夹）
-    output_dir = os.path.dirname(output_json_path)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    media_profiles = {}
-    
-    for _, row in df.iterrows():
-        # 生成唯一媒体ID（清理特殊字符）
-        media_id = row['media_name'].lower().replace(' ', '_').replace('《', '').replace('》', '').replace('（', '').replace('）', '')
-        
-        # 基本类别判断（处理空值）
-        stance_label = row['stance_label']
-        if pd.isna(stance_label):
-            stance_label = determine_stance_label(row['counter_ratio'], row['aligned_ratio'])
-        
-        # 构建媒体档案
-        media_profiles[media_id] = {
+ID_STRIP_TABLE = str.maketrans({' ': '_', '《': None, '》': None, '（': None, '）': None})
+
+def make_media_ids(names):
+    """生成唯一媒体ID（清理特殊字符）"""
+    return [str(name).lower().translate(ID_STRIP_TABLE) for name in names.tolist()]
+
+def dump_profile(profile):
+    """序列化单个档案为一行UTF-8编码的JSON"""
+    if orjson is not None:
+        return orjson.dumps(profile)
+    return json.dumps(profile, ensure_ascii=False).encode('utf-8')
+
+def match_keywords(names, rules, default):
+    """按关键词规则为每个名称分类（向量化，规则按顺序优先）"""
+    result = np.full(len(names), default, dtype=object)
+    assigned = np.zeros(len(names), dtype=bool)
+    for label, keywords in rules:
+        pattern = '|'.join(re.escape(keyword) for keyword in keywords)
+        hit = names.str.contains(pattern, regex=True).to_numpy(dtype=bool) & ~assigned
+        result[hit] = label
+        assigned |= hit
+    return result
+
+def derive_columns(df, media_ids):
+    """向量化计算所有派生列，返回 {列名: 数组}"""
+    names = df['media_name'].astype(str)
+    counter_ratio = df['counter_ratio'].to_numpy(dtype=float)
+    aligned_ratio = df['aligned_ratio'].to_numpy(dtype=float)
+    avg_length = df['avg_question_length'].to_numpy(dtype=float)
+
+    # 立场标签缺失时按比例推断
+    stance = df['stance_label'].astype(object).to_numpy()
+    missing = pd.isna(df['stance_label']).to_numpy()
+    inferred = np.select([counter_ratio > 0.6, aligned_ratio > 0.6], ['Counter', 'Aligned'], 'Mixed')
+    stance = np.where(missing, inferred, stance)
+
+    total = df['media_total_questions'].to_numpy(dtype=float)
+    taihai = df['media_taihai_questions'].to_numpy(dtype=float)
+    coverage = np.divide(taihai, total, out=np.zeros_like(taihai), where=total != 0)
+    diversity = df['issue_entropy'].to_numpy(dtype=float) * np.where(stance == 'Mixed', 1.2, 1.0)
+
+    question_style = np.select(
+        [
+            (stance == 'Counter') & (avg_length > 50),
+            stance == 'Counter',
+            stance == 'Aligned',
+            avg_length > 40
+        ],
+        [
+            '尖锐冗长型（带有质疑导向）',
+            '简洁犀利型（带有对立导向）',
+            '客观中立型（带有共识导向）',
+            '全面详细型（带有探究导向）'
+        ],
+        '简洁中立型（带有平衡导向）'
+    )
+
+    # 报道焦点：占比大于0的议题按占比降序取前2（稳定排序，同分保持原顺序）
+    focus_scores = df[[column for column, _ in FOCUS_TOPICS]].to_numpy(dtype=float)
+    focus_order = np.argsort(-focus_scores, axis=1, kind='stable')[:, :2]
+    focus_top = np.take_along_axis(focus_scores, focus_order, axis=1)
+
+    preference_scores = df[[column for column, _ in TOPIC_PREFERENCE_COLUMNS]].to_numpy(dtype=float)
+
+    return {
+        "media_id": media_ids,
+        "name": names.to_numpy(dtype=object),
+        "country": names.map(MANUAL_COUNTRY_MAPPING).fillna("未知").to_numpy(dtype=object),
+        "ownership": names.map(MANUAL_OWNERSHIP_MAPPING).fillna("未知所有权").to_numpy(dtype=object),
+        "media_type": match_keywords(names, MEDIA_TYPE_KEYWORDS, '未知媒体类型'),
+        "language": match_keywords(names, LANGUAGE_KEYWORDS, '未知语言'),
+        "stance_label": stance,
+        "political_stance": np.array([STANCE_TO_POLITICAL.get(label, '未知立场') for label in stance], dtype=object),
+        "coverage_intensity": coverage,
+        "topic_diversity": diversity,
+        "question_style": question_style,
+        "focus_order": focus_order,
+        "focus_top": focus_top,
+        "preference_scores": preference_scores
+    }
+
+INT_COLUMNS = ['total_questions', 'counter_count', 'aligned_count', 'neutral_count',
+               'media_total_questions', 'media_taihai_questions']
+FLOAT_COLUMNS = ['counter_ratio', 'aligned_ratio', 'neutral_ratio', 'avg_question_length',
+                 'issue_entropy', 'taiwan_issue_ratio', 'avg_aligned_score', 'avg_counter_score',
+                 'avg_neutral_score', 'taiwan_question_ratio'] + ISSUE_COLUMNS
+
+def build_profiles(df, media_ids=None):
+    """由一批CSV行构建媒体档案，按行顺序产出 (媒体ID, 档案)"""
+    if media_ids is None:
+        media_ids = make_media_ids(df['media_name'])
+    derived = derive_columns(df, media_ids)
+    # 数值列一次性转换为Python原生类型，组装档案时不再逐行访问DataFrame
+    ints = {column: df[column].to_numpy().astype(int).tolist() for column in INT_COLUMNS}
+    floats = {column: df[column].to_numpy(dtype=float).tolist() for column in FLOAT_COLUMNS}
+    focus_order = derived["focus_order"].tolist()
+    focus_top = derived["focus_top"].tolist()
+    preferences = derived["preference_scores"].tolist()
+
+    for i in range(len(df)):
+        focus_priority = {
+            FOCUS_TOPICS[index][1]: round(score, 4)
+            for index, score in zip(focus_order[i], focus_top[i]) if score > 0
+        } or {'一般性台海议题': 0.5}
+        topic_preferences = {
+            TOPIC_PREFERENCE_COLUMNS[j][1]: score
+            for j, score in enumerate(preferences[i]) if score > TOPIC_PREFERENCE_THRESHOLD
+        } or {"外交议题": 0.5, "一般性询问": 0.5}
+        stance_label = derived["stance_label"][i]
+
+        yield derived["media_id"][i], {
             "basic_info": {
-                "name": str(row['media_name']),
-                "country": determine_country(str(row['media_name'])),
-                "media_type": determine_media_type(str(row['media_name'])),
-                "ownership": determine_ownership(str(row['media_name'])),
-                "political_stance": map_stance_label_to_political(stance_label),
-                "language": determine_language(str(row['media_name']))
+                "name": derived["name"][i],
+                "country": derived["country"][i],
+                "media_type": derived["media_type"][i],
+                "ownership": derived["ownership"][i],
+                "political_stance": derived["political_stance"][i],
+                "language": derived["language"][i]
             },
-            
+
             "taiwan_issue_analysis": {
-                "total_questions": int(row['total_questions']),
-                "counter_count": int(row['counter_count']),
-                "aligned_count": int(row['aligned_count']),
-                "neutral_count": int(row['neutral_count']),
-                "counter_ratio": float(row['counter_ratio']),
-                "aligned_ratio": float(row['aligned_ratio']),
-                "neutral_ratio": float(row['neutral_ratio']),
+                "total_questions": ints['total_questions'][i],
+                "counter_count": ints['counter_count'][i],
+                "aligned_count": ints['aligned_count'][i],
+                "neutral_count": ints['neutral_count'][i],
+                "counter_ratio": floats['counter_ratio'][i],
+                "aligned_ratio": floats['aligned_ratio'][i],
+                "neutral_ratio": floats['neutral_ratio'][i],
                 "stance_label": stance_label,
-                "avg_question_length": float(row['avg_question_length']),
-                "issue_entropy": float(row['issue_entropy']),
-                "taiwan_issue_ratio": float(row['taiwan_issue_ratio']),
-                "avg_aligned_score": float(row['avg_aligned_score']),
-                "avg_counter_score": float(row['avg_counter_score']),
-                "avg_neutral_score": float(row['avg_neutral_score']),
-                
-                "issue_distribution": {
-                    "EI_1_外国政府涉台立法": float(row['EI_1_外国政府涉台立法']),
-                    "EI_2_外国政要涉台表态或访问": float(row['EI_2_外国政要涉台表态或访问']),
-                    "EI_3_国际组织涉台表述": float(row['EI_3_国际组织涉台表述']),
-                    "EI_5_外媒涉台报道争议": float(row['EI_5_外媒涉台报道争议']),
-                    "MS_1_外国军舰军机穿越台海": float(row['MS_1_外国军舰军机穿越台海']),
-                    "MS_2_对台军售或军事援助": float(row['MS_2_对台军售或军事援助'])
-                }
+                "avg_question_length": floats['avg_question_length'][i],
+                "issue_entropy": floats['issue_entropy'][i],
+                "taiwan_issue_ratio": floats['taiwan_issue_ratio'][i],
+                "avg_aligned_score": floats['avg_aligned_score'][i],
+                "avg_counter_score": floats['avg_counter_score'][i],
+                "avg_neutral_score": floats['avg_neutral_score'][i],
+
+                "issue_distribution": {column: floats[column][i] for column in ISSUE_COLUMNS}
             },
-            
+
             "overall_performance": {
-                "media_total_questions": int(row['media_total_questions']),
-                "media_taihai_questions": int(row['media_taihai_questions']),
-                "taiwan_question_ratio": float(row['taiwan_question_ratio']),
-                "coverage_intensity": calculate_coverage_intensity(
-                    int(row['media_taihai_questions']), 
-                    int(row['media_total_questions'])
-                ),
-                "topic_diversity": calculate_topic_diversity(
-                    float(row['issue_entropy']), 
-                    stance_label  # 修复：使用已处理的stance_label，而非row['stance_label']
-                )
+                "media_total_questions": ints['media_total_questions'][i],
+                "media_taihai_questions": ints['media_taihai_questions'][i],
+                "taiwan_question_ratio": floats['taiwan_question_ratio'][i],
+                "coverage_intensity": round(float(derived["coverage_intensity"][i]), 4),
+                "topic_diversity": round(float(derived["topic_diversity"][i]), 4)
             },
-            
+
             "generation_parameters": {
-                "question_style": determine_question_style(stance_label, row['avg_question_length']),
-                "focus_priority": determine_focus_priority(row),
-                "challenge_level": float(row['counter_ratio']),
-                "consistency_level": float(row['aligned_ratio']),
-                "neutral_tendency": float(row['neutral_ratio']),
-                "semantic_intensity": float(row['avg_aligned_score']),
-                "topic_preferences": extract_topic_preferences(row)
+                "question_style": derived["question_style"][i],
+                "focus_priority": focus_priority,
+                "challenge_level": floats['counter_ratio'][i],
+                "consistency_level": floats['aligned_ratio'][i],
+                "neutral_tendency": floats['neutral_ratio'][i],
+                "semantic_intensity": floats['avg_aligned_score'][i],
+                "topic_preferences": topic_preferences
             }
         }
+
+def rules_digest():
+    """转换规则摘要（规则版本、映射表与pandas版本），任一变化都会触发全量重建"""
+    rules = [CONVERTER_VERSION, pd.__version__, MANUAL_COUNTRY_MAPPING, MANUAL_OWNERSHIP_MAPPING,
+             MEDIA_TYPE_KEYWORDS, LANGUAGE_KEYWORDS]
+    return hashlib.sha1(json.dumps(rules, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+def content_hashes(chunk):
+    """逐行内容哈希（向量化）；数值列统一为float64，避免同一行因所在分块推断的类型不同而哈希不同"""
+    normalized = pd.DataFrame({
+        column: chunk[column].astype('float64') if pd.api.types.is_numeric_dtype(chunk[column])
+        else chunk[column].astype(str)
+        for column in chunk.columns
+    })
+    return pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+
+def hashes_path_for(output_json_path):
+    """内容哈希记录文件路径"""
+    return f"{output_json_path}.hashes.json"
+
+def load_previous_state(output_json_path):
+    """读取上次转换的行哈希与输出文件中各档案所在的行位置，无法复用时返回空"""
+    hashes_path = hashes_path_for(output_json_path)
+    if not (os.path.exists(hashes_path) and os.path.exists(output_json_path)):
+        return {}, {}
+    with open(hashes_path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get("rules") != rules_digest():
+        print("转换规则已变化，全量重建")
+        return {}, {}
+
+    # 输出文件每行一个档案（"媒体ID": {...}）：只记录档案文本的位置，复用时再按位置读取
+    decoder = json.JSONDecoder()
+    positions = {}
+    offset = 0
+    with open(output_json_path, 'rb') as f:
+        for line in f:
+            if line.startswith(b'"'):
+                key_end = line.index(b'": {')
+                if b'\\' in line[:key_end]:
+                    # 媒体ID含转义字符时完整解析键名
+                    media_id, _ = decoder.raw_decode(line.decode('utf-8'))
+                    key_end = len(json.dumps(media_id, ensure_ascii=False).encode('utf-8')) - 1
+                else:
+                    media_id = line[1:key_end].decode('utf-8')
+                end = len(line.rstrip(b'\r\n').rstrip(b','))
+                positions[media_id] = (offset + key_end + 3, offset + end)
+            offset += len(line)
+    return state.get("rows", {}), positions
+
+def read_previous_profile(buffer, position):
+    """按位置读取上次输出中某个档案的JSON字节（原样复用，不重新解析）"""
+    start, end = position
+    return buffer[start:end]
+
+def find_duplicate_rows(csv_filepath, encoding, chunksize):
+    """
+    预扫描媒体名称列，返回 {重复媒体ID: 最后一次出现的行号}
     
-    # 保存为JSON文件（指定UTF-8编码，保留中文）
-    with open(output_json_path, 'w', encoding='utf-8') as f:
-        json.dump(media_profiles, f, ensure_ascii=False, indent=2)
-    
-    print(f"已成功转换 {len(media_profiles)} 个媒体档案，输出文件：{output_json_path}")
-    return media_profiles
+    同一ID出现多次时以最后一行为准，但保留第一次出现的位置（与逐行写入字典的结果一致）
+    """
+    last_rows = {}
+    duplicated = set()
+    offset = 0
+    for names in pd.read_csv(csv_filepath, encoding=encoding, usecols=['media_name'], chunksize=chunksize):
+        for i, media_id in enumerate(make_media_ids(names['media_name'])):
+            if media_id in last_rows:
+                duplicated.add(media_id)
+            last_rows[media_id] = offset + i
+        offset += len(names)
+    return {media_id: last_rows[media_id] for media_id in duplicated}
+
+def convert_csv_to_json(csv_filepath, output_json_path, chunksize=50000, encoding='gbk', full_rebuild=False):
+    """
+    将CSV格式的媒体指标转换为JSON格式
+
+    分块读取CSV并向量化计算派生列，输出按档案逐行写出（先写临时文件再原子替换）；
+    每行的内容哈希记录在 <输出文件>.hashes.json，再次转换时只重新处理内容发生变化的媒体
+    """
+    start_time = time.perf_counter()
+
+    # 自动创建输出文件夹（若输出路径包含子文件夹）
+    output_dir = os.path.dirname(output_json_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    previous_hashes, positions = ({}, {}) if full_rebuild else load_previous_state(output_json_path)
+    previous_file = previous_buffer = None
+    if positions:
+        previous_file = open(output_json_path, 'rb')
+        previous_buffer = mmap.mmap(previous_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # 重复ID的最终内容行（通常极少）预先单独读取
+    duplicate_rows = find_duplicate_rows(csv_filepath, encoding, chunksize)
+    overrides = None
+    if duplicate_rows:
+        wanted = set(duplicate_rows.values())
+        overrides = pd.read_csv(csv_filepath, encoding=encoding,
+                                skiprows=lambda line: line != 0 and line - 1 not in wanted)
+        overrides.index = make_media_ids(overrides['media_name'])
+
+    row_hashes = {}
+    changed = reused = 0
+    tmp_path = f"{output_json_path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as out:
+            out.write(b"{")
+            first = True
+            for chunk in pd.read_csv(csv_filepath, encoding=encoding, chunksize=chunksize):
+                media_ids = make_media_ids(chunk['media_name'])
+                keep = np.ones(len(chunk), dtype=bool)
+                if overrides is not None:
+                    # 重复ID：首次出现的位置写入最后一行的内容，其余出现跳过
+                    chunk = chunk.copy()
+                    for i, media_id in enumerate(media_ids):
+                        if media_id not in duplicate_rows:
+                            continue
+                        if media_id in row_hashes or media_id in media_ids[:i]:
+                            keep[i] = False
+                        else:
+                            chunk.iloc[i] = overrides.loc[media_id, chunk.columns]
+
+                hash_hex = [format(h, '016x') for h in content_hashes(chunk).tolist()]
+
+                dirty = np.zeros(len(chunk), dtype=bool)
+                lines = []
+                for i, media_id in enumerate(media_ids):
+                    if not keep[i]:
+                        continue
+                    row_hashes[media_id] = hash_hex[i]
+                    dirty[i] = previous_hashes.get(media_id) != hash_hex[i] or media_id not in positions
+
+                selected = dirty & keep
+                rebuilt = dict(build_profiles(chunk[selected], [m for m, s in zip(media_ids, selected) if s])) \
+                    if selected.any() else {}
+                for i, media_id in enumerate(media_ids):
+                    if not keep[i]:
+                        continue
+                    if dirty[i]:
+                        text = dump_profile(rebuilt[media_id])
+                        changed += 1
+                    else:
+                        text = read_previous_profile(previous_buffer, positions[media_id])
+                        reused += 1
+                    lines.append(json.dumps(media_id, ensure_ascii=False).encode('utf-8') + b": " + text)
+                # 每块一次性写出
+                if lines:
+                    out.write((b"\n" if first else b",\n") + b",\n".join(lines))
+                    first = False
+            out.write(b"\n}\n" if not first else b"}\n")
+            out.flush()
+            os.fsync(out.fileno())
+    finally:
+        if previous_file is not None:
+            previous_buffer.close()
+            previous_file.close()
+
+    os.replace(tmp_path, output_json_path)
+    with open(hashes_path_for(output_json_path), 'w', encoding='utf-8') as f:
+        f.write(json.dumps({"rules": rules_digest(), "rows": row_hashes}, ensure_ascii=False))
+
+    elapsed = time.perf_counter() - start_time
+    print(f"已成功转换 {len(row_hashes)} 个媒体档案（重新处理 {changed}，复用 {reused}，"
+          f"耗时 {elapsed:.2f}s），输出文件：{output_json_path}")
+    return {"total": len(row_hashes), "changed": changed, "reused": reused, "output": output_json_path}
 
 # ===================== 所有辅助函数 =====================
 def determine_country(media_name):
@@ -181,14 +476,9 @@ def determine_stance_label(counter_ratio, aligned_ratio):
 def extract_topic_preferences(row):
     """从议题分布提取主题偏好"""
     topics = {}
-    if row['EI_1_外国政府涉台立法'] > 0.1:
-        topics['立法议题'] = float(row['EI_1_外国政府涉台立法'])
-    if row['EI_2_外国政要涉台表态或访问'] > 0.1:
-        topics['政要表态'] = float(row['EI_2_外国政要涉台表态或访问'])
-    if row['MS_1_外国军舰军机穿越台海'] > 0.1:
-        topics['军事行动'] = float(row['MS_1_外国军舰军机穿越台海'])
-    if row['MS_2_对台军售或军事援助'] > 0.1:
-        topics['军售援助'] = float(row['MS_2_对台军售或军事援助'])
+    for col_name, topic_name in TOPIC_PREFERENCE_COLUMNS:
+        if row[col_name] > TOPIC_PREFERENCE_THRESHOLD:
+            topics[topic_name] = float(row[col_name])
     
     # 如果没有明显偏好，设置默认
     if not topics:
@@ -198,25 +488,11 @@ def extract_topic_preferences(row):
 
 def determine_media_type(media_name):
     """根据媒体名称判断媒体类型（如电视台、报社、通讯社等）"""
-    # 定义各类媒体类型的关键词
-    tv_keywords = ['央视', '卫视', 'NHK', 'CNN', 'BBC', '电视', '广播']
-    news_agency_keywords = ['新华', '路透', '共同', '美联', '法新', '俄新', '塔斯', '中新社']
-    newspaper_keywords = ['人民日报', '纽约', '时报', '日报', '晚报', '早报', '环球时报', '中国日报']
-    online_media_keywords = ['网', '澎湃', '界面', '腾讯', '新浪']
-    
     # 匹配关键词，返回对应媒体类型
-    for keyword in tv_keywords:
-        if keyword in media_name:
-            return '电视台/广播电视媒体'
-    for keyword in news_agency_keywords:
-        if keyword in media_name:
-            return '通讯社'
-    for keyword in newspaper_keywords:
-        if keyword in media_name:
-            return '报社/纸质媒体'
-    for keyword in online_media_keywords:
-        if keyword in media_name:
-            return '网络新媒体'
+    for media_type, keywords in MEDIA_TYPE_KEYWORDS:
+        for keyword in keywords:
+            if keyword in media_name:
+                return media_type
     
     # 无匹配时返回默认值
     return '未知媒体类型'
@@ -227,37 +503,15 @@ def determine_ownership(media_name):
 
 def map_stance_label_to_political(stance_label):
     """将立场标签映射为具体政治立场描述"""
-    stance_mapping = {
-        'Counter': '对立立场',
-        'Aligned': '一致立场',
-        'Mixed': '中立/混合立场'
-    }
     # 若标签不在映射中，返回默认值
-    return stance_mapping.get(stance_label, '未知立场')
+    return STANCE_TO_POLITICAL.get(stance_label, '未知立场')
 
 def determine_language(media_name):
     """根据媒体名称判断使用语言"""
-    chinese_keywords = ['中国', '央视', '新华', '人民', '中评', '华语', '澎湃', '南华早报']
-    english_keywords = ['CNN', 'BBC', '纽约', '彭博', '路透', '澳大利亚人报', '环球邮报']
-    japanese_keywords = ['日本', 'NHK', '共同', '东京']
-    russian_keywords = ['俄新', '塔斯']
-    french_keywords = ['法新']
-    
-    for keyword in chinese_keywords:
-        if keyword in media_name:
-            return '中文'
-    for keyword in english_keywords:
-        if keyword in media_name:
-            return '英文'
-    for keyword in japanese_keywords:
-        if keyword in media_name:
-            return '日文'
-    for keyword in russian_keywords:
-        if keyword in media_name:
-            return '俄文'
-    for keyword in french_keywords:
-        if keyword in media_name:
-            return '法文'
+    for language, keywords in LANGUAGE_KEYWORDS:
+        for keyword in keywords:
+            if keyword in media_name:
+                return language
     
     return '未知语言'
 
@@ -293,17 +547,9 @@ def determine_question_style(stance_label, avg_question_length):
 def determine_focus_priority(row):
     """提取报道焦点优先级"""
     focus_priority = {}
-    # 优先关注占比最高的议题
-    topics = [
-        ('EI_1_外国政府涉台立法', '外国政府涉台立法'),
-        ('EI_2_外国政要涉台表态或访问', '外国政要涉台表态/访问'),
-        ('MS_1_外国军舰军机穿越台海', '外国军舰军机穿越台海'),
-        ('MS_2_对台军售或军事援助', '对台军售/军事援助')
-    ]
-    
-    # 筛选占比大于0的议题，按占比排序
+    # 筛选占比大于0的议题，按占比排序（优先关注占比最高的议题）
     topic_scores = []
-    for col_name, topic_name in topics:
+    for col_name, topic_name in FOCUS_TOPICS:
         score = float(row[col_name])
         if score > 0:
             topic_scores.append((topic_name, score))
@@ -321,5 +567,14 @@ def determine_focus_priority(row):
 
 # ===================== 运行入口 =====================
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="将媒体指标CSV转换为媒体档案JSON")
+    parser.add_argument("csv_path", nargs="?", default="media_indicators.csv", help="输入CSV文件")
+    parser.add_argument("output_path", nargs="?", default="media_profiles_enhanced.json", help="输出JSON文件")
+    parser.add_argument("--chunksize", type=int, default=50000, help="每次读取的CSV行数（默认50000）")
+    parser.add_argument("--encoding", default="gbk", help="CSV文件编码（默认gbk）")
+    parser.add_argument("--full", action="store_true", help="忽略内容哈希，全量重建")
+    args = parser.parse_args()
+
     # 输入CSV文件路径 + 输出JSON文件路径
-    convert_csv_to_json('media_indicators.csv', 'media_profiles_enhanced.json')
\ No newline at end of file
+    convert_csv_to_json(args.csv_path, args.output_path, chunksize=args.chunksize,
+                        encoding=args.encoding, full_rebuild=args.full)
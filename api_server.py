@@ -3,29 +3,43 @@
 支持媒体提问和用户评论生成
 """
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse, StreamingResponse
-from pydantic import BaseModel
+import time
+STARTUP_BEGIN = time.perf_counter()
+
+import contextlib
+import threading
+from fastapi import FastAPI, HTTPException, Header, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.requests import ClientDisconnect
+from pydantic import BaseModel, ValidationError
 import json
 import os
 import asyncio
-from typing import Dict, List, Optional, AsyncGenerator
+import functools
+import tempfile
+from typing import Any, Dict, List, Optional, AsyncGenerator
 import logging
 from dotenv import load_dotenv
-from prompts.templates import get_media_prompt, get_user_prompt
+from prompts.templates import (get_media_prompt, get_user_prompt, get_spokesperson_prompt,
+                              get_transcript_summary_prompt, MediaProfile, UserProfile)
+from job_queue import JobStore, JobWorkerPool
+from log_pipeline import setup_logging, log_prompt, dropped_count
+from profile_store import ProfileStore, MappedProfiles, LazyModelMap
+from shared_state import SharedState, cache_key
+from profile_stats import ProfileStatsStore, validate_observation
+from content_store import ContentStore, EXPORT_FORMATS, context_hash
+from prefetch_scheduler import PrefetchScheduler
+from conference_transcript import ConferenceTranscript
+from model_router import ModelRouter, parse_agent_models
+from output_budget import OutputBudget, STOP_SEQUENCES, trim_output
+from trace_recorder import TraceRecorder, TraceMiddleware, DEFAULT_REDACT_FIELDS
+from response_utils import (cached_json_response, serialize_with_etag, dumps_bytes, loads_bytes,
+                            DuplexStreamingResponse, ResponseEncoder, JSON_TYPE, VARY_HEADERS)
 THINKING_ENABLED = False
-# 导入智谱AI SDK
-try:
-    from zhipuai import ZhipuAI
-except ImportError:
-    print("请安装智谱AI SDK: pip install zhipuai")
-    raise
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+
+# 配置日志（队列化非阻塞输出，格式与级别见 log_pipeline）
+setup_logging()
 logger = logging.getLogger(__name__)
 
 load_dotenv()
@@ -38,24 +52,161 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
-# 配置智谱AI客户端
+# 流量录制（默认关闭）：记录请求时间与负载，供 trace_replay.py 回放；路径中的 {pid} 替换为进程号，多进程部署时各进程分别写出
+TRACE_PATH = os.getenv("TRACE_PATH", "")
+TRACE_REDACT_FIELDS = os.getenv("TRACE_REDACT_FIELDS", ",".join(DEFAULT_REDACT_FIELDS))  # 请求体中需要脱敏的字段
+TRACE_EXCLUDE_PATHS = os.getenv("TRACE_EXCLUDE_PATHS", "/health,/startup,/stats,/docs,/redoc,/openapi.json")
+
+trace_recorder = None
+if TRACE_PATH:
+    trace_recorder = TraceRecorder(
+        TRACE_PATH.replace("{pid}", str(os.getpid())),
+        redact_fields=[field.strip() for field in TRACE_REDACT_FIELDS.split(",") if field.strip()],
+        exclude_paths=[path.strip() for path in TRACE_EXCLUDE_PATHS.split(",") if path.strip()]
+    )
+    app.add_middleware(TraceMiddleware, recorder=trace_recorder)
+
+# 启动各阶段耗时（毫秒），通过 /startup 查看
+STARTUP_PHASES: Dict[str, float] = {}
+
+@contextlib.contextmanager
+def startup_phase(name: str):
+    """记录一个启动阶段的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_PHASES[name] = round((time.perf_counter() - start) * 1000, 1)
+
+# 配置智谱AI客户端（首次调用生成接口时才导入SDK并创建，缺少密钥不影响服务启动）
 ZHIPU_API_KEY = os.getenv("ZHIPUAI_API_KEY")
 if not ZHIPU_API_KEY:
-    logger.error("未找到ZHIPUAI_API_KEY环境变量，请在.env文件中配置")
-    raise ValueError("ZHIPUAI_API_KEY环境变量未设置")
+    logger.warning("未找到ZHIPUAI_API_KEY环境变量，生成接口将不可用，请在.env文件中配置")
 
 # 模型配置
 MODEL_NAME = os.getenv("MODEL_NAME", "glm-4.5-flash")  # 可配置模型
 THINKING_ENABLED = os.getenv("THINKING_ENABLED", "false").lower() == "true"
 STREAM_ENABLED = os.getenv("STREAM_ENABLED", "false").lower() == "true"
+SUPPORTED_MODELS = ["glm-4.5-flash", "glm-4", "glm-3-turbo"]
+
+# 模型路由：按智能体类型、提示词长度、延迟目标与实测延迟为每个请求选择模型和思考模式（关闭时固定使用 MODEL_NAME）
+ROUTING_ENABLED = os.getenv("ROUTING_ENABLED", "false").lower() == "true"
+ROUTING_MODELS = os.getenv("ROUTING_MODELS", ",".join(SUPPORTED_MODELS))  # 候选模型
+ROUTING_AGENT_MODELS = os.getenv("ROUTING_AGENT_MODELS", f"media:{MODEL_NAME},user:fastest")  # fastest 为实测最快
+ROUTING_THINKING_MODELS = os.getenv("ROUTING_THINKING_MODELS", "glm-4.5-flash,glm-4.5,glm-4.5-air")  # 支持思考模式的模型
+ROUTING_LONG_PROMPT_CHARS = int(os.getenv("ROUTING_LONG_PROMPT_CHARS", "6000"))  # 超过该长度的提示词不开启思考模式
+LATENCY_SLO_HEADER = "X-Latency-SLO-Ms"
+
+# 输出长度控制：未指定 max_tokens 时按智能体档案的长度上限设置预算，并使用停止序列和后处理截断
+OUTPUT_BUDGET = os.getenv("OUTPUT_BUDGET", "true").lower() == "true"
+OUTPUT_TOKENS_PER_CHAR = float(os.getenv("OUTPUT_TOKENS_PER_CHAR", "0.8"))  # 每个汉字约合的token数
+OUTPUT_MAX_TOKENS = int(os.getenv("OUTPUT_MAX_TOKENS", "300"))  # 未指定且不使用预算时的 max_tokens
+CONFERENCE_MAX_TOKENS = None if OUTPUT_BUDGET else 200  # 发布会记者提问
+
+# 档案数据配置
+MEDIA_PROFILES_PATH = os.getenv("MEDIA_PROFILES_PATH", "agents_data/media_profiles.json")
+USER_PROFILES_PATH = os.getenv("USER_PROFILES_PATH", "agents_data/user_profiles.json")
+PROFILE_WATCH_INTERVAL = float(os.getenv("PROFILE_WATCH_INTERVAL", "0"))  # 秒，0表示不监听文件
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# 多进程部署配置：API_WORKERS>1 时档案导出为共享文件，各工作进程只读映射
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+PROFILE_SHARED_PATH = os.getenv("PROFILE_SHARED_PATH") or ("profiles.shared" if API_WORKERS > 1 else "")
+
+# 跨进程共享的生成缓存与计数器
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "shared_state.db")
+GENERATION_CACHE_TTL = float(os.getenv("GENERATION_CACHE_TTL", "0"))  # 秒，0表示不缓存生成结果
+
+# 档案在线统计：新提问计入后叠加到提示词所用的 taiwan_issue_analysis
+PROFILE_STATS_HALF_LIFE = float(os.getenv("PROFILE_STATS_HALF_LIFE", "0"))  # 条，0表示不衰减
+PROFILE_STATS_PATH = os.getenv("PROFILE_STATS_PATH", "")  # 为空时只保存在内存中
+
+# 语义缓存：议题/背景信息相近的请求复用已有生成结果（各工作进程独立）
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0"))  # 余弦相似度阈值，0表示关闭
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))  # 秒，0表示不过期
+SEMANTIC_CACHE_TOPIC_WEIGHT = float(os.getenv("SEMANTIC_CACHE_TOPIC_WEIGHT", "0.7"))  # 议题相似度所占权重
+SEMANTIC_CACHE_TOPIC_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_TOPIC_THRESHOLD", "0.95"))  # 去除泛化措辞后的议题相似度下限
+
+# 生成内容立场打分（本地词典模型，不额外调用大模型）
+STANCE_SCORING = os.getenv("STANCE_SCORING", "false").lower() == "true"  # 默认是否为生成结果附加立场得分
+STANCE_LEXICON_PATH = os.getenv("STANCE_LEXICON_PATH", "")  # 自定义词典JSON，为空时使用内置词典
+STANCE_FEEDBACK = os.getenv("STANCE_FEEDBACK", "false").lower() == "true"  # 媒体提问的打分结果计入档案在线统计
+
+# 生成内容存储（每次生成写入本地SQLite，可查询与导出）
+CONTENT_STORE_PATH = os.getenv("CONTENT_STORE_PATH", "generations.db")  # 为空时不保存
 
-# 初始化客户端
-try:
-    client = ZhipuAI(api_key=ZHIPU_API_KEY)
-    logger.info(f"智谱AI客户端初始化成功，使用模型: {MODEL_NAME}")
-except Exception as e:
-    logger.error(f"智谱AI客户端初始化失败: {str(e)}")
-    raise
+# 流式发布会预生成：推送当前提问时提前生成后续记者的提问
+CONFERENCE_PREFETCH = int(os.getenv("CONFERENCE_PREFETCH", "2"))  # 预生成的记者数，0表示轮到时才生成
+CONFERENCE_MAX_WASTED = int(os.getenv("CONFERENCE_MAX_WASTED", "2"))  # 每场发布会最多浪费的预生成调用数
+
+# 多轮发布会的会议记录窗口（字符数）
+CONFERENCE_RECENT_CHARS = int(os.getenv("CONFERENCE_RECENT_CHARS", "1500"))  # 原文保留的最近问答
+CONFERENCE_SUMMARY_CHARS = int(os.getenv("CONFERENCE_SUMMARY_CHARS", "500"))  # 较早问答的摘要
+CONFERENCE_SUMMARY_EVERY = int(os.getenv("CONFERENCE_SUMMARY_EVERY", "4"))  # 每移出多少条发言摘要一次
+
+# WebSocket 通道：一个长连接上复用多个生成请求
+WS_MAX_INFLIGHT = int(os.getenv("WS_MAX_INFLIGHT", "32"))  # 每个连接同时处理的消息数与同时进行的生成数（含 tick 子请求）
+
+# NDJSON 流式批量生成
+NDJSON_MAX_INFLIGHT = int(os.getenv("NDJSON_MAX_INFLIGHT", "16"))  # 同时生成的条数，超出时暂停读取请求体
+NDJSON_MAX_LINE_BYTES = int(os.getenv("NDJSON_MAX_LINE_BYTES", str(1 << 20)))  # 单行请求的最大字节数
+
+# 批量接口的响应编码（Accept: application/msgpack；Accept-Encoding: zstd/gzip）
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "true").lower() == "true"
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))  # 小于该大小的响应不压缩
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+RESPONSE_ZSTD_LEVEL = int(os.getenv("RESPONSE_ZSTD_LEVEL", "3"))
+
+# 后台任务队列配置
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+PROVIDER_WARMUP = os.getenv("PROVIDER_WARMUP", "true").lower() == "true"  # 服务就绪后在后台预先创建客户端
+
+_client = None
+_client_lock = threading.Lock()
+
+model_router = ModelRouter(
+    models=[model.strip() for model in ROUTING_MODELS.split(",") if model.strip()],
+    default_model=MODEL_NAME,
+    agent_models=parse_agent_models(ROUTING_AGENT_MODELS),
+    thinking_enabled=THINKING_ENABLED,
+    thinking_models=[model.strip() for model in ROUTING_THINKING_MODELS.split(",") if model.strip()],
+    long_prompt_chars=ROUTING_LONG_PROMPT_CHARS,
+    enabled=ROUTING_ENABLED
+)
+
+output_budget = OutputBudget(tokens_per_char=OUTPUT_TOKENS_PER_CHAR, max_tokens=max(OUTPUT_MAX_TOKENS, 48))
+
+response_encoder = ResponseEncoder(
+    enabled=RESPONSE_COMPRESSION,
+    min_bytes=RESPONSE_COMPRESSION_MIN_BYTES,
+    gzip_level=RESPONSE_GZIP_LEVEL,
+    zstd_level=RESPONSE_ZSTD_LEVEL
+)
+
+def get_client():
+    """获取智谱AI客户端：首次调用时导入SDK并创建（线程安全），SDK或密钥缺失时返回503"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if not ZHIPU_API_KEY:
+                    raise HTTPException(status_code=503, detail="ZHIPUAI_API_KEY环境变量未设置，请在.env文件中配置")
+                with startup_phase("provider_init"):
+                    try:
+                        from zhipuai import ZhipuAI
+                    except ImportError:
+                        logger.error("请安装智谱AI SDK: pip install zhipuai")
+                        raise HTTPException(status_code=503, detail="未安装智谱AI SDK")
+                    try:
+                        _client = ZhipuAI(api_key=ZHIPU_API_KEY)
+                    except Exception as e:
+                        logger.error(f"智谱AI客户端初始化失败: {str(e)}")
+                        raise HTTPException(status_code=503, detail=f"智谱AI客户端初始化失败: {str(e)}")
+                logger.info(f"智谱AI客户端初始化成功，使用模型: {MODEL_NAME}")
+    return _client
 
 # 数据模型
 class AgentRequest(BaseModel):
@@ -67,13 +218,37 @@ class AgentRequest(BaseModel):
     temperature: Optional[float] = None
     max_tokens: Optional[int] = None
     stream: Optional[bool] = None  # 是否启用流式输出
+    session_id: Optional[str] = None  # 仿真会话ID（写入生成内容存储）
+    tick: Optional[int] = None  # 仿真步
+    score_stance: Optional[bool] = None  # 是否附加立场得分（默认取 STANCE_SCORING）
+    transcript: Optional[str] = None  # 多轮发布会的会议记录（置于系统消息开头，作为各记者共享的前缀）
+    latency_slo_ms: Optional[float] = None  # 延迟目标（毫秒），HTTP 请求也可通过 X-Latency-SLO-Ms 请求头指定
+    variant: Optional[int] = None  # 采样序号：提示词相同时不同序号各自生成、各自缓存（仿真重复实验）
 
 class BatchRequest(BaseModel):
     requests: List[AgentRequest]
 
+class TickRequest(BaseModel):
+    session_id: Optional[str] = None
+    tick: Optional[int] = None
+    requests: List[AgentRequest]
+
 class MediaProfileRequest(BaseModel):
     media_ids: Optional[List[str]] = None
 
+class JobRequest(BaseModel):
+    kind: str = "batch"  # "batch" 或 "press_conference"
+    requests: Optional[List[AgentRequest]] = None  # kind=batch 时使用
+    topic: str = ""  # kind=press_conference 时使用
+    media_ids: Optional[List[str]] = None
+    context: str = ""
+
+class StanceRequest(BaseModel):
+    texts: List[str]
+
+class ObservationRequest(BaseModel):
+    observations: List[Dict]  # 每条包含 stance_label，可选 issue_category、question_length/question 与各项得分
+
 class StreamRequest(BaseModel):
     agent_type: str
     agent_id: str
@@ -81,76 +256,339 @@ class StreamRequest(BaseModel):
     attributes: Optional[Dict] = {}
     context: str = ""
 
+def validate_profile_models(media: Dict, users: Dict):
+    """共享模式下在导出前完成类型化校验（工作进程按需解析，不再逐个预解析）"""
+    for profile in media.values():
+        MediaProfile.from_dict(profile)
+    for profile in users.values():
+        UserProfile.from_dict(profile)
+
+# 智能体档案存储（支持热加载，快照整体原子替换）
+profile_store = ProfileStore(MEDIA_PROFILES_PATH, USER_PROFILES_PATH, shared_path=PROFILE_SHARED_PATH,
+                             validator=validate_profile_models if PROFILE_SHARED_PATH else None)
+
+def build_profile_models(profiles, factory):
+    """档案解析为类型化对象：单进程时在加载时全部解析（字段类型错误会使加载失败），共享模式下按需解析"""
+    if isinstance(profiles, MappedProfiles):
+        return LazyModelMap(profiles, factory)
+    return {agent_id: factory(profile) for agent_id, profile in profiles.items()}
+
+profile_store.register_derived(
+    "media_models", lambda snapshot: build_profile_models(snapshot.media, MediaProfile.from_dict)
+)
+profile_store.register_derived(
+    "user_models", lambda snapshot: build_profile_models(snapshot.users, UserProfile.from_dict)
+)
+
+def build_media_summary(media_id: str, profile: Dict) -> Dict:
+    """媒体列表中的简略信息"""
+    basic_info = profile.get("basic_info", {})
+    taiwan_analysis = profile.get("taiwan_issue_analysis", {})
+    generation_params = profile.get("generation_parameters", {})
+    
+    return {
+        "id": media_id,
+        "name": basic_info.get("name", "未知"),
+        "country": basic_info.get("country", "未知"),
+        "media_type": basic_info.get("media_type", "未知"),
+        "ownership": basic_info.get("ownership", "未知"),
+        "stance_label": taiwan_analysis.get("stance_label", "未知"),
+        "total_questions": taiwan_analysis.get("total_questions", 0),
+        "counter_ratio": taiwan_analysis.get("counter_ratio", 0),
+        "aligned_ratio": taiwan_analysis.get("aligned_ratio", 0),
+        "question_style": generation_params.get("question_style", "未知")
+    }
+
+def build_profile_payloads(snapshot) -> Dict:
+    """档案接口的响应体按快照预序列化一次，档案热加载后随新快照重建（共享模式下直接使用映射中的字节）"""
+    summaries = [build_media_summary(media_id, profile) for media_id, profile in snapshot.media.items()]
+    if isinstance(snapshot.media, MappedProfiles):
+        media_payloads, user_payloads = snapshot.media.payloads, snapshot.users.payloads
+    else:
+        media_payloads = {media_id: serialize_with_etag(profile) for media_id, profile in snapshot.media.items()}
+        user_payloads = {user_id: serialize_with_etag(profile) for user_id, profile in snapshot.users.items()}
+    return {
+        "summaries": summaries,
+        "media_list": serialize_with_etag({"count": len(summaries), "media": summaries}),
+        "media": media_payloads,
+        "users": user_payloads
+    }
+
+profile_store.register_derived("payloads", build_profile_payloads)
+def build_media_table(snapshot):
+    # NumPy 在首次构建快照时才导入，避免拖慢模块导入
+    from media_query import MediaTable
+    return MediaTable(snapshot.media)
+
+def build_reporter_samplers(snapshot):
+    from reporter_sampler import WEIGHT_SCHEMES, build_sampler
+    return {scheme: build_sampler(snapshot.get_derived("media_table"), scheme) for scheme in WEIGHT_SCHEMES}
+
+profile_store.register_derived("media_table", build_media_table)
+profile_store.register_derived("reporter_samplers", build_reporter_samplers)
+profile_store.register_derived(
+    "media_positions", lambda snapshot: {media_id: i for i, media_id in enumerate(snapshot.media)}
+)
+
 # 加载智能体数据
 def load_agent_data():
     """加载媒体和用户数据"""
     try:
-        # 加载媒体数据
-        media_path = 'agents_data/media_profiles.json'
-        if os.path.exists(media_path):
-            with open(media_path, 'r', encoding='utf-8') as f:
-                media_data = json.load(f)
-            logger.info(f"已加载 {len(media_data)} 个媒体档案")
-        else:
-            logger.warning(f"媒体数据文件不存在: {media_path}")
-            media_data = {}
-        
-        # 加载用户数据
-        user_path = 'agents_data/user_profiles.json'
-        if os.path.exists(user_path):
-            with open(user_path, 'r', encoding='utf-8') as f:
-                user_data = json.load(f)
-            logger.info(f"已加载 {len(user_data)} 个用户档案")
-        else:
-            logger.warning("用户数据文件不存在，使用空数据")
-            user_data = {}
-            
-        return media_data, user_data
+        snapshot = profile_store.load()
+        return snapshot.media, snapshot.users
     except Exception as e:
         logger.error(f"加载数据失败: {str(e)}")
         raise
 
-# 全局数据变量
-media_profiles, user_profiles = load_agent_data()
+# 档案不在导入时加载：服务启动时在线程池中加载；仅导入本模块使用时，首次访问快照时加载
+@app.on_event("startup")
+async def create_semantic_cache():
+    global semantic_cache
+    if SEMANTIC_CACHE_THRESHOLD > 0:
+        from semantic_cache import SemanticCache
+        semantic_cache = SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+                                       ttl=SEMANTIC_CACHE_TTL, topic_weight=SEMANTIC_CACHE_TOPIC_WEIGHT,
+                                       topic_threshold=SEMANTIC_CACHE_TOPIC_THRESHOLD)
+
+@app.on_event("startup")
+async def load_profiles_on_startup():
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, profile_stats.load)
+    if profile_store.loaded:
+        return
+    with startup_phase("profiles"):
+        await loop.run_in_executor(None, load_agent_data)
+
+# 后台任务队列（工作协程在应用启动时创建）
+job_store = JobStore(JOB_DB_PATH)
+job_workers = None
+
+# 跨进程共享状态（计数增量定期批量落库）
+shared_state = SharedState(SHARED_STATE_PATH)
+shared_state_task = None
+
+# 档案在线统计（按媒体的运行计数，随共享状态一起定期落库）
+profile_stats = ProfileStatsStore(half_life=PROFILE_STATS_HALF_LIFE, db_path=PROFILE_STATS_PATH)
+
+# 生成内容存储（请求路径只写内存缓冲，随共享状态一起定期批量落库）
+content_store = ContentStore(CONTENT_STORE_PATH) if CONTENT_STORE_PATH else None
+
+# 立场打分器（首次使用时创建，避免启动时导入NumPy）
+_stance_scorer = None
+
+def get_stance_scorer():
+    global _stance_scorer
+    if _stance_scorer is None:
+        from stance_scorer import StanceScorer
+        _stance_scorer = StanceScorer.from_file(STANCE_LEXICON_PATH) if STANCE_LEXICON_PATH else StanceScorer()
+    return _stance_scorer
+
+# 语义缓存（启用时在服务启动时创建）
+semantic_cache = None
 
 # 辅助函数
 def find_media_by_id_or_name(identifier: str) -> Optional[Dict]:
     """根据ID或名称查找媒体"""
-    # 直接匹配ID
-    if identifier in media_profiles:
-        return media_profiles[identifier]
-    
-    # 尝试模糊匹配（去除特殊字符，不区分大小写）
-    clean_identifier = identifier.lower().replace('《', '').replace('》', '').replace(' ', '')
+    return profile_store.snapshot.find_media(identifier)
+
+def resolve_agent_profile(agent_type: str, agent_id: str, attributes: Optional[Dict]):
+    """取得智能体的类型化档案（档案已在加载时解析，请求属性仅做浅层叠加）"""
+    snapshot = profile_store.snapshot
     
-    for media_id, profile in media_profiles.items():
-        basic_info = profile.get("basic_info", {})
-        media_name = basic_info.get("name", "")
-        
-        # 清理媒体名称
-        clean_name = media_name.lower().replace('《', '').replace('》', '').replace(' ', '')
-        
-        if clean_identifier in clean_name or clean_name in clean_identifier:
-            return profile
+    if agent_type == "media":
+        media_id = snapshot.resolve_media_id(agent_id)
+        if media_id is None:
+            raise HTTPException(status_code=404, detail=f"媒体 '{agent_id}' 不存在")
         
-        # 检查媒体ID
-        if clean_identifier in media_id.lower():
-            return profile
+        # 有新观测时先叠加在线统计，再叠加请求属性
+        profile = profile_stats.overlay(media_id, snapshot.get_derived("media_models")[media_id])
+        return profile.with_overrides(attributes)
+    
+    elif agent_type == "user":
+        profile = snapshot.get_derived("user_models").get(agent_id)
+        if profile is None:
+            raise HTTPException(status_code=404, detail="用户不存在")
+        return profile.with_overrides(attributes)
+    
+    raise HTTPException(status_code=400, detail="agent_type 必须是 'media' 或 'user'")
+
+def render_agent_prompt(agent_type: str, agent_id: str, profile, topic: str, context: str) -> str:
+    """由已解析的档案渲染提示词"""
+    if agent_type == "media":
+        # 获取媒体提问的提示词
+        prompt = get_media_prompt(topic=topic, attributes=profile, context=context)
+        log_prompt(logger, "媒体提示词", prompt, agent_type="media", agent_id=agent_id)
+        return prompt
+    
+    # 获取用户评论的提示词
+    return get_user_prompt(topic=topic, attributes=profile, context=context)
+
+def build_agent_prompt(agent_type: str, agent_id: str, topic: str,
+                       attributes: Optional[Dict], context: str) -> str:
+    """根据智能体档案构建提示词"""
+    profile = resolve_agent_profile(agent_type, agent_id, attributes)
+    return render_agent_prompt(agent_type, agent_id, profile, topic, context)
+
+def output_limits(request, profile, thinking: bool):
+    """确定本次生成的 max_tokens、停止序列与输出长度上限（字）
+
+    请求指定 max_tokens 时按请求；开启思考模式时推理内容也计入 max_tokens，不使用预算
+    """
+    requested = getattr(request, "max_tokens", None)
+    if not OUTPUT_BUDGET:
+        return (requested if requested is not None else OUTPUT_MAX_TOKENS), None, None, "fixed"
+    max_chars = output_budget.max_chars(request.agent_type, profile)
+    if requested is not None:
+        return requested, STOP_SEQUENCES, max_chars, "request"
+    if thinking:
+        return OUTPUT_MAX_TOKENS, STOP_SEQUENCES, max_chars, "thinking"
+    return output_budget.tokens_for(max_chars), STOP_SEQUENCES, max_chars, "profile"
+
+def default_conference_media_ids() -> List[str]:
+    """未指定媒体时的发布会参会媒体：前5个Aligned媒体和前2个非Aligned媒体"""
+    aligned_medias = []
+    other_medias = []
+    
+    for media_id, profile in profile_store.snapshot.media.items():
+        taiwan_analysis = profile.get("taiwan_issue_analysis", {})
+        if taiwan_analysis.get("stance_label") == "Aligned":
+            aligned_medias.append(media_id)
+        else:
+            other_medias.append(media_id)
+    
+    return aligned_medias[:5] + other_medias[:2]
+
+def select_conference_media_ids(select: Dict) -> List[str]:
+    """
+    按选择表达式挑选参会媒体
+    
+    select 示例: {"where": ["stance_label==Counter|Mixed", "total_questions>=3"],
+                  "sort": "-media_taihai_questions", "limit": 7}
+    """
+    if not isinstance(select, dict):
+        raise HTTPException(status_code=400, detail="select 必须是对象")
+    
+    where = select.get("where") or []
+    if isinstance(where, str):
+        where = [where]
     
-    return None
+    table = profile_store.snapshot.get_derived("media_table")
+    try:
+        media_ids, _ = table.query(
+            where=where,
+            sort=select.get("sort"),
+            limit=select.get("limit"),
+            offset=int(select.get("offset", 0))
+        )
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"选择表达式无效: {str(e)}")
+    return media_ids
+
+def sample_conference_media_ids(sampling: Dict, select: Optional[Dict] = None) -> List[List[str]]:
+    """
+    按历史活跃度加权抽取参会媒体（别名表O(1)抽样，可指定种子复现）
+    
+    sampling 示例: {"size": 7, "seed": 42, "weight": "blend", "conferences": 1}
+    提供 select 时只在筛选出的媒体中抽样
+    """
+    if not isinstance(sampling, dict):
+        raise HTTPException(status_code=400, detail="sampling 必须是对象")
+    
+    from reporter_sampler import WEIGHT_SCHEMES, build_sampler
+    
+    scheme = sampling.get("weight", "blend")
+    if scheme not in WEIGHT_SCHEMES:
+        raise HTTPException(status_code=400, detail=f"weight 必须是 {', '.join(WEIGHT_SCHEMES)} 之一")
+    try:
+        size = int(sampling.get("size", 7))
+        conferences = int(sampling.get("conferences", 1))
+        seed = sampling.get("seed")
+        seed = int(seed) if seed is not None else None
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"sampling 参数无效: {str(e)}")
+    if size < 1 or conferences < 1:
+        raise HTTPException(status_code=400, detail="size 和 conferences 必须为正整数")
+    
+    snapshot = profile_store.snapshot
+    if select:
+        # 筛选后的子集临时构建别名表（O(n)）
+        sampler = build_sampler(snapshot.get_derived("media_table"), scheme,
+                                media_ids=select_conference_media_ids(select))
+    else:
+        sampler = snapshot.get_derived("reporter_samplers")[scheme]
+    
+    if sampler.size == 0:
+        return [[] for _ in range(conferences)]
+    return sampler.sample_batch(conferences, size, seed=seed)
+
+class GeneratedText(str):
+    """生成的文本，附带本次调用的token用量（SDK的 usage 对象）与结束原因"""
+
+    def __new__(cls, text: str, usage=None, finish_reason: Optional[str] = None):
+        self = super().__new__(cls, text)
+        self.usage = usage
+        self.finish_reason = finish_reason
+        return self
+
+def extract_response_text(response) -> str:
+    """从非流式响应中解析生成文本"""
+    try:
+        # 使用 model_dump 获取完整数据
+        if hasattr(response, 'model_dump'):
+            data = response.model_dump()
+            
+            if 'choices' in data and data['choices']:
+                choice = data['choices'][0]
+                if 'message' in choice and isinstance(choice['message'], dict):
+                    message = choice['message']
+                    
+                    # 优先获取 content
+                    content = message.get('content', '')
+                    
+                    # 如果 content 为空，尝试获取 reasoning_content
+                    if not content and 'reasoning_content' in message:
+                        reasoning = message['reasoning_content']
+                        # 从推理内容中提取最终答案
+                        if reasoning:
+                            # 尝试找到类似最终答案的部分
+                            lines = reasoning.split('\n')
+                            for line in reversed(lines):  # 从最后往前找
+                                line = line.strip()
+                                if line and len(line) > 10 and not line.startswith('我需要') and not line.startswith('作为一个'):
+                                    return line
+                            
+                            # 如果没有明显答案，返回最后一段推理
+                            return reasoning[-200:] if len(reasoning) > 200 else reasoning
+                    
+                    return content
+        
+        return ""
+    except Exception as e:
+        logger.error(f"解析响应失败: {e}")
+        return ""
 
 # 修改 api_server.py 中的 generate_with_zhipuai 函数
 
 async def generate_with_zhipuai(messages: List[Dict], temperature: float = 0.7, 
-                               max_tokens: int = 300, stream: bool = False) -> Dict:
-    """调用智谱AI API生成内容"""
+                               max_tokens: int = 300, stream: bool = False,
+                               model: Optional[str] = None, thinking: Optional[bool] = None,
+                               stop: Optional[List[str]] = None) -> Dict:
+    """调用智谱AI API生成内容（model/thinking 未指定时使用全局配置）"""
     try:
-        # 配置思考模式
-        thinking_config = {"type": "enabled"} if THINKING_ENABLED else {}
+        model = model or MODEL_NAME
+        thinking = THINKING_ENABLED if thinking is None else thinking
+        
+        # 配置思考模式（路由关闭思考时对支持的模型显式关闭，避免使用模型默认值）
+        if thinking:
+            thinking_config = {"type": "enabled"}
+        elif model_router.enabled and model_router.supports_thinking(model):
+            thinking_config = {"type": "disabled"}
+        else:
+            thinking_config = {}
         
         # 构建请求参数
         params = {
-            "model": MODEL_NAME,
+            "model": model,
             "messages": messages,
             "temperature": temperature,
             "max_tokens": max_tokens,
@@ -160,53 +598,49 @@ async def generate_with_zhipuai(messages: List[Dict], temperature: float = 0.7,
         # 如果有思考模式配置，添加到参数中
         if thinking_config:
             params["thinking"] = thinking_config
+        if stop:
+            params["stop"] = stop
         
-        logger.info(f"调用智谱AI API，模型: {MODEL_NAME}, 温度: {temperature}, 流式: {stream}")
-        logger.debug(f"消息: {messages}")
+        log_prompt(logger, "调用智谱AI API", messages=messages, model=model,
+                   temperature=temperature, stream=stream)
         
-        # 调用API
-        response = client.chat.completions.create(**params)
-        try:
-            # 使用 model_dump 获取完整数据
-            if hasattr(response, 'model_dump'):
-                data = response.model_dump()
-                
-                if 'choices' in data and data['choices']:
-                    choice = data['choices'][0]
-                    if 'message' in choice and isinstance(choice['message'], dict):
-                        message = choice['message']
-                        
-                        # 优先获取 content
-                        content = message.get('content', '')
-                        
-                        # 如果 content 为空，尝试获取 reasoning_content
-                        if not content and 'reasoning_content' in message:
-                            reasoning = message['reasoning_content']
-                            # 从推理内容中提取最终答案
-                            if reasoning:
-                                # 尝试找到类似最终答案的部分
-                                lines = reasoning.split('\n')
-                                for line in reversed(lines):  # 从最后往前找
-                                    line = line.strip()
-                                    if line and len(line) > 10 and not line.startswith('我需要') and not line.startswith('作为一个'):
-                                        return line
-                                
-                                # 如果没有明显答案，返回最后一段推理
-                                return reasoning[-200:] if len(reasoning) > 200 else reasoning
-                        
-                        return content
-            
-            return ""
-        except Exception as e:
-            logger.error(f"解析响应失败: {e}")
-            return ""
+        # 调用API（SDK为同步调用，放到线程池中执行，避免阻塞事件循环）
+        loop = asyncio.get_running_loop()
+        client = await loop.run_in_executor(None, get_client)
+        started = time.perf_counter()
+        response = await loop.run_in_executor(
+            None, functools.partial(client.chat.completions.create, **params)
+        )
+        if not params["stream"]:
+            # 非流式调用的实测延迟用于模型路由
+            model_router.observe(model, thinking, (time.perf_counter() - started) * 1000)
+        if params["stream"]:
+            if stream:
+                return response
+            # 全局开启流式但调用方需要完整文本时，在线程池中拼接流式分片
+            return await loop.run_in_executor(None, collect_stream_text, response)
+        choices = getattr(response, "choices", None)
+        finish_reason = getattr(choices[0], "finish_reason", None) if choices else None
+        return GeneratedText(extract_response_text(response) or "", getattr(response, "usage", None), finish_reason)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"智谱AI API调用失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"AI API调用失败: {str(e)}")
     
     
     
+def collect_stream_text(stream_response) -> str:
+    """同步读取流式响应并拼接为完整文本"""
+    parts = []
+    for chunk in stream_response:
+        if hasattr(chunk, 'choices') and chunk.choices:
+            delta = chunk.choices[0].delta
+            if hasattr(delta, 'content') and delta.content:
+                parts.append(delta.content)
+    return "".join(parts)
+
 async def stream_response_generator(stream_response) -> AsyncGenerator[str, None]:
     """生成流式响应"""
     try:
@@ -236,30 +670,62 @@ async def root():
             "生成内容": "/generate",
             "流式生成": "/stream-generate",
             "批量生成": "/batch-generate",
-            "模拟发布会": "/simulate-press-conference"
+            "流式批量生成": "/batch-generate/ndjson",
+            "长连接通道": "/ws",
+            "模拟发布会": "/simulate-press-conference",
+            "记者抽样": "/sample-reporters",
+            "后台任务": "/jobs",
+            "在线统计": "/media/{media_id}/stats",
+            "生成记录": "/generations",
+            "立场打分": "/score-stance",
+            "启动耗时": "/startup"
         }
     }
 
 @app.get("/health")
 async def health_check():
     """健康检查"""
+    snapshot = profile_store.snapshot
     return {
         "status": "healthy",
         "timestamp": os.times().elapsed,
         "model": MODEL_NAME,
-        "media_count": len(media_profiles),
-        "user_count": len(user_profiles)
+        "media_count": len(snapshot.media),
+        "user_count": len(snapshot.users),
+        "profile_version": snapshot.version
     }
 
+async def negotiated_response(http_request: Optional[Request], payload: Any):
+    """批量接口的响应：按 Accept/Accept-Encoding 协商 MessagePack 与 zstd/gzip 压缩，序列化与压缩在线程池中执行；
+    内部调用（http_request 为 None）时直接返回原始数据"""
+    if http_request is None:
+        return payload
+    media_type, encoding = response_encoder.negotiate(http_request.headers)
+    loop = asyncio.get_running_loop()
+    body, headers = await loop.run_in_executor(None, response_encoder.encode, payload, media_type, encoding)
+    return Response(content=body, headers=headers)
+
+async def negotiated_cached_response(http_request: Request, body: bytes, etag: str,
+                                     if_none_match: Optional[str]) -> Response:
+    """预序列化负载的协商响应：各编码版本按 ETag 缓存，ETag 带编码后缀"""
+    media_type, encoding = response_encoder.negotiate(http_request.headers)
+    if media_type == JSON_TYPE and (encoding is None or len(body) < response_encoder.min_bytes):
+        return cached_json_response(body, etag, if_none_match, VARY_HEADERS)
+    loop = asyncio.get_running_loop()
+    body, etag, headers = await loop.run_in_executor(None, response_encoder.variant, body, etag, media_type, encoding)
+    return cached_json_response(body, etag, if_none_match, headers)
+
 @app.get("/media/{media_id}")
-async def get_media_profile(media_id: str):
-    """获取媒体详细信息"""
+async def get_media_profile(media_id: str, http_request: Request, if_none_match: Optional[str] = Header(None)):
+    """获取媒体详细信息（预序列化，支持ETag/304）"""
     try:
-        profile = find_media_by_id_or_name(media_id)
-        if not profile:
+        snapshot = profile_store.snapshot
+        resolved_id = snapshot.resolve_media_id(media_id)
+        if resolved_id is None:
             raise HTTPException(status_code=404, detail=f"媒体 '{media_id}' 不存在")
         
-        return profile
+        body, etag = snapshot.get_derived("payloads")["media"][resolved_id]
+        return await negotiated_cached_response(http_request, body, etag, if_none_match)
     except HTTPException:
         raise
     except Exception as e:
@@ -267,106 +733,262 @@ async def get_media_profile(media_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/media")
-async def get_all_media():
-    """获取所有媒体列表（简略信息）"""
+async def get_all_media(http_request: Request, if_none_match: Optional[str] = Header(None),
+                        where: Optional[List[str]] = Query(None),
+                        sort: Optional[str] = None,
+                        limit: Optional[int] = None,
+                        offset: int = 0):
+    """
+    获取媒体列表（简略信息）
+    
+    不带查询参数时返回预序列化的完整列表（支持ETag/304）；
+    where 可重复传入多个条件（AND），如 where=stance_label==Aligned&where=aligned_ratio>=0.5，
+    sort 为逗号分隔的排序字段（前缀 - 表示降序），limit/offset 用于分页
+    """
     try:
-        result = []
-        for media_id, profile in media_profiles.items():
-            basic_info = profile.get("basic_info", {})
-            taiwan_analysis = profile.get("taiwan_issue_analysis", {})
-            generation_params = profile.get("generation_parameters", {})
-            
-            media_info = {
-                "id": media_id,
-                "name": basic_info.get("name", "未知"),
-                "country": basic_info.get("country", "未知"),
-                "media_type": basic_info.get("media_type", "未知"),
-                "ownership": basic_info.get("ownership", "未知"),
-                "stance_label": taiwan_analysis.get("stance_label", "未知"),
-                "total_questions": taiwan_analysis.get("total_questions", 0),
-                "counter_ratio": taiwan_analysis.get("counter_ratio", 0),
-                "aligned_ratio": taiwan_analysis.get("aligned_ratio", 0),
-                "question_style": generation_params.get("question_style", "未知")
-            }
-            result.append(media_info)
+        snapshot = profile_store.snapshot
+        payloads = snapshot.get_derived("payloads")
+        if not where and not sort and limit is None and not offset:
+            body, etag = payloads["media_list"]
+            return await negotiated_cached_response(http_request, body, etag, if_none_match)
+        
+        table = snapshot.get_derived("media_table")
+        try:
+            media_ids, total = table.query(where=where, sort=sort, limit=limit, offset=offset)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        return {
+        positions = snapshot.get_derived("media_positions")
+        summaries = payloads["summaries"]
+        result = [summaries[positions[media_id]] for media_id in media_ids]
+        return await negotiated_response(http_request, {
             "count": len(result),
+            "total": total,
+            "offset": offset,
             "media": result
-        }
+        })
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取媒体列表失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/user/{user_id}")
-async def get_user_profile(user_id: str):
-    """获取用户信息"""
+async def get_user_profile(user_id: str, if_none_match: Optional[str] = Header(None)):
+    """获取用户信息（预序列化，支持ETag/304）"""
     try:
-        if user_id not in user_profiles:
+        user_payloads = profile_store.snapshot.get_derived("payloads")["users"]
+        if user_id not in user_payloads:
             raise HTTPException(status_code=404, detail="用户不存在")
-        return user_profiles[user_id]
+        body, etag = user_payloads[user_id]
+        return cached_json_response(body, etag, if_none_match)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"获取用户信息失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/score-stance")
+async def score_stance(request: StanceRequest, http_request: Request = None):
+    """批量为文本打立场得分（aligned/counter/neutral）并粗分议题类别"""
+    if len(request.texts) > 10000:
+        raise HTTPException(status_code=400, detail="单次最多 10000 条文本")
+    loop = asyncio.get_running_loop()
+    scorer = await loop.run_in_executor(None, get_stance_scorer)
+    results = await loop.run_in_executor(None, scorer.score_batch, request.texts)
+    return await negotiated_response(http_request, {"count": len(results), "results": results})
+
+def resolve_media_or_404(media_id: str) -> str:
+    resolved = profile_store.snapshot.resolve_media_id(media_id)
+    if resolved is None:
+        raise HTTPException(status_code=404, detail=f"媒体 '{media_id}' 不存在")
+    return resolved
+
+@app.post("/media/{media_id}/observations")
+async def add_media_observations(media_id: str, request: ObservationRequest):
+    """计入新生成的提问，在线更新该媒体的 taiwan_issue_analysis（每条 O(1)，不重写档案文件）"""
+    media_id = resolve_media_or_404(media_id)
+    try:
+        observations = [validate_observation(observation) for observation in request.observations]
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    total = profile_stats.observe(media_id, profile_store.snapshot.media[media_id], observations)
+    return {"media_id": media_id, "accepted": len(observations), "observations": total}
+
+@app.get("/media/{media_id}/stats")
+async def get_media_stats(media_id: str):
+    """查看媒体的在线统计：当前提示词使用的 taiwan_issue_analysis 与档案原值"""
+    media_id = resolve_media_or_404(media_id)
+    profile = profile_store.snapshot.media[media_id]
+    base = profile.get("taiwan_issue_analysis", {})
+    return {
+        "media_id": media_id,
+        **profile_stats.info(media_id),
+        "taiwan_issue_analysis": profile_stats.analysis(media_id, profile) or base,
+        "profile_taiwan_issue_analysis": base
+    }
+
+@app.delete("/media/{media_id}/observations")
+async def reset_media_observations(media_id: str):
+    """清除媒体的在线统计，恢复使用档案原值"""
+    media_id = resolve_media_or_404(media_id)
+    loop = asyncio.get_running_loop()
+    removed = await loop.run_in_executor(None, profile_stats.reset, media_id)
+    return {"media_id": media_id, "reset": removed}
+
+def attach_stance(request: AgentRequest, result: Dict):
+    """按请求或全局配置为生成结果附加立场得分（缓存结果已有得分时不重复计算）"""
+    enabled = request.score_stance if request.score_stance is not None else STANCE_SCORING
+    if enabled and "stance" not in result:
+        result["stance"] = get_stance_scorer().score(result["content"])
+
+def feed_back_stance(request: AgentRequest, result: Dict):
+    """将新生成媒体提问的立场标签、议题类别与长度计入该媒体的档案在线统计
+
+    打分器的三项得分是 softmax 概率（之和为 1），与档案 avg_*_score 不同口径，不计入平均得分
+    """
+    stance = result.get("stance")
+    if not STANCE_FEEDBACK or stance is None or request.agent_type != "media":
+        return
+    snapshot = profile_store.snapshot
+    media_id = snapshot.resolve_media_id(request.agent_id)
+    if media_id is None:
+        return
+    observation = validate_observation({"stance_label": stance["stance_label"],
+                                        "issue_category": stance.get("issue_category"),
+                                        "question": result["content"]})
+    profile_stats.observe(media_id, snapshot.media[media_id], [observation])
+
+def store_content(agent_type: str, agent_id: str, topic: str, context: str, content: str, started: float,
+                  usage: Optional[Dict] = None, **fields):
+    """将一条生成内容放入内容存储的写入缓冲；缓冲积满时在线程池中提前落库"""
+    if content_store is None:
+        return
+    usage = usage or {}
+    content_store.record(
+        agent_type=agent_type,
+        agent_id=agent_id,
+        topic=topic,
+        context_hash=context_hash(context),
+        prompt_tokens=usage.get("prompt_tokens"),
+        completion_tokens=usage.get("completion_tokens"),
+        total_tokens=usage.get("total_tokens"),
+        latency_ms=round((time.perf_counter() - started) * 1000, 1),
+        content=content,
+        **fields
+    )
+    if content_store.needs_flush:
+        asyncio.get_running_loop().run_in_executor(None, content_store.flush)
+
+def usage_fields(usage) -> Dict:
+    """SDK 的 usage 对象转为字典（没有用量时为空）"""
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": getattr(usage, 'prompt_tokens', 0),
+        "completion_tokens": getattr(usage, 'completion_tokens', 0),
+        "total_tokens": getattr(usage, 'total_tokens', 0)
+    }
+
+def record_generation(request: AgentRequest, result: Dict, started: float):
+    """记录一次智能体生成结果"""
+    metadata = result["metadata"]
+    store_content(
+        request.agent_type, request.agent_id, request.topic, request.context, result["content"], started,
+        usage=metadata.get("tokens_used"),
+        session_id=request.session_id,
+        tick=request.tick,
+        model=metadata.get("model"),
+        temperature=metadata.get("temperature"),
+        max_tokens=metadata.get("max_tokens"),
+        cache=metadata.get("cache")
+    )
+
+def request_slo_ms(request: AgentRequest, http_request: Optional[Request]) -> Optional[float]:
+    """延迟目标：请求头优先，其次为请求体字段"""
+    if http_request is not None:
+        value = http_request.headers.get(LATENCY_SLO_HEADER)
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"{LATENCY_SLO_HEADER} 必须是数值（毫秒）")
+    return request.latency_slo_ms
+
 @app.post("/generate")
-async def generate_content(request: AgentRequest):
-    """根据智能体属性生成内容（非流式）"""
+async def generate_content(request: AgentRequest, http_request: Request = None):
+    """根据智能体属性生成内容（非流式）；模型与思考模式由路由策略选择，决策见 metadata.routing"""
+    started = time.perf_counter()
     try:
         logger.info(f"生成请求: {request.agent_type} - {request.agent_id} - {request.topic}")
+        shared_state.incr("generate_requests")
         
-        # 获取智能体属性
-        if request.agent_type == "media":
-            profile = find_media_by_id_or_name(request.agent_id)
-            if not profile:
-                raise HTTPException(status_code=404, detail=f"媒体 '{request.agent_id}' 不存在")
-            
-            merged_attributes = {**profile, **request.attributes}
-            
-            # 获取媒体提问的提示词
-            prompt = get_media_prompt(
-                topic=request.topic,
-                attributes=merged_attributes,
-                context=request.context
-            )
-            logger.info(f"媒体提示词: {prompt}")
-            
-        elif request.agent_type == "user":
-            if request.agent_id not in user_profiles:
-                raise HTTPException(status_code=404, detail="用户不存在")
-            
-            profile = user_profiles[request.agent_id]
-            merged_attributes = {**profile, **request.attributes}
-            
-            # 获取用户评论的提示词
-            prompt = get_user_prompt(
-                topic=request.topic,
-                attributes=merged_attributes,
-                context=request.context
-            )
-        else:
-            raise HTTPException(status_code=400, detail="agent_type 必须是 'media' 或 'user'")
+        # 根据智能体档案构建提示词
+        profile = resolve_agent_profile(request.agent_type, request.agent_id, request.attributes)
+        prompt = render_agent_prompt(request.agent_type, request.agent_id, profile,
+                                     request.topic, request.context)
         
-        # 准备生成参数
+        # 准备生成参数（未指定 max_tokens 时按档案的长度上限确定输出预算）
         temperature = request.temperature if request.temperature is not None else 0.7
-        max_tokens = request.max_tokens if request.max_tokens is not None else 300
         stream = request.stream if request.stream is not None else False
+        routing = model_router.route(request.agent_type, len(prompt), request_slo_ms(request, http_request))
+        max_tokens, stop, max_chars, budget_source = output_limits(request, profile, routing.thinking)
+        
+        # 共享生成缓存（所有工作进程可见）：提示词与参数完全相同时直接返回
+        key = None
+        if GENERATION_CACHE_TTL > 0 and not stream:
+            key = cache_key(routing.model, routing.thinking, prompt, temperature, max_tokens,
+                            *((request.transcript,) if request.transcript else ()),
+                            *(("variant", request.variant) if request.variant is not None else ()))
+            loop = asyncio.get_running_loop()
+            cached = await loop.run_in_executor(None, shared_state.cache_get, key)
+            if cached is not None:
+                shared_state.incr("generation_cache_hits")
+                cached["agent_id"] = request.agent_id
+                cached["metadata"]["cache"] = "hit"
+                attach_stance(request, cached)
+                record_generation(request, cached, started)
+                return cached
+        
+        # 语义缓存：同一智能体、相同生成参数与档案版本下，议题和背景信息足够相近时复用结果
+        semantic_partition = None
+        if semantic_cache is not None and not stream and not request.transcript:
+            snapshot = profile_store.snapshot
+            stats_id = snapshot.resolve_media_id(request.agent_id) if request.agent_type == "media" else None
+            semantic_partition = cache_key(routing.model, routing.thinking, request.agent_type, request.agent_id,
+                                           request.attributes, temperature, max_tokens, snapshot.version,
+                                           profile_stats.version(stats_id) if stats_id else 0, request.variant)
+            found = semantic_cache.lookup(semantic_partition, request.topic, request.context)
+            if found is not None:
+                value, similarity, cached_topic = found
+                shared_state.incr("semantic_cache_hits")
+                result = {
+                    **value,
+                    "agent_id": request.agent_id,
+                    "metadata": {**value["metadata"], "cache": "semantic",
+                                 "semantic_similarity": round(similarity, 4), "cached_topic": cached_topic}
+                }
+                attach_stance(request, result)
+                record_generation(request, result, started)
+                return result
         
         # 构建消息
+        # 会议记录在前、智能体提示词在后，同一场发布会的各记者共享相同的前缀
+        system_content = f"{request.transcript}\n\n{prompt}" if request.transcript else prompt
         messages = [
-            {"role": "system", "content": prompt},
+            {"role": "system", "content": system_content},
             {"role": "user", "content": prompt}
         ]
-        logger.info(f"消息: {messages}")
         
         # 调用智谱AI API
         response = await generate_with_zhipuai(
             messages=messages,
             temperature=temperature,
             max_tokens=max_tokens,
-            stream=stream
+            stream=stream,
+            model=routing.model,
+            thinking=routing.thinking,
+            stop=stop
         )
         
         # 处理响应
@@ -377,81 +999,80 @@ async def generate_content(request: AgentRequest):
                 content_parts.append(chunk)
             generated_text = "".join(content_parts)
         else:
-            # 非流式响应
-            if hasattr(response, 'choices') and response.choices:
+            # 非流式响应（generate_with_zhipuai 已将结果解析为文本）
+            if isinstance(response, str):
+                generated_text = response
+            elif hasattr(response, 'choices') and response.choices:
                 generated_text = response.choices[0].message.reasoning_content
             else:
                 raise HTTPException(status_code=500, detail="AI API返回格式异常")
         
         # 获取使用情况
-        usage = {}
-        if hasattr(response, 'usage'):
-            usage = {
-                "prompt_tokens": getattr(response.usage, 'prompt_tokens', 0),
-                "completion_tokens": getattr(response.usage, 'completion_tokens', 0),
-                "total_tokens": getattr(response.usage, 'total_tokens', 0)
-            }
+        usage = usage_fields(getattr(response, 'usage', None))
+        
+        # 后处理：只保留完整的第一条提问/评论（因长度截断时去掉末尾不完整的句子）
+        content = generated_text.strip()
+        output = {"source": budget_source, "max_chars": max_chars, "trimmed_chars": 0}
+        if max_chars is not None:
+            finish_reason = getattr(response, "finish_reason", None)
+            trimmed = trim_output(content, max_chars, truncated=finish_reason == "length")
+            output["trimmed_chars"] = len(content) - len(trimmed)
+            output["finish_reason"] = finish_reason
+            content = trimmed
         
         result = {
             "agent_id": request.agent_id,
             "agent_type": request.agent_type,
-            "content": generated_text.strip(),
+            "content": content,
             "metadata": {
-                "model": MODEL_NAME,
+                "model": routing.model,
                 "temperature": temperature,
                 "max_tokens": max_tokens,
                 "stream": stream,
                 "tokens_used": usage,
-                "prompt_length": len(prompt)
+                "prompt_length": len(prompt),
+                "output_budget": output,
+                "routing": routing.to_dict()
             }
         }
+        if request.transcript:
+            result["metadata"]["transcript_length"] = len(request.transcript)
+        
+        attach_stance(request, result)
+        feed_back_stance(request, result)
         
-        logger.info(f"生成成功: {result['agent_type']} - {result['agent_id']} - 长度: {len(generated_text)}")
+        shared_state.incr("generations")
+        if key is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, shared_state.cache_set, key, result, GENERATION_CACHE_TTL)
+        if semantic_partition is not None:
+            semantic_cache.insert(semantic_partition, request.topic, request.context,
+                                  {**result, "metadata": dict(result["metadata"])})
+        
+        record_generation(request, result, started)
+        logger.info(f"生成成功: {result['agent_type']} - {result['agent_id']} - 长度: {len(content)}")
         return result
         
     except HTTPException:
+        shared_state.incr("generate_errors")
         raise
     except Exception as e:
+        shared_state.incr("generate_errors")
         logger.error(f"生成内容失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
 
 @app.post("/stream-generate")
 async def stream_generate_content(request: StreamRequest):
-    """流式生成内容（Server-Sent Events）"""
+    """流式生成内容（Server-Sent Events）；完整输出在流结束后计入内容存储"""
+    started = time.perf_counter()
     try:
         logger.info(f"流式生成请求: {request.agent_type} - {request.agent_id} - {request.topic}")
         
-        # 获取智能体属性
-        if request.agent_type == "media":
-            profile = find_media_by_id_or_name(request.agent_id)
-            if not profile:
-                raise HTTPException(status_code=404, detail=f"媒体 '{request.agent_id}' 不存在")
-            
-            merged_attributes = {**profile, **request.attributes}
-            
-            # 获取媒体提问的提示词
-            prompt = get_media_prompt(
-                topic=request.topic,
-                attributes=merged_attributes,
-                context=request.context
-            )
-            logger.info(f"媒体提示词: {prompt}")
-            
-        elif request.agent_type == "user":
-            if request.agent_id not in user_profiles:
-                raise HTTPException(status_code=404, detail="用户不存在")
-            
-            profile = user_profiles[request.agent_id]
-            merged_attributes = {**profile, **request.attributes}
-            
-            # 获取用户评论的提示词
-            prompt = get_user_prompt(
-                topic=request.topic,
-                attributes=merged_attributes,
-                context=request.context
-            )
-        else:
-            raise HTTPException(status_code=400, detail="agent_type 必须是 'media' 或 'user'")
+        # 根据智能体档案构建提示词
+        profile = resolve_agent_profile(request.agent_type, request.agent_id, request.attributes)
+        prompt = render_agent_prompt(request.agent_type, request.agent_id, profile,
+                                     request.topic, request.context)
+        max_tokens, stop, _, _ = output_limits(request, profile, THINKING_ENABLED)
         
         # 构建消息
         messages = [
@@ -463,8 +1084,9 @@ async def stream_generate_content(request: StreamRequest):
         response = await generate_with_zhipuai(
             messages=messages,
             temperature=0.7,
-            max_tokens=300,
-            stream=True
+            max_tokens=max_tokens,
+            stream=True,
+            stop=stop
         )
         
         # 返回流式响应
@@ -474,10 +1096,15 @@ async def stream_generate_content(request: StreamRequest):
                 yield f"data: {json.dumps({'event': 'start', 'agent_id': request.agent_id, 'agent_type': request.agent_type})}\n\n"
                 
                 # 发送内容流
+                chunks = []
                 async for chunk in stream_response_generator(response):
                     if chunk:
+                        chunks.append(chunk)
                         yield f"data: {json.dumps({'event': 'content', 'chunk': chunk})}\n\n"
                 
+                store_content(request.agent_type, request.agent_id, request.topic, request.context,
+                              "".join(chunks), started, model=MODEL_NAME, temperature=0.7, max_tokens=max_tokens)
+                
                 # 发送结束事件
                 yield f"data: {json.dumps({'event': 'end'})}\n\n"
                 
@@ -503,8 +1130,8 @@ async def stream_generate_content(request: StreamRequest):
         )
 
 @app.post("/batch-generate")
-async def batch_generate_content(batch_request: BatchRequest):
-    """批量生成内容"""
+async def batch_generate_content(batch_request: BatchRequest, http_request: Request = None):
+    """批量生成内容（X-Latency-SLO-Ms 请求头对每个子请求生效）"""
     try:
         results = []
         errors = []
@@ -520,10 +1147,15 @@ async def batch_generate_content(batch_request: BatchRequest):
                     context=req.context,
                     temperature=req.temperature,
                     max_tokens=req.max_tokens,
-                    stream=False  # 批量请求不使用流式
+                    stream=False,  # 批量请求不使用流式
+                    session_id=req.session_id,
+                    tick=req.tick,
+                    score_stance=req.score_stance,
+                    latency_slo_ms=req.latency_slo_ms,
+                    variant=req.variant
                 )
                 
-                result = await generate_content(agent_request)
+                result = await generate_content(agent_request, http_request)
                 results.append(result)
                 
             except Exception as e:
@@ -533,19 +1165,334 @@ async def batch_generate_content(batch_request: BatchRequest):
                     "error": str(e)
                 })
         
-        return {
+        return await negotiated_response(http_request, {
             "success_count": len(results),
             "error_count": len(errors),
             "results": results,
             "errors": errors
-        }
+        })
         
     except Exception as e:
         logger.error(f"批量生成失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/batch-generate/ndjson")
+async def batch_generate_ndjson(http_request: Request):
+    """NDJSON 流式批量生成：请求体每行一个 AgentRequest（可带 id 字段，缺省为从0开始的行号），
+    边接收边解析、边生成，结果按完成顺序逐行返回：
+    
+        {"id": ..., "line": 行号, "result": 生成结果}
+        {"id": ..., "line": 行号, "status": 状态码, "error": 错误信息}
+        {"done": true, "lines": 行数, "success_count": ..., "error_count": ...}    # 最后一行
+    
+    同时生成的条数由 NDJSON_MAX_INFLIGHT 限制，达到上限或结果未被取走时暂停读取请求体，
+    内存占用与批量大小无关（客户端需边上传边读取响应）
+    """
+    results: asyncio.Queue = asyncio.Queue(maxsize=max(1, NDJSON_MAX_INFLIGHT) * 2)
+    semaphore = asyncio.Semaphore(max(1, NDJSON_MAX_INFLIGHT))
+    lines = 0
+    
+    async def run_item(line_no: int, item_id, agent_request: AgentRequest):
+        try:
+            result = await generate_content(agent_request, http_request)
+            await results.put({"id": item_id, "line": line_no, "result": result})
+        except HTTPException as e:
+            await results.put({"id": item_id, "line": line_no, "status": e.status_code, "error": e.detail})
+        finally:
+            semaphore.release()
+    
+    async def start_line(raw: bytes, tasks: set):
+        nonlocal lines
+        line_no = lines
+        lines += 1
+        if not raw.strip():
+            return
+        try:
+            record = loads_bytes(raw)
+            if not isinstance(record, dict):
+                raise ValueError("每行必须是JSON对象")
+        except ValueError as e:
+            await results.put({"id": line_no, "line": line_no, "status": 400, "error": f"JSON解析失败: {e}"})
+            return
+        item_id = record.pop("id", line_no)
+        try:
+            agent_request = AgentRequest(**{**record, "stream": False})
+        except ValidationError as e:
+            await results.put({"id": item_id, "line": line_no, "status": 422,
+                               "error": [{"loc": list(err["loc"]), "msg": err["msg"]} for err in e.errors()]})
+            return
+        await semaphore.acquire()
+        task = asyncio.create_task(run_item(line_no, item_id, agent_request))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    
+    async def read_lines():
+        """按行切分请求体并启动生成；正常结束或出错后放入结束标记"""
+        tasks = set()
+        buffer = bytearray()
+        skipping = False  # 超长行：丢弃到下一个换行符为止
+        try:
+            async for chunk in http_request.stream():
+                buffer.extend(chunk)
+                while True:
+                    end = buffer.find(b"\n")
+                    if end < 0:
+                        break
+                    raw = bytes(buffer[:end])
+                    del buffer[:end + 1]
+                    if skipping:
+                        skipping = False
+                        continue
+                    await start_line(raw, tasks)
+                if len(buffer) > NDJSON_MAX_LINE_BYTES:
+                    await results.put({"id": lines, "line": lines, "status": 413,
+                                       "error": f"单行超过 {NDJSON_MAX_LINE_BYTES} 字节"})
+                    lines += 1
+                    buffer.clear()
+                    skipping = True
+            if buffer and not skipping:
+                await start_line(bytes(buffer), tasks)
+            await asyncio.gather(*tasks)
+        except ClientDisconnect:
+            logger.info("NDJSON批量生成: 客户端已断开")
+        except Exception as e:
+            logger.error(f"NDJSON批量生成读取失败: {str(e)}", exc_info=True)
+            await results.put({"id": None, "line": None, "status": 500, "error": str(e)})
+        finally:
+            for task in list(tasks):
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await results.put(None)
+    
+    async def result_lines():
+        reader = asyncio.create_task(read_lines())
+        success_count = error_count = 0
+        try:
+            while True:
+                item = await results.get()
+                if item is None:
+                    break
+                if "result" in item:
+                    success_count += 1
+                else:
+                    error_count += 1
+                yield dumps_bytes(item) + b"\n"
+            yield dumps_bytes({"done": True, "lines": lines, "success_count": success_count,
+                               "error_count": error_count}) + b"\n"
+        finally:
+            # 推送中断（客户端断开）时停止读取并取消未完成的生成
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+    
+    return DuplexStreamingResponse(result_lines(), media_type="application/x-ndjson")
+
+@app.websocket("/ws")
+async def websocket_channel(websocket: WebSocket):
+    """长连接通道：一个连接上复用多个带 id 的请求，结果完成即推送（不按请求顺序）
+
+    客户端消息：{"id": ..., "op": "generate" | "tick" | "ping", "data": {...}}
+    - generate：data 为 AgentRequest，推送 {"id", "type": "result", "data": 生成结果}
+    - tick：data 为 {"session_id", "tick", "requests": [AgentRequest, ...]}，子请求并发执行，每个完成即推送
+      {"id", "type": "result", "index", "data"}，全部完成后推送 {"id", "type": "done", "tick", "success_count", "error_count"}
+    - ping：推送 {"id", "type": "pong"}
+    同时处理的消息数与同时进行的生成数（tick 的每个子请求各计一个）均不超过 WS_MAX_INFLIGHT
+    出错时推送 {"id", "type": "error", "status", "detail"}（tick 子请求的错误带 index）
+    """
+    await websocket.accept()
+    shared_state.incr("ws_connections")
+    send_lock = asyncio.Lock()
+    inflight = asyncio.Semaphore(max(1, WS_MAX_INFLIGHT))
+    generations = asyncio.Semaphore(max(1, WS_MAX_INFLIGHT))
+    tasks = set()
+    
+    async def emit(message: Dict):
+        async with send_lock:
+            # 客户端已断开时丢弃（未完成的任务随后在 finally 中取消）
+            with contextlib.suppress(WebSocketDisconnect, RuntimeError):
+                await websocket.send_text(dumps_bytes(message).decode("utf-8"))
+    
+    async def generate_one(request_id, index: Optional[int], agent_request: AgentRequest) -> bool:
+        tag = {"id": request_id} if index is None else {"id": request_id, "index": index}
+        try:
+            # tick 的子请求逐个占用生成名额，单条消息不能绕过连接的并发上限
+            async with generations:
+                result = await generate_content(agent_request)
+        except HTTPException as e:
+            await emit({**tag, "type": "error", "status": e.status_code, "detail": e.detail})
+            return False
+        await emit({**tag, "type": "result", "data": result})
+        return True
+    
+    async def handle(message: Dict):
+        request_id, op = message.get("id"), message.get("op")
+        try:
+            data = message.get("data") or {}
+            if op == "generate":
+                await generate_one(request_id, None, AgentRequest(**{**data, "stream": False}))
+            elif op == "tick":
+                tick_request = TickRequest(**data)
+                outcomes = await asyncio.gather(*(
+                    generate_one(request_id, i, req.model_copy(update={
+                        "stream": False,
+                        "session_id": req.session_id or tick_request.session_id,
+                        "tick": req.tick if req.tick is not None else tick_request.tick
+                    }))
+                    for i, req in enumerate(tick_request.requests)
+                ))
+                await emit({"id": request_id, "type": "done", "tick": tick_request.tick,
+                            "success_count": sum(outcomes), "error_count": len(outcomes) - sum(outcomes)})
+            elif op == "ping":
+                await emit({"id": request_id, "type": "pong"})
+            else:
+                await emit({"id": request_id, "type": "error", "status": 400,
+                            "detail": "op 必须是 'generate'、'tick' 或 'ping'"})
+        except ValidationError as e:
+            await emit({"id": request_id, "type": "error", "status": 422,
+                        "detail": [{"loc": list(err["loc"]), "msg": err["msg"]} for err in e.errors()]})
+        except Exception as e:
+            logger.error(f"WebSocket请求处理失败: {str(e)}", exc_info=True)
+            await emit({"id": request_id, "type": "error", "status": 500, "detail": str(e)})
+        finally:
+            inflight.release()
+    
+    try:
+        while True:
+            received = await websocket.receive()
+            if received["type"] == "websocket.disconnect":
+                break
+            raw = received.get("text") or received.get("bytes") or ""
+            try:
+                message = loads_bytes(raw.encode("utf-8") if isinstance(raw, str) else raw)
+                if not isinstance(message, dict):
+                    raise ValueError
+            except ValueError:
+                await emit({"id": None, "type": "error", "status": 400, "detail": "消息必须是JSON对象"})
+                continue
+            shared_state.incr("ws_messages")
+            # 同时处理的消息数达到上限时暂停读取，由TCP背压限制客户端
+            await inflight.acquire()
+            task = asyncio.create_task(handle(message))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in list(tasks):
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+@app.post("/sample-reporters")
+async def sample_reporters(request: dict):
+    """为多场发布会批量抽取参会媒体（按历史活跃度加权）"""
+    draws = sample_conference_media_ids(request, request.get("select"))
+    return {
+        "conferences": len(draws),
+        "size": int(request.get("size", 7)),
+        "weight": request.get("weight", "blend"),
+        "seed": request.get("seed"),
+        "draws": draws
+    }
+
+async def summarize_transcript(transcript: ConferenceTranscript):
+    """将移出近期窗口的问答压缩进摘要（后台执行，失败或超时时改用抽取式摘要）"""
+    previous, entries = transcript.begin_summary()
+    summary = None
+    try:
+        prompt = get_transcript_summary_prompt(previous, "\n".join(entries), transcript.summary_chars)
+        summary = await asyncio.wait_for(generate_with_zhipuai(
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3,
+            max_tokens=transcript.summary_chars
+        ), timeout=60) or None
+    except Exception as e:
+        logger.warning(f"发布会记录摘要失败，改用抽取式摘要: {str(e)}")
+    transcript.finish_summary(summary)
+
+async def run_multi_round_conference(request: dict, topic: str, media_ids: List[str],
+                                     context: str) -> AsyncGenerator[Dict, None]:
+    """多轮发布会：记者依次提问、发言人作答，后续轮次可追问；产出事件字典"""
+    rounds = max(1, int(request.get("rounds", 1)))
+    answers = bool(request.get("answers", True))
+    media_profiles = profile_store.snapshot.media
+    transcript = ConferenceTranscript(
+        topic, context,
+        recent_chars=int(request.get("recent_chars", CONFERENCE_RECENT_CHARS)),
+        summary_chars=int(request.get("summary_chars", CONFERENCE_SUMMARY_CHARS)),
+        summary_every=int(request.get("summary_every", CONFERENCE_SUMMARY_EVERY))
+    )
+    summary_task = None
+    
+    yield {"event": "start", "topic": topic, "total_media": len(media_ids), "rounds": rounds}
+    try:
+        for round_no in range(1, rounds + 1):
+            yield {"event": "round_start", "round": round_no}
+            reporter_context = context if round_no == 1 else \
+                f"{context}\n第{round_no}轮提问：可针对发言人此前的回答追问，避免重复已经提过的问题".strip()
+            for i, media_id in enumerate(media_ids):
+                if media_id not in media_profiles:
+                    continue
+                media_name = media_profiles[media_id].get("basic_info", {}).get("name", media_id)
+                yield {"event": "media_start", "media_id": media_id, "media_name": media_name,
+                       "index": i, "round": round_no}
+                stage = "question"
+                try:
+                    result = await generate_content(AgentRequest(
+                        agent_type="media",
+                        agent_id=media_id,
+                        topic=topic,
+                        context=reporter_context,
+                        temperature=0.7,
+                        max_tokens=CONFERENCE_MAX_TOKENS,
+                        stream=False,
+                        session_id=request.get("session_id"),
+                        tick=request.get("tick"),
+                        transcript=transcript.render()
+                    ))
+                    question = result.get("content", "")
+                    transcript.add(f"{media_name}记者", question)
+                    yield {"event": "question", "media_id": media_id, "index": i, "round": round_no, "question": question,
+                           "transcript_length": result["metadata"].get("transcript_length", 0)}
+                    
+                    if answers:
+                        stage = "answer"
+                        prompt = get_spokesperson_prompt(topic, media_name, question)
+                        answer_started = time.perf_counter()
+                        answer = await generate_with_zhipuai(
+                            messages=[
+                                {"role": "system", "content": f"{transcript.render()}\n\n{prompt}"},
+                                {"role": "user", "content": question}
+                            ],
+                            temperature=0.5,
+                            max_tokens=300
+                        )
+                        usage = usage_fields(getattr(answer, "usage", None))
+                        answer = str(answer).strip()
+                        # 发言人回答以所答的提问为背景信息计入内容存储
+                        store_content("spokesperson", "发言人", topic, question, answer, answer_started,
+                                      usage=usage, session_id=request.get("session_id"), tick=request.get("tick"),
+                                      model=MODEL_NAME, temperature=0.5, max_tokens=300)
+                        transcript.add("发言人", answer)
+                        yield {"event": "answer", "media_id": media_id, "index": i, "round": round_no, "answer": answer}
+                except Exception as e:
+                    message = str(getattr(e, "detail", None) or e)
+                    logger.warning(f"媒体 {media_id} 第{round_no}轮{'提问' if stage == 'question' else '发言人回答'}"
+                                   f"失败: {message}")
+                    # stage 区分提问失败与回答失败（回答失败时提问已产出并写入会议记录）
+                    yield {"event": "error", "media_id": media_id, "index": i, "round": round_no, "stage": stage,
+                           "message": message}
+                
+                # 待摘要的发言够数时在后台摘要，不阻塞下一位记者
+                if transcript.needs_summary() and (summary_task is None or summary_task.done()):
+                    summary_task = asyncio.create_task(summarize_transcript(transcript))
+        
+        yield {"event": "end", "message": "新闻发布会结束", "transcript": transcript.stats(),
+               "summary": transcript.summary}
+    finally:
+        if summary_task is not None and not summary_task.done():
+            summary_task.cancel()
+
 @app.post("/simulate-press-conference")
-async def simulate_press_conference(request: dict):
+async def simulate_press_conference(request: dict, http_request: Request = None):
     """模拟新闻发布会"""
     try:
         topic = request.get("topic", "")
@@ -556,27 +1503,87 @@ async def simulate_press_conference(request: dict):
         if not topic:
             raise HTTPException(status_code=400, detail="需要提供议题")
         
+        if not media_ids and request.get("sampling"):
+            media_ids = sample_conference_media_ids(request["sampling"], request.get("select"))[0]
+        elif not media_ids and request.get("select"):
+            media_ids = select_conference_media_ids(request["select"])
+        
         if not media_ids:
-            # 如果没有指定媒体，使用前5个Aligned媒体和前2个非Aligned媒体
-            aligned_medias = []
-            other_medias = []
-            
-            for media_id, profile in media_profiles.items():
-                taiwan_analysis = profile.get("taiwan_issue_analysis", {})
-                if taiwan_analysis.get("stance_label") == "Aligned":
-                    aligned_medias.append(media_id)
-                else:
-                    other_medias.append(media_id)
+            media_ids = default_conference_media_ids()
+        
+        if int(request.get("rounds", 1)) > 1 or request.get("transcript"):
+            # 多轮发布会（滚动会议记录，含发言人回答与追问）
+            events = run_multi_round_conference(request, topic, media_ids, context)
+            if stream:
+                async def multi_round_stream_generator():
+                    async for event in events:
+                        yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+                
+                return StreamingResponse(
+                    multi_round_stream_generator(),
+                    media_type="text/event-stream",
+                    headers={
+                        "Cache-Control": "no-cache",
+                        "Connection": "keep-alive"
+                    }
+                )
             
-            media_ids = aligned_medias[:5] + other_medias[:2]
+            turns = {}
+            end = {}
+            async for event in events:
+                key = (event.get("round"), event.get("index"))
+                if event["event"] == "question":
+                    turns[key] = {"round": event["round"], "agent_id": event["media_id"], "content": event["question"],
+                                  "transcript_length": event["transcript_length"]}
+                elif event["event"] == "answer":
+                    turns[key]["answer"] = event["answer"]
+                elif event["event"] == "error":
+                    # 回答失败时保留已生成的提问
+                    turn = turns.setdefault(key, {"round": event["round"], "agent_id": event["media_id"], "content": ""})
+                    turn["error"] = event["message"]
+                    turn["error_stage"] = event["stage"]
+                elif event["event"] == "end":
+                    end = event
+            return await negotiated_response(http_request, {
+                "topic": topic,
+                "context": context,
+                "rounds": int(request.get("rounds", 1)),
+                "total_media": len(media_ids),
+                "questions": list(turns.values()),
+                "summary": end.get("summary", ""),
+                "transcript": end.get("transcript", {})
+            })
         
         if stream:
             # 流式模拟发布会
+            async def generate_turn(turn):
+                agent_request = AgentRequest(
+                    agent_type="media",
+                    agent_id=turn[1],
+                    topic=topic,
+                    context=context,
+                    temperature=0.7,
+                    max_tokens=CONFERENCE_MAX_TOKENS,
+                    stream=False,
+                    session_id=request.get("session_id"),
+                    tick=request.get("tick")
+                )
+                return await generate_content(agent_request)
+            
             async def conference_stream_generator():
+                media_profiles = profile_store.snapshot.media
+                # 发言顺序以(序号, 媒体ID)标识，同一媒体多次提问时分别生成
+                turns = [(i, media_id) for i, media_id in enumerate(media_ids) if media_id in media_profiles]
+                scheduler = PrefetchScheduler(
+                    generate_turn,
+                    lookahead=int(request.get("prefetch", CONFERENCE_PREFETCH)),
+                    max_wasted=int(request.get("max_wasted_prefetch", CONFERENCE_MAX_WASTED))
+                )
+                scheduler.plan(turns)
                 yield f"data: {json.dumps({'event': 'start', 'topic': topic, 'total_media': len(media_ids)})}\n\n"
                 
-                for i, media_id in enumerate(media_ids):
-                    if media_id in media_profiles:
+                try:
+                    for i, media_id in turns:
                         try:
                             # 获取媒体信息
                             profile = media_profiles[media_id]
@@ -584,18 +1591,8 @@ async def simulate_press_conference(request: dict):
                             
                             yield f"data: {json.dumps({'event': 'media_start', 'media_id': media_id, 'media_name': basic_info.get('name', media_id), 'index': i})}\n\n"
                             
-                            # 生成问题
-                            agent_request = AgentRequest(
-                                agent_type="media",
-                                agent_id=media_id,
-                                topic=topic,
-                                context=context,
-                                temperature=0.7,
-                                max_tokens=200,
-                                stream=False
-                            )
-                            
-                            result = await generate_content(agent_request)
+                            # 生成问题（已预生成时直接取用，同时为后续记者发起预生成）
+                            result = await scheduler.get((i, media_id))
                             content = result.get("content", "")
                             
                             yield f"data: {json.dumps({'event': 'question', 'media_id': media_id, 'question': content})}\n\n"
@@ -607,8 +1604,12 @@ async def simulate_press_conference(request: dict):
                         except Exception as e:
                             logger.warning(f"媒体 {media_id} 生成问题失败: {str(e)}")
                             yield f"data: {json.dumps({'event': 'error', 'media_id': media_id, 'message': str(e)})}\n\n"
-                
-                yield f"data: {json.dumps({'event': 'end', 'message': '新闻发布会结束'})}\n\n"
+                    
+                    yield f"data: {json.dumps({'event': 'end', 'message': '新闻发布会结束', 'prefetch': scheduler.stats()})}\n\n"
+                finally:
+                    # 客户端中途断开时取消尚未取用的预生成
+                    scheduler.close()
+                    logger.info(f"发布会预生成统计: {scheduler.stats()}")
             
             return StreamingResponse(
                 conference_stream_generator(),
@@ -620,6 +1621,7 @@ async def simulate_press_conference(request: dict):
             )
         else:
             # 非流式模拟发布会
+            media_profiles = profile_store.snapshot.media
             questions = []
             for media_id in media_ids:
                 if media_id in media_profiles:
@@ -630,8 +1632,10 @@ async def simulate_press_conference(request: dict):
                             topic=topic,
                             context=context,
                             temperature=0.7,
-                            max_tokens=200,
-                            stream=False
+                            max_tokens=CONFERENCE_MAX_TOKENS,
+                            stream=False,
+                            session_id=request.get("session_id"),
+                            tick=request.get("tick")
                         )
                         
                         result = await generate_content(agent_request)
@@ -645,30 +1649,282 @@ async def simulate_press_conference(request: dict):
                             "content": ""
                         })
             
-            return {
+            return await negotiated_response(http_request, {
                 "topic": topic,
                 "context": context,
                 "total_media": len(questions),
                 "questions": questions
-            }
+            })
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"模拟发布会失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def run_job_item(request_data: Dict) -> Dict:
+    """后台任务子项处理：与 /generate 走相同的生成流程"""
+    agent_request = AgentRequest(**{**request_data, "stream": False})
+    return await generate_content(agent_request)
+
+@app.on_event("startup")
+async def start_job_workers():
+    """启动后台任务工作协程（恢复上次中断的子项）"""
+    global job_workers
+    if JOB_WORKERS > 0:
+        # 多进程部署时中断子项由主进程在启动工作进程前统一恢复
+        with startup_phase("job_workers"):
+            job_workers = JobWorkerPool(job_store, run_job_item, workers=JOB_WORKERS, recover=API_WORKERS <= 1)
+            await job_workers.start()
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    """停止后台任务工作协程"""
+    if job_workers is not None:
+        await job_workers.stop()
+
+@app.on_event("startup")
+async def start_trace_recorder():
+    if trace_recorder is not None:
+        trace_recorder.start()
+
+@app.on_event("shutdown")
+async def stop_trace_recorder():
+    if trace_recorder is not None:
+        await asyncio.get_running_loop().run_in_executor(None, trace_recorder.close)
+
+@app.on_event("startup")
+async def start_profile_watcher():
+    """按配置启动档案文件监听（文件变化时自动热加载；共享模式下默认开启，以便切换到其他进程导出的新文件）"""
+    profile_store.start_watching(PROFILE_WATCH_INTERVAL or (2.0 if PROFILE_SHARED_PATH else 0))
+
+@app.on_event("shutdown")
+async def stop_profile_watcher():
+    await profile_store.stop_watching()
+
+async def flush_shared_state(interval: float = 1.0):
+    """定期将本进程的计数增量写入共享存储，并清理过期缓存"""
+    loop = asyncio.get_running_loop()
+    ticks = 0
+    while True:
+        await asyncio.sleep(interval)
+        ticks += 1
+        try:
+            await loop.run_in_executor(None, shared_state.flush)
+            await loop.run_in_executor(None, profile_stats.flush)
+            if content_store is not None:
+                await loop.run_in_executor(None, content_store.flush)
+            if GENERATION_CACHE_TTL > 0 and ticks % 60 == 0:
+                await loop.run_in_executor(None, shared_state.evict_expired)
+        except Exception as e:
+            logger.warning(f"共享状态写入失败: {str(e)}")
+
+@app.on_event("startup")
+async def start_shared_state_flusher():
+    global shared_state_task
+    shared_state_task = asyncio.create_task(flush_shared_state())
+
+@app.on_event("shutdown")
+async def stop_shared_state_flusher():
+    if shared_state_task is not None:
+        shared_state_task.cancel()
+        await asyncio.gather(shared_state_task, return_exceptions=True)
+    shared_state.flush()
+    profile_stats.flush()
+    if content_store is not None:
+        content_store.flush()
+
+@app.post("/admin/reload-profiles")
+async def reload_profiles(x_admin_token: Optional[str] = Header(None)):
+    """热加载媒体与用户档案：后台解析校验后原子替换，失败时继续使用旧数据
+    
+    多进程部署时由接收请求的进程重新导出共享文件，其他进程通过文件监听切换
+    """
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="管理令牌无效")
+    
+    previous_version = profile_store.snapshot.version
+    try:
+        snapshot = await profile_store.reload(force=True)
+    except Exception as e:
+        logger.error(f"档案热加载失败: {str(e)}")
+        raise HTTPException(status_code=422, detail=f"档案热加载失败，继续使用 v{previous_version}: {str(e)}")
+    
+    return {
+        "previous_version": previous_version,
+        "version": snapshot.version,
+        "media_count": len(snapshot.media),
+        "user_count": len(snapshot.users)
+    }
+
+@app.post("/jobs")
+async def submit_job(job_request: JobRequest):
+    """提交后台任务（批量生成或模拟发布会），立即返回任务ID"""
+    if job_request.kind == "batch":
+        if not job_request.requests:
+            raise HTTPException(status_code=400, detail="批量任务需要提供 requests")
+        items = [req.model_dump(exclude={"stream"}) for req in job_request.requests]
+        params = {"count": len(items)}
+    elif job_request.kind == "press_conference":
+        if not job_request.topic:
+            raise HTTPException(status_code=400, detail="需要提供议题")
+        media_ids = job_request.media_ids or default_conference_media_ids()
+        media_profiles = profile_store.snapshot.media
+        items = [
+            {
+                "agent_type": "media",
+                "agent_id": media_id,
+                "topic": job_request.topic,
+                "context": job_request.context,
+                "temperature": 0.7,
+                "max_tokens": CONFERENCE_MAX_TOKENS
+            }
+            for media_id in media_ids if media_id in media_profiles
+        ]
+        if not items:
+            raise HTTPException(status_code=400, detail="没有可用的参会媒体")
+        params = {"topic": job_request.topic, "context": job_request.context,
+                  "media_ids": [item["agent_id"] for item in items]}
+    else:
+        raise HTTPException(status_code=400, detail="kind 必须是 'batch' 或 'press_conference'")
+    
+    loop = asyncio.get_running_loop()
+    job_id = await loop.run_in_executor(None, job_store.create_job, job_request.kind, items, params)
+    if job_workers is not None:
+        job_workers.notify()
+    
+    logger.info(f"已提交后台任务: {job_id} ({job_request.kind}, {len(items)} 项)")
+    return {"job_id": job_id, "status": "queued", "total": len(items)}
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """查询后台任务进度"""
+    loop = asyncio.get_running_loop()
+    job = await loop.run_in_executor(None, job_store.get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"任务 '{job_id}' 不存在")
+    return job
+
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str, http_request: Request, offset: int = 0, limit: int = 100,
+                          status: Optional[str] = None):
+    """分页获取后台任务结果（按提交顺序，可按子项状态过滤）"""
+    loop = asyncio.get_running_loop()
+    job = await loop.run_in_executor(None, job_store.get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"任务 '{job_id}' 不存在")
+    
+    limit = max(1, min(limit, 1000))
+    items = await loop.run_in_executor(
+        None, job_store.get_results, job_id, max(0, offset), limit, status
+    )
+    return await negotiated_response(http_request, {
+        "job_id": job_id,
+        "status": job["status"],
+        "offset": offset,
+        "limit": limit,
+        "total": job["total"],
+        "items": items
+    })
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """取消后台任务（已完成的结果保留）"""
+    loop = asyncio.get_running_loop()
+    job = await loop.run_in_executor(None, job_store.get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"任务 '{job_id}' 不存在")
+    
+    cancelled = await loop.run_in_executor(None, job_store.cancel_job, job_id)
+    if not cancelled:
+        raise HTTPException(status_code=409, detail=f"任务已处于 {job['status']} 状态，无法取消")
+    return await loop.run_in_executor(None, job_store.get_job, job_id)
+
+def require_content_store() -> ContentStore:
+    if content_store is None:
+        raise HTTPException(status_code=503, detail="生成内容存储未启用（CONTENT_STORE_PATH 为空）")
+    return content_store
+
+@app.get("/generations")
+async def query_generations(agent_type: Optional[str] = None, agent_id: Optional[str] = None,
+                            topic: Optional[str] = None, session_id: Optional[str] = None,
+                            since: Optional[float] = None, until: Optional[float] = None,
+                            offset: int = 0, limit: int = 100, http_request: Request = None):
+    """查询已保存的生成内容（按时间顺序分页；since/until 为Unix时间戳）"""
+    store = require_content_store()
+    limit = max(1, min(limit, 1000))
+    loop = asyncio.get_running_loop()
+    page = await loop.run_in_executor(None, functools.partial(
+        store.query, offset=max(0, offset), limit=limit, agent_type=agent_type, agent_id=agent_id,
+        topic=topic, session_id=session_id, since=since, until=until
+    ))
+    return await negotiated_response(http_request, {"offset": offset, "limit": limit, **page})
+
+@app.get("/generations/export")
+async def export_generations(format: str = "parquet", agent_type: Optional[str] = None,
+                             agent_id: Optional[str] = None, topic: Optional[str] = None,
+                             session_id: Optional[str] = None, since: Optional[float] = None,
+                             until: Optional[float] = None):
+    """按条件导出生成内容为 parquet（需安装 pyarrow）或 csv 文件"""
+    store = require_content_store()
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format 必须是 {', '.join(EXPORT_FORMATS)} 之一")
+    # 按批写入临时文件后以文件流返回，发送完毕即删除
+    fd, path = tempfile.mkstemp(prefix="generations-", suffix=f".{format}")
+    os.close(fd)
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, functools.partial(
+            store.export, format, path, agent_type=agent_type, agent_id=agent_id, topic=topic,
+            session_id=session_id, since=since, until=until
+        ))
+    except ValueError as e:
+        os.remove(path)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        os.remove(path)
+        raise
+    return FileResponse(path, media_type=EXPORT_FORMATS[format], filename=f"generations.{format}",
+                        background=BackgroundTask(os.remove, path))
+
 @app.get("/stats")
 async def get_api_stats():
-    """获取API统计信息"""
+    """获取API统计信息（counters 为所有工作进程的汇总）"""
+    snapshot = profile_store.snapshot
+    loop = asyncio.get_running_loop()
+    counters = await loop.run_in_executor(None, shared_state.counters)
     return {
-        "media_count": len(media_profiles),
-        "user_count": len(user_profiles),
+        "media_count": len(snapshot.media),
+        "user_count": len(snapshot.users),
+        "profile_version": snapshot.version,
         "model": MODEL_NAME,
         "thinking_enabled": THINKING_ENABLED,
         "streaming_enabled": STREAM_ENABLED,
-        "supported_models": ["glm-4.5-flash", "glm-4", "glm-3-turbo"],
+        "supported_models": SUPPORTED_MODELS,
+        "routing": model_router.stats(),
+        "output_budget": {"enabled": OUTPUT_BUDGET, **output_budget.stats()},
+        "trace": trace_recorder.stats() if trace_recorder is not None else None,
+        "response_encoding": response_encoder.stats(),
+        "dropped_log_records": dropped_count(),
+        "worker_pid": os.getpid(),
+        "workers": API_WORKERS,
+        "shared_profiles": bool(PROFILE_SHARED_PATH),
+        "generation_cache_ttl": GENERATION_CACHE_TTL,
+        "semantic_cache": semantic_cache.stats() if semantic_cache is not None else None,
+        "counters": counters,
         "current_timestamp": os.times().elapsed
     }
 
+@app.get("/startup")
+async def get_startup_info():
+    """启动各阶段耗时（毫秒）：import 为模块导入，ready 为从开始导入到完成全部启动步骤"""
+    return {
+        "pid": os.getpid(),
+        "ready": "ready" in STARTUP_PHASES,
+        "provider_initialized": _client is not None,
+        "phases": STARTUP_PHASES
+    }
+
 @app.get("/model-info")
 async def get_model_info():
     """获取模型信息"""
@@ -699,6 +1955,18 @@ async def generic_exception_handler(request, exc):
         content={"error": f"内部服务器错误: {str(exc)}"}
     )
 
+@app.on_event("startup")
+async def mark_ready():
+    """最后一个启动步骤：记录就绪耗时，并按配置在后台预先创建模型客户端（不阻塞就绪）"""
+    STARTUP_PHASES["ready"] = round((time.perf_counter() - STARTUP_BEGIN) * 1000, 1)
+    logger.info(f"服务已就绪，启动耗时: {STARTUP_PHASES}")
+    if PROVIDER_WARMUP and ZHIPU_API_KEY:
+        loop = asyncio.get_running_loop()
+        warmup = loop.run_in_executor(None, get_client)
+        warmup.add_done_callback(lambda f: f.exception())  # 失败时在首次请求中再报告
+
+STARTUP_PHASES["import"] = round((time.perf_counter() - STARTUP_BEGIN) * 1000, 1)
+
 if __name__ == "__main__":
     import uvicorn
     
@@ -710,10 +1978,24 @@ if __name__ == "__main__":
     logger.info(f"流式输出: {STREAM_ENABLED}")
     logger.info(f"思考模式: {THINKING_ENABLED}")
     
-    uvicorn.run(
-        app,
-        host=host,
-        port=port,
-        log_level="info",
-        access_log=True
-    )
\ No newline at end of file
+    if API_WORKERS > 1:
+        # 多进程模式：主进程先恢复中断的任务子项并导出共享档案，工作进程以导入字符串方式启动
+        job_store.recover()
+        profile_store.prepare_shared()
+        logger.info(f"工作进程数: {API_WORKERS}，共享档案文件: {PROFILE_SHARED_PATH}")
+        uvicorn.run(
+            "api_server:app",
+            host=host,
+            port=port,
+            workers=API_WORKERS,
+            log_level="info",
+            access_log=True
+        )
+    else:
+        uvicorn.run(
+            app,
+            host=host,
+            port=port,
+            log_level="info",
+            access_log=True
+        )
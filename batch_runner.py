@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+离线批量生成运行器
+流式读取JSONL格式的AgentRequest记录，以有限并发调用与API服务器相同的生成流程，
+边运行边写出JSONL结果，并通过检查点文件支持中断后从断点续跑
+
+用法:
+    python batch_runner.py input.jsonl output.jsonl --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+
+def checkpoint_path_for(output_path):
+    """检查点文件路径"""
+    return f"{output_path}.ckpt"
+
+
+def errors_path_for(output_path):
+    """错误记录文件路径"""
+    return f"{output_path}.errors.jsonl"
+
+
+def input_fingerprint(input_path):
+    """输入文件的标识（路径、大小、修改时间），用于确认续跑时输入未变"""
+    stat = os.stat(input_path)
+    return {"input": os.path.abspath(input_path), "input_size": stat.st_size, "input_mtime_ns": stat.st_mtime_ns}
+
+
+def load_checkpoint(output_path, input_path):
+    """读取检查点，返回(水位线, 输出文件偏移)；检查点记录的输入文件与本次不同时抛出 ValueError"""
+    ckpt_path = checkpoint_path_for(output_path)
+    if not os.path.exists(ckpt_path):
+        return 0, 0
+    with open(ckpt_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    current = input_fingerprint(input_path)
+    # 旧版检查点只记录了路径，缺少的字段不比较
+    changed = [key for key, value in current.items() if key in data and data[key] != value]
+    if changed:
+        raise ValueError(f"检查点 {ckpt_path} 记录的输入文件与本次不同（{', '.join(changed)}），"
+                         f"续跑会跳过新输入的前 {data.get('watermark', 0)} 行；请换用新的输出文件，"
+                         f"或删除该检查点及输出文件后重新运行")
+    return int(data.get("watermark", 0)), int(data.get("output_offset", 0))
+
+
+def save_checkpoint(output_path, input_path, watermark, out_file, err_file):
+    """原子写入检查点（先落盘结果文件，再替换检查点文件）"""
+    for f in (out_file, err_file):
+        f.flush()
+        os.fsync(f.fileno())
+
+    ckpt_path = checkpoint_path_for(output_path)
+    tmp_path = f"{ckpt_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            **input_fingerprint(input_path),
+            "watermark": watermark,
+            "output_offset": out_file.tell(),
+            "updated_at": time.time()
+        }, f)
+    os.replace(tmp_path, ckpt_path)
+
+
+def scan_processed_lines(path, offset=0):
+    """扫描结果文件中检查点之后已写出的行号（崩溃时可能已写出但未记入检查点）"""
+    processed = set()
+    if not os.path.exists(path):
+        return processed
+    with open(path, 'r', encoding='utf-8') as f:
+        f.seek(offset)
+        for raw in f:
+            try:
+                processed.add(int(json.loads(raw)["line"]))
+            except (ValueError, KeyError, TypeError):
+                # 崩溃时可能留下半行，忽略
+                continue
+    return processed
+
+
+async def run_batch(input_path, output_path, concurrency=4, checkpoint_every=50):
+    """运行批量生成，返回(成功数, 失败数, 跳过数)"""
+    # 延迟导入：只有真正运行时才初始化模型客户端与档案数据
+    import api_server
+    from api_server import AgentRequest, generate_content
+
+    watermark, output_offset = load_checkpoint(output_path, input_path)
+    errors_path = errors_path_for(output_path)
+    # 检查点之后的行：结果文件从偏移处扫描，错误文件量小直接全量扫描
+    processed = {n for n in scan_processed_lines(output_path, output_offset) if n >= watermark}
+    processed |= {n for n in scan_processed_lines(errors_path) if n >= watermark}
+    while watermark in processed:
+        processed.discard(watermark)
+        watermark += 1
+
+    if watermark or processed:
+        print(f"从检查点恢复: 水位线={watermark}, 检查点后已完成={len(processed)}")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    pending = set()
+    counts = {"success": 0, "error": 0, "skipped": 0, "since_checkpoint": 0}
+
+    out_file = open(output_path, 'a', encoding='utf-8')
+    err_file = open(errors_path, 'a', encoding='utf-8')
+
+    def mark_done(line_no):
+        nonlocal watermark
+        processed.add(line_no)
+        # 推进连续完成的水位线，只保留水位线之后的乱序完成行号
+        while watermark in processed:
+            processed.discard(watermark)
+            watermark += 1
+        counts["since_checkpoint"] += 1
+        if counts["since_checkpoint"] >= checkpoint_every:
+            save_checkpoint(output_path, input_path, watermark, out_file, err_file)
+            counts["since_checkpoint"] = 0
+
+    def write_error(line_no, record, error):
+        err_file.write(json.dumps({
+            "line": line_no,
+            "agent_id": record.get("agent_id") if isinstance(record, dict) else None,
+            "agent_type": record.get("agent_type") if isinstance(record, dict) else None,
+            "error": error,
+            "request": record
+        }, ensure_ascii=False) + "\n")
+        counts["error"] += 1
+
+    async def process_line(line_no, record):
+        try:
+            agent_request = AgentRequest(**{**record, "stream": False})
+            result = await generate_content(agent_request)
+            out_file.write(json.dumps({"line": line_no, **result}, ensure_ascii=False) + "\n")
+            counts["success"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            write_error(line_no, record, detail)
+        mark_done(line_no)
+        semaphore.release()
+
+    try:
+        with open(input_path, 'r', encoding='utf-8') as f:
+            for line_no, raw in enumerate(f):
+                if line_no < watermark or line_no in processed:
+                    counts["skipped"] += 1
+                    continue
+                raw = raw.strip()
+                if not raw:
+                    mark_done(line_no)
+                    continue
+                try:
+                    record = json.loads(raw)
+                except json.JSONDecodeError as e:
+                    write_error(line_no, raw, f"JSON解析失败: {e}")
+                    mark_done(line_no)
+                    continue
+
+                # 有界并发：同一时间最多 concurrency 个请求在途，输入按需读取
+                await semaphore.acquire()
+                task = asyncio.create_task(process_line(line_no, record))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+        if pending:
+            await asyncio.gather(*pending)
+    finally:
+        # 中断时取消在途请求，已完成的结果已写出，检查点记录到最新水位线
+        for task in list(pending):
+            task.cancel()
+        save_checkpoint(output_path, input_path, watermark, out_file, err_file)
+        out_file.close()
+        err_file.close()
+        # 进程即将退出，缓冲中的生成记录需落盘
+        if api_server.content_store is not None:
+            api_server.content_store.flush()
+
+    return counts["success"], counts["error"], counts["skipped"]
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="离线批量生成运行器（JSONL输入/输出，支持断点续跑）")
+    parser.add_argument("input", help="输入JSONL文件，每行一个AgentRequest")
+    parser.add_argument("output", help="输出JSONL文件（追加写入）")
+    parser.add_argument("--concurrency", type=int, default=4, help="并发请求数（默认4）")
+    parser.add_argument("--checkpoint-every", type=int, default=50, help="每完成多少条写一次检查点（默认50）")
+    args = parser.parse_args()
+
+    print("=== 离线批量生成 ===")
+    print(f"输入: {args.input}")
+    print(f"输出: {args.output}")
+    print(f"并发: {args.concurrency}")
+
+    start = time.time()
+    try:
+        success, errors, skipped = asyncio.run(run_batch(
+            args.input, args.output,
+            concurrency=max(1, args.concurrency),
+            checkpoint_every=max(1, args.checkpoint_every)
+        ))
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(2)
+    except KeyboardInterrupt:
+        print("\n已中断，进度已写入检查点，重新运行相同命令即可继续")
+        sys.exit(130)
+
+    print(f"完成: 成功 {success}, 失败 {errors}, 跳过(已完成) {skipped}, 耗时 {time.time() - start:.1f}s")
+    if errors:
+        print(f"失败记录见: {errors_path_for(args.output)}（request 字段为原始请求，可提取后重新运行）")
+
+
+if __name__ == "__main__":
+    main()
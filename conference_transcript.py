@@ -0,0 +1,123 @@
+"""
+多轮发布会的滚动会议记录
+记者提问与发言人回答逐条追加，渲染为各记者共享的提示词前缀，长度有上界：
+
+- 近期窗口：最近的发言原文保留，总长度不超过 recent_chars
+- 待摘要：移出近期窗口的发言先截断展示，累计 summary_every 条后压缩进摘要（由调用方异步执行，
+  摘要期间仍以截断形式展示，不阻塞提问）
+- 摘要：不超过 summary_chars
+
+记录只在末尾追加，渲染结果按版本缓存，同一版本内所有记者复用同一字符串；
+前缀（议题、摘要）在两次摘要之间保持不变，便于模型服务端复用共享前缀
+"""
+
+import re
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+SENTENCE_END = re.compile(r"(?<=[。！？!?；;])")
+
+
+def truncate(text: str, limit: int) -> str:
+    """按长度截断（超出时以省略号结尾）"""
+    text = text.strip()
+    return text if len(text) <= limit else text[:max(0, limit - 1)] + "…"
+
+
+def first_sentence(text: str, limit: int) -> str:
+    """取第一句（不超过 limit 字）"""
+    text = text.strip()
+    head = SENTENCE_END.split(text, maxsplit=1)[0] if text else ""
+    return truncate(head or text, limit)
+
+
+def extractive_summary(previous: str, entries: List[str], limit: int) -> str:
+    """不调用模型的摘要：已有摘要加每条发言的首句，超出长度时保留最新部分"""
+    parts = [previous] if previous else []
+    parts.extend(first_sentence(entry, 60) for entry in entries)
+    summary = " ".join(part for part in parts if part)
+    return summary if len(summary) <= limit else "…" + summary[-(limit - 1):]
+
+
+class ConferenceTranscript:
+    """滚动会议记录"""
+
+    def __init__(self, topic: str, context: str = "", recent_chars: int = 1500, summary_chars: int = 500,
+                 summary_every: int = 4, pending_chars: int = 80):
+        self.header = f"# 本场发布会记录\n议题：{topic}\n背景：{context if context else '常规新闻发布会'}\n"
+        self.recent_chars = recent_chars
+        self.summary_chars = summary_chars
+        self.summary_every = max(1, summary_every)
+        self.pending_chars = pending_chars
+        self.summary = ""
+        self.recent: Deque[str] = deque()
+        self.recent_size = 0
+        self.pending: List[str] = []        # 已移出近期窗口、尚未并入摘要的发言
+        self.summarizing = 0                # 正在摘要的待摘要条数（0 表示没有进行中的摘要）
+        self.turns = 0
+        self.summaries = 0
+        self.version = 0
+        self._rendered: Optional[Tuple[int, str]] = None
+
+    def add(self, speaker: str, text: str):
+        """追加一条发言，近期窗口超长时将最早的发言移入待摘要"""
+        entry = f"【{speaker}】{text.strip()}"
+        self.recent.append(entry)
+        self.recent_size += len(entry)
+        while self.recent_size > self.recent_chars and len(self.recent) > 1:
+            old = self.recent.popleft()
+            self.recent_size -= len(old)
+            self.pending.append(old)
+        # 摘要长期未完成（或失败）时，待摘要部分以抽取式摘要兜底，保证长度有界
+        if not self.summarizing and len(self.pending) > 2 * self.summary_every:
+            self.summary = extractive_summary(self.summary, self.pending, self.summary_chars)
+            self.pending = []
+            self.summaries += 1
+        self.turns += 1
+        self.version += 1
+
+    def needs_summary(self) -> bool:
+        return not self.summarizing and len(self.pending) >= self.summary_every
+
+    def begin_summary(self) -> Tuple[str, List[str]]:
+        """开始摘要：返回(已有摘要, 待并入的发言)，完成后调用 finish_summary"""
+        self.summarizing = len(self.pending)
+        return self.summary, list(self.pending[:self.summarizing])
+
+    def finish_summary(self, summary: Optional[str]):
+        """摘要完成（summary 为 None 表示失败，改用抽取式摘要）"""
+        count, self.summarizing = self.summarizing, 0
+        if not count:
+            return
+        entries = self.pending[:count]
+        if summary is None:
+            summary = extractive_summary(self.summary, entries, self.summary_chars)
+        self.summary = truncate(summary, self.summary_chars)
+        del self.pending[:count]
+        self.summaries += 1
+        self.version += 1
+
+    def render(self) -> str:
+        """渲染为提示词前缀（按版本缓存）"""
+        if self._rendered is not None and self._rendered[0] == self.version:
+            return self._rendered[1]
+        parts = [self.header]
+        if self.summary:
+            parts.append(f"## 此前问答摘要\n{self.summary}\n")
+        if self.pending or self.recent:
+            parts.append("## 最近问答\n")
+            parts.extend(truncate(entry, self.pending_chars) + "\n" for entry in self.pending)
+            parts.extend(entry + "\n" for entry in self.recent)
+        text = "".join(parts)
+        self._rendered = (self.version, text)
+        return text
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "turns": self.turns,
+            "summaries": self.summaries,
+            "summary_chars": len(self.summary),
+            "recent_entries": len(self.recent),
+            "pending_entries": len(self.pending),
+            "rendered_chars": len(self.render())
+        }
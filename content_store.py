@@ -0,0 +1,219 @@
+"""
+生成内容存储
+每次生成的提问/评论连同智能体、议题、背景信息哈希、仿真步(tick)/会话、模型、token用量与耗时
+写入本地SQLite（带索引）；请求路径只把记录放入内存缓冲，由后台定期批量写入，
+支持按智能体、议题、会话与时间查询，并导出为 Parquet（需安装 pyarrow）或 CSV 供分析
+
+导出使用独立的只读连接按批读取（每批 export_batch 行），逐批写入 Parquet 行组或 CSV，内存占用与结果行数无关
+"""
+
+import csv
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (
+    "created_at", "session_id", "tick", "agent_type", "agent_id", "topic", "context_hash",
+    "model", "temperature", "max_tokens", "prompt_tokens", "completion_tokens", "total_tokens",
+    "latency_ms", "cache", "content"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    session_id TEXT,
+    tick INTEGER,
+    agent_type TEXT NOT NULL,
+    agent_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    context_hash TEXT,
+    model TEXT,
+    temperature REAL,
+    max_tokens INTEGER,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    total_tokens INTEGER,
+    latency_ms REAL,
+    cache TEXT,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_generations_agent ON generations(agent_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_generations_topic ON generations(topic, created_at);
+CREATE INDEX IF NOT EXISTS idx_generations_session ON generations(session_id, tick);
+CREATE INDEX IF NOT EXISTS idx_generations_created ON generations(created_at);
+"""
+
+# 导出时的列类型（与表结构一致；按批写入 Parquet 时需要固定的 schema）
+COLUMN_TYPES = {
+    "id": int, "created_at": float, "session_id": str, "tick": int, "agent_type": str, "agent_id": str,
+    "topic": str, "context_hash": str, "model": str, "temperature": float, "max_tokens": int,
+    "prompt_tokens": int, "completion_tokens": int, "total_tokens": int, "latency_ms": float,
+    "cache": str, "content": str
+}
+
+EXPORT_FORMATS = {
+    "parquet": "application/vnd.apache.parquet",
+    "csv": "text/csv"
+}
+
+
+def context_hash(context: str) -> str:
+    """背景信息哈希（空背景为空字符串）"""
+    if not context:
+        return ""
+    return hashlib.blake2b(context.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class ContentStore:
+    """生成内容存储：record 只追加到内存缓冲，flush 批量写入（可在线程池中调用）"""
+
+    def __init__(self, db_path: str = "generations.db", max_buffer: int = 1000, export_batch: int = 5000):
+        self.db_path = db_path
+        self.max_buffer = max_buffer
+        self.export_batch = export_batch
+        self._lock = threading.Lock()
+        # 缓冲区单独加锁：record 可能与线程池中的 flush 并发，交换缓冲区时不能丢失追加
+        self._buffer_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._buffer: List[Tuple] = []
+        self.written = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # fork出的子进程不能复用父进程的连接
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def needs_flush(self) -> bool:
+        return len(self._buffer) >= self.max_buffer
+
+    def record(self, **fields: Any):
+        """记录一次生成（只写入内存缓冲，不阻塞请求）"""
+        fields.setdefault("created_at", time.time())
+        row = tuple(fields.get(column) for column in COLUMNS)
+        with self._buffer_lock:
+            self._buffer.append(row)
+
+    def flush(self) -> int:
+        """将缓冲中的记录批量写入，返回写入条数"""
+        if not self._buffer:
+            return 0
+        with self._lock:
+            with self._buffer_lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            conn = self._connection()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    f"INSERT INTO generations ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                    rows
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                with self._buffer_lock:
+                    self._buffer[:0] = rows
+                raise
+            self.written += len(rows)
+        return len(rows)
+
+    @staticmethod
+    def _where(agent_type: Optional[str] = None, agent_id: Optional[str] = None, topic: Optional[str] = None,
+               session_id: Optional[str] = None, since: Optional[float] = None,
+               until: Optional[float] = None) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        for column, value in (("agent_type", agent_type), ("agent_id", agent_id),
+                              ("topic", topic), ("session_id", session_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, offset: int = 0, limit: int = 100, **filters) -> Dict[str, Any]:
+        """按条件分页查询（按时间顺序），返回总数与记录"""
+        self.flush()
+        where, params = self._where(**filters)
+        with self._lock:
+            conn = self._connection()
+            total = conn.execute(f"SELECT COUNT(*) FROM generations{where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT id, {', '.join(COLUMNS)} FROM generations{where} ORDER BY created_at, id LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return {"total": total, "items": [dict(row) for row in rows]}
+
+    def _select_batches(self, **filters) -> Iterator[List[Tuple]]:
+        """按批产出匹配的记录（独立的只读连接，读取期间不阻塞写入与查询）"""
+        self.flush()
+        with self._lock:
+            self._connection()      # 确保数据库与表已创建
+        where, params = self._where(**filters)
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, timeout=5)
+        try:
+            cursor = conn.execute(
+                f"SELECT {', '.join(COLUMN_TYPES)} FROM generations{where} ORDER BY created_at, id", params
+            )
+            while True:
+                rows = cursor.fetchmany(self.export_batch)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            conn.close()
+
+    def export(self, fmt: str, path: str, **filters) -> int:
+        """按条件导出为列式文件（parquet，每批一个行组）或 CSV，写入 path，返回行数"""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"format 必须是 {', '.join(EXPORT_FORMATS)} 之一")
+        names = list(COLUMN_TYPES)
+        count = 0
+        if fmt == "parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ValueError("导出 parquet 需要安装 pyarrow（pip install pyarrow），或使用 format=csv")
+            arrow_types = {int: pa.int64(), float: pa.float64(), str: pa.string()}
+            schema = pa.schema([(name, arrow_types[kind]) for name, kind in COLUMN_TYPES.items()])
+            with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+                for rows in self._select_batches(**filters):
+                    columns = {name: [row[i] for row in rows] for i, name in enumerate(names)}
+                    writer.write_table(pa.table(columns, schema=schema))
+                    count += len(rows)
+            return count
+
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            for rows in self._select_batches(**filters):
+                writer.writerows(rows)
+                count += len(rows)
+        return count
@@ -2,14 +2,142 @@
 """
 NetLogo文件轮询HTTP客户端
 持续检查temp_request.txt文件，处理请求并返回结果
+
+上游传输方式（--transport 或 BRIDGE_TRANSPORT 环境变量）:
+    http  每个请求一次HTTP调用（连接复用）
+    ws    生成请求（/generate、/batch-generate）经服务端 /ws 长连接发送，其他请求仍走HTTP；
+          连接不可用时自动退回HTTP
 """
+import argparse
 import os
 import json
+import threading
 import time
+import itertools
 import requests
 from pathlib import Path
+from urllib.parse import urlsplit
+
+BRIDGE_TRANSPORT = os.getenv("BRIDGE_TRANSPORT", "http")
+
+# HTTP连接复用（避免每个请求重新建立连接）
+session = requests.Session()
+
+class WebSocketTransport:
+    """经 /ws 长连接发送请求：后台线程按 id 分发服务端推送的消息，可供多个线程并发使用"""
+
+    def __init__(self, url, timeout=30):
+        self.url = url
+        self.timeout = timeout
+        self.connection = None
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.ids = itertools.count(1)
+
+    def connect(self):
+        """建立连接（已连接时直接返回）"""
+        with self.lock:
+            if self.connection is not None:
+                return
+            from websockets.sync.client import connect
+            self.connection = connect(self.url, open_timeout=self.timeout, max_size=None)
+            threading.Thread(target=self._read, args=(self.connection,), daemon=True).start()
+            print(f"已连接长连接通道: {self.url}")
+
+    def _read(self, connection):
+        """接收推送的消息并交给对应的请求；连接断开时唤醒所有等待中的请求"""
+        try:
+            for raw in connection:
+                message = json.loads(raw)
+                slot = self.pending.get(message.get("id"))
+                if slot is not None:
+                    slot["messages"].append(message)
+                    if slot["is_final"](message):
+                        slot["event"].set()
+        except Exception:
+            pass
+        finally:
+            with self.lock:
+                if self.connection is connection:
+                    self.connection = None
+            for slot in list(self.pending.values()):
+                slot["event"].set()
+
+    def request(self, op, data, timeout=None):
+        """发送一个请求，返回该请求收到的全部消息（tick 以 done 消息结束）"""
+        self.connect()
+        request_id = next(self.ids)
+        if op == "tick":
+            is_final = lambda m: m["type"] == "done" or (m["type"] == "error" and "index" not in m)
+        else:
+            is_final = lambda m: m["type"] in ("result", "error", "pong")
+        slot = {"event": threading.Event(), "messages": [], "is_final": is_final}
+        self.pending[request_id] = slot
+        try:
+            connection = self.connection
+            if connection is None:
+                raise ConnectionError("长连接已断开")
+            connection.send(json.dumps({"id": request_id, "op": op, "data": data}, ensure_ascii=False))
+            if not slot["event"].wait(timeout or self.timeout):
+                raise TimeoutError("长连接请求超时")
+            if not slot["messages"] or not is_final(slot["messages"][-1]):
+                raise ConnectionError("长连接已断开")
+            return slot["messages"]
+        finally:
+            self.pending.pop(request_id, None)
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
 
-def process_request(request_file="temp_request.txt"):
+_transports = {}
+
+def websocket_transport_for(url):
+    """按服务地址复用长连接（http://host:port/... -> ws://host:port/ws）"""
+    parts = urlsplit(url)
+    ws_url = f"{'wss' if parts.scheme == 'https' else 'ws'}://{parts.netloc}/ws"
+    if ws_url not in _transports:
+        _transports[ws_url] = WebSocketTransport(ws_url)
+    return _transports[ws_url]
+
+def send_over_websocket(url, json_data):
+    """经长连接发送生成请求，返回(状态码, 响应文本)，响应格式与对应的HTTP接口一致；不支持的路径返回 None"""
+    path = urlsplit(url).path.rstrip("/")
+    transport = websocket_transport_for(url)
+    
+    if path.endswith("/generate") and not path.endswith("/batch-generate"):
+        message = transport.request("generate", json_data)[-1]
+        if message["type"] == "error":
+            return message["status"], json.dumps({"detail": message["detail"]}, ensure_ascii=False)
+        return 200, json.dumps(message["data"], ensure_ascii=False, separators=(",", ":"))
+    
+    if path.endswith("/batch-generate"):
+        requests_data = json_data.get("requests", [])
+        messages = transport.request("tick", {"requests": requests_data}, timeout=transport.timeout * max(1, len(requests_data)))
+        if messages[-1]["type"] == "error":
+            return messages[-1]["status"], json.dumps({"detail": messages[-1]["detail"]}, ensure_ascii=False)
+        # 按原始顺序整理为 /batch-generate 的响应格式
+        results, errors = {}, {}
+        for message in messages:
+            if message["type"] == "result":
+                results[message["index"]] = message["data"]
+            elif message["type"] == "error":
+                item = requests_data[message["index"]]
+                errors[message["index"]] = {"agent_id": item.get("agent_id"), "agent_type": item.get("agent_type"),
+                                            "error": str(message["detail"])}
+        body = {
+            "success_count": len(results),
+            "error_count": len(errors),
+            "results": [results[i] for i in sorted(results)],
+            "errors": [errors[i] for i in sorted(errors)]
+        }
+        return 200, json.dumps(body, ensure_ascii=False, separators=(",", ":"))
+    
+    return None
+
+def process_request(request_file="temp_request.txt", transport="http"):
     """处理单个请求文件"""
     try:
         # 读取请求文件
@@ -23,28 +151,41 @@ def process_request(request_file="temp_request.txt"):
         url = lines[1]     # API地址
         json_str = lines[2]  # JSON数据
         
-        # 发送HTTP请求
+        # 发送请求（生成请求优先经长连接发送，失败时退回HTTP）
+        status_code, text = None, None
         if method.upper() == "GET":
-            response = requests.get(url, timeout=10)
+            response = session.get(url, timeout=10)
+            status_code, text = response.status_code, response.text
         else:  # POST
-            headers = {"Content-Type": "application/json"}
             try:
                 json_data = json.loads(json_str) if json_str else {}
-                response = requests.post(url, json=json_data, headers=headers, timeout=30)
             except json.JSONDecodeError:
                 return False, "JSON数据格式错误"
+            
+            if transport == "ws":
+                try:
+                    sent = send_over_websocket(url, json_data)
+                    if sent is not None:
+                        status_code, text = sent
+                except Exception as e:
+                    print(f"  长连接不可用，改用HTTP: {str(e)}")
+            
+            if status_code is None:
+                headers = {"Content-Type": "application/json"}
+                response = session.post(url, json=json_data, headers=headers, timeout=30)
+                status_code, text = response.status_code, response.text
         
         # 写入响应文件
-        if response.status_code == 200:
+        if status_code == 200:
             with open("temp_response.txt", "w", encoding="utf-8") as f:
-                f.write(f"200|{response.text}")
+                f.write(f"200|{text}")
             print(f"✓ 请求成功: {method} {url}")
             return True, "成功"
         else:
             with open("temp_error.txt", "w", encoding="utf-8") as f:
-                f.write(f"error|HTTP {response.status_code}: {response.text[:100]}")
-            print(f"✗ 请求失败: HTTP {response.status_code}")
-            return False, f"HTTP {response.status_code}"
+                f.write(f"error|HTTP {status_code}: {text[:100]}")
+            print(f"✗ 请求失败: HTTP {status_code}")
+            return False, f"HTTP {status_code}"
             
     except Exception as e:
         # 写入错误文件
@@ -55,7 +196,13 @@ def process_request(request_file="temp_request.txt"):
 
 def main():
     """主函数 - 持续轮询"""
+    parser = argparse.ArgumentParser(description="NetLogo文件轮询HTTP客户端")
+    parser.add_argument("--transport", choices=["http", "ws"], default=BRIDGE_TRANSPORT,
+                        help="上游传输方式：http（默认）或 ws（生成请求经 /ws 长连接发送）")
+    args = parser.parse_args()
+    
     print("=== NetLogo文件轮询HTTP客户端 ===")
+    print(f"上游传输: {args.transport}")
     print("正在监听请求文件...")
     print("按 Ctrl+C 停止")
     
@@ -71,7 +218,7 @@ def main():
                 print(f"\n[{time.strftime('%H:%M:%S')}] 检测到请求文件")
                 
                 # 处理请求
-                success, message = process_request()
+                success, message = process_request(transport=args.transport)
                 
                 # 删除请求文件（避免重复处理）
                 os.remove("temp_request.txt")
@@ -88,6 +235,9 @@ def main():
         print("\n\n客户端已停止")
     except Exception as e:
         print(f"\n客户端异常: {str(e)}")
+    finally:
+        for transport in _transports.values():
+            transport.close()
 
 if __name__ == "__main__":
     # 检查依赖
@@ -0,0 +1,298 @@
+"""
+持久化后台任务队列
+基于SQLite保存任务与子项，服务重启后排队中和已完成的部分结果均可恢复
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_CANCELLED = "cancelled"
+
+# 子项状态
+ITEM_PENDING = "pending"
+ITEM_RUNNING = "running"
+ITEM_DONE = "done"
+ITEM_ERROR = "error"
+ITEM_CANCELLED = "cancelled"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT,
+    total INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_job_items_status ON job_items(status);
+"""
+
+
+class JobStore:
+    """SQLite任务存储（线程安全，所有方法均为同步调用）
+
+    数据库在首次使用时才打开（创建），导入 api_server 的工具不会在当前目录留下任务文件
+    """
+
+    def __init__(self, db_path: str = "jobs.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """数据库连接（调用方已持有 self._lock）"""
+        if self._db is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._db = conn
+        return self._db
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def recover(self) -> int:
+        """将上次运行中断时处于running的子项重新放回队列，返回恢复数量"""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE job_items SET status = ? WHERE status = ?",
+                (ITEM_PENDING, ITEM_RUNNING)
+            )
+            return cur.rowcount
+
+    def create_job(self, kind: str, items: List[Dict], params: Optional[Dict] = None) -> str:
+        """创建任务并批量写入子项，返回任务ID"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, kind, status, params, total, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, JOB_QUEUED, json.dumps(params or {}, ensure_ascii=False),
+                     len(items), now, now)
+                )
+                self._conn.executemany(
+                    "INSERT INTO job_items (job_id, idx, status, request, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    ((job_id, i, ITEM_PENDING, json.dumps(item, ensure_ascii=False), now)
+                     for i, item in enumerate(items))
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def claim_next(self) -> Optional[Dict]:
+        """领取一个待处理子项（原子地标记为running）"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT job_id, idx, request FROM job_items WHERE status = ? ORDER BY rowid LIMIT 1",
+                    (ITEM_PENDING,)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                now = time.time()
+                self._conn.execute(
+                    "UPDATE job_items SET status = ?, updated_at = ? WHERE job_id = ? AND idx = ?",
+                    (ITEM_RUNNING, now, row["job_id"], row["idx"])
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                    (JOB_RUNNING, now, row["job_id"], JOB_QUEUED)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {"job_id": row["job_id"], "idx": row["idx"], "request": json.loads(row["request"])}
+
+    def finish_item(self, job_id: str, idx: int, result: Optional[Dict] = None,
+                    error: Optional[str] = None):
+        """写入子项结果；子项已被取消时丢弃结果"""
+        now = time.time()
+        status = ITEM_ERROR if error is not None else ITEM_DONE
+        counter = "failed" if error is not None else "completed"
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self._conn.execute(
+                    "UPDATE job_items SET status = ?, result = ?, error = ?, updated_at = ? "
+                    "WHERE job_id = ? AND idx = ? AND status = ?",
+                    (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                     error, now, job_id, idx, ITEM_RUNNING)
+                )
+                if cur.rowcount:
+                    self._conn.execute(
+                        f"UPDATE jobs SET {counter} = {counter} + 1, updated_at = ? WHERE id = ?",
+                        (now, job_id)
+                    )
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ? WHERE id = ? AND status = ? AND completed + failed >= total",
+                        (JOB_COMPLETED, job_id, JOB_RUNNING)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def cancel_job(self, job_id: str) -> bool:
+        """取消任务：未开始的子项标记为cancelled，运行中的子项结果将被丢弃"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self._conn.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status IN (?, ?)",
+                    (JOB_CANCELLED, now, job_id, JOB_QUEUED, JOB_RUNNING)
+                )
+                if cur.rowcount:
+                    self._conn.execute(
+                        "UPDATE job_items SET status = ?, updated_at = ? "
+                        "WHERE job_id = ? AND status IN (?, ?)",
+                        (ITEM_CANCELLED, now, job_id, ITEM_PENDING, ITEM_RUNNING)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return bool(cur.rowcount)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """获取任务概要"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "params": json.loads(row["params"]) if row["params"] else {},
+            "total": row["total"],
+            "completed": row["completed"],
+            "failed": row["failed"],
+            "pending": row["total"] - row["completed"] - row["failed"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+
+    def get_results(self, job_id: str, offset: int = 0, limit: int = 100,
+                    status: Optional[str] = None) -> List[Dict]:
+        """分页获取子项结果（按提交顺序）"""
+        sql = "SELECT idx, status, result, error FROM job_items WHERE job_id = ?"
+        args = [job_id]
+        if status:
+            sql += " AND status = ?"
+            args.append(status)
+        sql += " ORDER BY idx LIMIT ? OFFSET ?"
+        args.extend([limit, offset])
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [
+            {
+                "index": row["idx"],
+                "status": row["status"],
+                "result": json.loads(row["result"]) if row["result"] else None,
+                "error": row["error"]
+            }
+            for row in rows
+        ]
+
+
+class JobWorkerPool:
+    """后台任务处理协程池"""
+
+    def __init__(self, store: JobStore, handler: Callable[[Dict], Awaitable[Dict]],
+                 workers: int = 2, poll_interval: float = 1.0, recover: bool = True):
+        self.store = store
+        self.recover = recover
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def start(self):
+        """恢复中断的子项并启动工作协程（recover=False 时跳过恢复，用于多进程共享同一任务库）"""
+        loop = asyncio.get_running_loop()
+        if self.recover:
+            recovered = await loop.run_in_executor(None, self.store.recover)
+            if recovered:
+                logger.info(f"已恢复 {recovered} 个中断的任务子项")
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"任务队列已启动，工作协程数: {self.workers}")
+
+    async def stop(self):
+        """停止工作协程；运行中的子项在下次启动时重新执行"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """有新任务提交时唤醒空闲的工作协程"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _worker(self, worker_id: int):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await loop.run_in_executor(None, self.store.claim_next)
+            if item is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                result = await self.handler(item["request"])
+                error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result = None
+                error = getattr(e, "detail", None) or str(e)
+                logger.warning(f"任务 {item['job_id']} 子项 {item['idx']} 失败: {error}")
+
+            await loop.run_in_executor(
+                None, self.store.finish_item, item["job_id"], item["idx"], result, error
+            )
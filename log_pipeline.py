@@ -0,0 +1,152 @@
+"""
+非阻塞日志管道
+日志调用只把记录放入内存队列，由后台线程统一格式化和写出；
+提示词等大负载只记录哈希和长度，完整内容按采样率输出到DEBUG日志
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+# 日志配置
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text 或 json
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0"))  # 完整负载DEBUG日志的采样率
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["NonBlockingQueueHandler"] = None
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时直接丢弃记录并计数，保证日志调用永不阻塞请求处理"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只合并消息参数，格式化留给后台线程
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredFormatter(logging.Formatter):
+    """结构化JSON格式：一行一条记录，extra 中的 fields 展开为顶层字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            data.update(fields)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """文本格式：在消息后以 key=value 附加结构化字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += " | " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return text
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, queue_size: int = LOG_QUEUE_SIZE):
+    """配置根日志：请求线程只入队，后台监听线程负责格式化与输出（重复调用无副作用）"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(StructuredFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """停止后台线程并写出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_count() -> int:
+    """因队列满而丢弃的日志条数"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def payload_digest(text: str) -> str:
+    """负载内容的短哈希（用于关联同一提示词的多条日志）"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def log_prompt(logger: logging.Logger, event: str, prompt: Optional[str] = None,
+               messages: Optional[List[Dict[str, Any]]] = None, **fields):
+    """
+    记录提示词/消息：INFO级别只包含哈希和长度，完整内容按采样率写入DEBUG日志
+
+    参数:
+        event: 事件名称
+        prompt: 提示词文本
+        messages: 发送给模型的消息列表
+        fields: 其他结构化字段（如 agent_id、model）
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        return
+
+    record_fields = dict(fields)
+    if prompt is not None:
+        record_fields["prompt_hash"] = payload_digest(prompt)
+        record_fields["prompt_chars"] = len(prompt)
+    if messages is not None:
+        record_fields["message_count"] = len(messages)
+        record_fields["message_chars"] = sum(len(str(m.get("content", ""))) for m in messages)
+        record_fields["messages_hash"] = payload_digest(
+            "\x1e".join(f"{m.get('role')}:{m.get('content')}" for m in messages)
+        )
+    logger.info(event, extra={"fields": record_fields})
+
+    if (LOG_PAYLOAD_SAMPLE_RATE > 0 and logger.isEnabledFor(logging.DEBUG)
+            and random.random() < LOG_PAYLOAD_SAMPLE_RATE):
+        payload = {"prompt": prompt} if prompt is not None else {}
+        if messages is not None:
+            payload["messages"] = messages
+        logger.debug(f"{event}（完整内容）", extra={"fields": {**record_fields, **payload, "sampled_at": time.time()}})
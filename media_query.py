@@ -0,0 +1,208 @@
+"""
+媒体档案列式查询引擎
+将媒体指标加载为NumPy列式表，支持向量化的过滤、排序、Top-K与分页
+"""
+
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 数值列：(列名, 档案分区, 字段名)
+NUMERIC_FIELDS = [
+    ("total_questions", "taiwan_issue_analysis", "total_questions"),
+    ("counter_count", "taiwan_issue_analysis", "counter_count"),
+    ("aligned_count", "taiwan_issue_analysis", "aligned_count"),
+    ("neutral_count", "taiwan_issue_analysis", "neutral_count"),
+    ("counter_ratio", "taiwan_issue_analysis", "counter_ratio"),
+    ("aligned_ratio", "taiwan_issue_analysis", "aligned_ratio"),
+    ("neutral_ratio", "taiwan_issue_analysis", "neutral_ratio"),
+    ("avg_question_length", "taiwan_issue_analysis", "avg_question_length"),
+    ("issue_entropy", "taiwan_issue_analysis", "issue_entropy"),
+    ("taiwan_issue_ratio", "taiwan_issue_analysis", "taiwan_issue_ratio"),
+    ("avg_aligned_score", "taiwan_issue_analysis", "avg_aligned_score"),
+    ("avg_counter_score", "taiwan_issue_analysis", "avg_counter_score"),
+    ("avg_neutral_score", "taiwan_issue_analysis", "avg_neutral_score"),
+    ("media_total_questions", "overall_performance", "media_total_questions"),
+    ("media_taihai_questions", "overall_performance", "media_taihai_questions"),
+    ("taiwan_question_ratio", "overall_performance", "taiwan_question_ratio"),
+    ("coverage_intensity", "overall_performance", "coverage_intensity"),
+    ("topic_diversity", "overall_performance", "topic_diversity"),
+    ("challenge_level", "generation_parameters", "challenge_level"),
+    ("consistency_level", "generation_parameters", "consistency_level"),
+    ("neutral_tendency", "generation_parameters", "neutral_tendency"),
+    ("semantic_intensity", "generation_parameters", "semantic_intensity"),
+]
+
+# 分类列：(列名, 档案分区, 字段名)
+CATEGORICAL_FIELDS = [
+    ("stance_label", "taiwan_issue_analysis", "stance_label"),
+    ("country", "basic_info", "country"),
+    ("ownership", "basic_info", "ownership"),
+    ("media_type", "basic_info", "media_type"),
+    ("language", "basic_info", "language"),
+    ("political_stance", "basic_info", "political_stance"),
+    ("question_style", "generation_parameters", "question_style"),
+]
+
+# 条件表达式：字段 运算符 值；== 和 != 的值可用 | 分隔多个候选
+CONDITION_PATTERN = re.compile(r"^\s*([A-Za-z_][A-Za-z0-9_]*)\s*(==|!=|>=|<=|>|<|=)\s*(.*?)\s*$")
+
+
+def issue_column_name(issue_key: str) -> str:
+    """议题分布字段名转换为列名，如 EI_1_外国政府涉台立法 -> EI_1"""
+    parts = issue_key.split("_")
+    return "_".join(parts[:2]) if len(parts) >= 2 else issue_key
+
+
+class MediaTable:
+    """媒体档案的只读列式表（随档案快照构建）"""
+
+    def __init__(self, media: Dict[str, Dict]):
+        self.ids: List[str] = list(media.keys())
+        self.size = len(self.ids)
+        profiles = list(media.values())
+
+        self.numeric: Dict[str, np.ndarray] = {}
+        for column, section, key in NUMERIC_FIELDS:
+            self.numeric[column] = np.array(
+                [self._number(p.get(section, {}).get(key)) for p in profiles], dtype=np.float64
+            )
+
+        # 议题分布各列（不同档案可能缺失部分议题，缺失记为0）
+        issue_keys = []
+        for p in profiles:
+            for issue_key in p.get("taiwan_issue_analysis", {}).get("issue_distribution", {}):
+                if issue_key not in issue_keys:
+                    issue_keys.append(issue_key)
+        for issue_key in issue_keys:
+            self.numeric[issue_column_name(issue_key)] = np.array(
+                [self._number(p.get("taiwan_issue_analysis", {}).get("issue_distribution", {}).get(issue_key, 0))
+                 for p in profiles], dtype=np.float64
+            )
+
+        # 分类列编码为整数，比较时只需比较编码
+        self.categories: Dict[str, List[str]] = {}
+        self.codes: Dict[str, np.ndarray] = {}
+        for column, section, key in CATEGORICAL_FIELDS:
+            values = [str(p.get(section, {}).get(key, "未知")) for p in profiles]
+            categories = sorted(set(values))
+            lookup = {value: code for code, value in enumerate(categories)}
+            self.categories[column] = categories
+            self.codes[column] = np.array([lookup[v] for v in values], dtype=np.int32)
+
+        self._id_array = np.array(self.ids, dtype=object)
+
+    @staticmethod
+    def _number(value) -> float:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return np.nan
+        return float(value)
+
+    @property
+    def fields(self) -> List[str]:
+        """可查询的列名"""
+        return list(self.numeric.keys()) + list(self.codes.keys())
+
+    def _condition_mask(self, condition: str) -> np.ndarray:
+        match = CONDITION_PATTERN.match(condition)
+        if not match:
+            raise ValueError(f"无法解析的条件: '{condition}'，格式应为 字段 运算符 值，如 aligned_ratio>=0.5")
+        column, op, raw_value = match.groups()
+
+        if column in self.codes:
+            if op not in ("=", "==", "!="):
+                raise ValueError(f"分类字段 {column} 只支持 == 和 !=")
+            lookup = {value: code for code, value in enumerate(self.categories[column])}
+            wanted = [lookup[v] for v in raw_value.split("|") if v in lookup]
+            mask = np.isin(self.codes[column], np.array(wanted, dtype=np.int32))
+            return ~mask if op == "!=" else mask
+
+        if column in self.numeric:
+            values = self.numeric[column]
+            if op in ("=", "==", "!="):
+                try:
+                    targets = np.array([float(v) for v in raw_value.split("|")], dtype=np.float64)
+                except ValueError:
+                    raise ValueError(f"数值字段 {column} 的比较值无效: '{raw_value}'")
+                mask = np.isin(values, targets)
+                return ~mask if op == "!=" else mask
+            try:
+                target = float(raw_value)
+            except ValueError:
+                raise ValueError(f"数值字段 {column} 的比较值无效: '{raw_value}'")
+            if op == ">=":
+                return values >= target
+            if op == "<=":
+                return values <= target
+            if op == ">":
+                return values > target
+            return values < target
+
+        raise ValueError(f"未知字段: '{column}'，可用字段: {', '.join(self.fields)}")
+
+    def _sort_keys(self, sort: str) -> List[Tuple[np.ndarray, bool]]:
+        keys = []
+        for item in sort.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            descending = item.startswith("-")
+            column = item.lstrip("+-")
+            if column in self.numeric:
+                keys.append((self.numeric[column], descending))
+            elif column in self.codes:
+                keys.append((self.codes[column], descending))
+            else:
+                raise ValueError(f"未知排序字段: '{column}'")
+        return keys
+
+    def query(self, where: Optional[Sequence[str]] = None, sort: Optional[str] = None,
+              limit: Optional[int] = None, offset: int = 0) -> Tuple[List[str], int]:
+        """
+        向量化查询
+
+        参数:
+            where: 条件列表（AND组合），如 ["stance_label==Aligned", "aligned_ratio>=0.5"]
+            sort: 排序字段，逗号分隔，前缀 - 表示降序，如 "-media_taihai_questions,total_questions"
+            limit: 返回数量上限
+            offset: 分页偏移
+
+        返回:
+            (媒体ID列表, 匹配总数)
+        """
+        mask = np.ones(self.size, dtype=bool)
+        for condition in where or []:
+            mask &= self._condition_mask(condition)
+        selected = np.flatnonzero(mask)
+        total = int(selected.size)
+
+        offset = max(0, offset)
+        end = total if limit is None else min(total, offset + max(0, limit))
+
+        if sort and selected.size:
+            keys = self._sort_keys(sort)
+            # NaN 统一排在最后；降序通过取负实现
+            sort_columns = []
+            for values, descending in keys:
+                column = values[selected].astype(np.float64)
+                column = np.where(np.isnan(column), np.inf, -column if descending else column)
+                sort_columns.append(column)
+
+            if len(sort_columns) == 1 and end < selected.size:
+                # 单字段Top-K：用 partition 求出第end个值（截断值），只对不超过截断值的行排序；
+                # 与截断值相同的行全部保留，按原始位置稳定排序后截取，结果与完整排序的前end个一致
+                column = sort_columns[0]
+                if end > 0:
+                    cutoff = np.partition(column, end - 1)[end - 1]
+                    candidates = np.flatnonzero(column <= cutoff)
+                    top = candidates[np.argsort(column[candidates], kind="stable")[:end]]
+                else:
+                    top = np.array([], dtype=np.intp)
+                selected = selected[top]
+            else:
+                # lexsort以最后一个键为主键；加入原始位置保证稳定
+                order = np.lexsort([np.arange(selected.size)] + sort_columns[::-1])
+                selected = selected[order]
+
+        return self._id_array[selected[offset:end]].tolist(), total
@@ -0,0 +1,146 @@
+"""
+模型路由
+按请求选择模型与思考模式：依据智能体类型、提示词长度、延迟目标（SLO）与各模型的实测延迟
+
+规则（按顺序）:
+1. 智能体类型对应的首选模型（agent_models，"fastest" 表示实测最快的模型）
+2. 思考模式只对配置允许的智能体类型开启，提示词超过 long_prompt_chars 时关闭
+3. 给定延迟目标时，预计延迟超标则先关闭思考模式，仍超标再改用满足目标的最快模型（都不满足时用最快模型）
+
+实测延迟为各(模型, 思考模式)的指数滑动平均；尚无样本时使用 priors 中的先验值
+"""
+
+import threading
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+
+FASTEST = "fastest"
+
+# 尚无实测数据时的预计延迟（毫秒）
+DEFAULT_PRIORS = {
+    "glm-4.5-flash": 3000.0,
+    "glm-4": 5000.0,
+    "glm-3-turbo": 2000.0,
+}
+DEFAULT_PRIOR_MS = 4000.0
+THINKING_FACTOR = 2.5  # 思考模式相对普通模式的先验延迟倍数
+
+
+def parse_agent_models(spec: str) -> Dict[str, str]:
+    """解析 "media:glm-4.5-flash,user:fastest" 形式的配置"""
+    routes = {}
+    for item in spec.split(","):
+        if ":" in item:
+            agent_type, model = item.split(":", 1)
+            routes[agent_type.strip()] = model.strip()
+    return routes
+
+
+class RoutingDecision:
+    __slots__ = ("model", "thinking", "reason", "predicted_ms", "slo_ms")
+
+    def __init__(self, model: str, thinking: bool, reason: str,
+                 predicted_ms: Optional[float] = None, slo_ms: Optional[float] = None):
+        self.model = model
+        self.thinking = thinking
+        self.reason = reason
+        self.predicted_ms = predicted_ms
+        self.slo_ms = slo_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "thinking": self.thinking,
+            "reason": self.reason,
+            "predicted_ms": round(self.predicted_ms, 1) if self.predicted_ms is not None else None,
+            "slo_ms": self.slo_ms
+        }
+
+
+class ModelRouter:
+    """按请求路由模型；observe 记录实测延迟（线程安全）"""
+
+    def __init__(self, models: Sequence[str], default_model: str, agent_models: Mapping[str, str],
+                 thinking_enabled: bool = False, thinking_agents: Sequence[str] = ("media",),
+                 thinking_models: Sequence[str] = (), long_prompt_chars: int = 6000,
+                 priors: Optional[Mapping[str, float]] = None, alpha: float = 0.2, enabled: bool = True):
+        self.models = list(models) or [default_model]
+        self.default_model = default_model
+        self.agent_models = dict(agent_models)
+        self.thinking_enabled = thinking_enabled
+        self.thinking_agents = set(thinking_agents)
+        self.thinking_models = set(thinking_models)
+        self.long_prompt_chars = long_prompt_chars
+        self.priors = dict(DEFAULT_PRIORS if priors is None else priors)
+        self.alpha = alpha
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._latency: Dict[Tuple[str, bool], float] = {}
+        self._samples: Dict[Tuple[str, bool], int] = {}
+
+    def supports_thinking(self, model: str) -> bool:
+        return model in self.thinking_models
+
+    def observe(self, model: str, thinking: bool, latency_ms: float):
+        """记录一次调用的实测延迟"""
+        key = (model, bool(thinking))
+        with self._lock:
+            previous = self._latency.get(key)
+            self._latency[key] = latency_ms if previous is None else \
+                previous + self.alpha * (latency_ms - previous)
+            self._samples[key] = self._samples.get(key, 0) + 1
+
+    def predicted(self, model: str, thinking: bool) -> float:
+        observed = self._latency.get((model, thinking))
+        if observed is not None:
+            return observed
+        prior = self.priors.get(model, DEFAULT_PRIOR_MS)
+        return prior * THINKING_FACTOR if thinking else prior
+
+    def _fastest(self, slo_ms: Optional[float] = None) -> Tuple[str, float]:
+        ranked = sorted((self.predicted(model, False), model) for model in self.models)
+        if slo_ms is not None:
+            for latency, model in ranked:
+                if latency <= slo_ms:
+                    return model, latency
+        return ranked[0][1], ranked[0][0]
+
+    def route(self, agent_type: str, prompt_chars: int, slo_ms: Optional[float] = None) -> RoutingDecision:
+        """为一次请求选择模型与思考模式"""
+        if not self.enabled:
+            return RoutingDecision(self.default_model, self.thinking_enabled, "fixed", slo_ms=slo_ms)
+
+        preferred = self.agent_models.get(agent_type, self.default_model)
+        if preferred == FASTEST:
+            model, _ = self._fastest()
+            reason = f"{agent_type}:fastest"
+        else:
+            model, reason = preferred, f"{agent_type}:preferred"
+
+        thinking = (self.thinking_enabled and agent_type in self.thinking_agents
+                    and self.supports_thinking(model))
+        if thinking and prompt_chars > self.long_prompt_chars:
+            thinking = False
+            reason += ",long_prompt_no_thinking"
+
+        predicted = self.predicted(model, thinking)
+        if slo_ms is not None and predicted > slo_ms:
+            if thinking and self.predicted(model, False) <= slo_ms:
+                thinking = False
+                predicted = self.predicted(model, False)
+                reason += ",slo_no_thinking"
+            else:
+                model, predicted = self._fastest(slo_ms)
+                thinking = False
+                reason += ",slo_fastest" if predicted <= slo_ms else ",slo_unmet_fastest"
+        return RoutingDecision(model, thinking, reason, predicted, slo_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            observed = {
+                f"{model}{'+thinking' if thinking else ''}": {
+                    "ewma_ms": round(latency, 1), "samples": self._samples[(model, thinking)]
+                }
+                for (model, thinking), latency in self._latency.items()
+            }
+        return {"enabled": self.enabled, "models": self.models, "agent_models": self.agent_models,
+                "observed": observed}
@@ -0,0 +1,75 @@
+"""
+按档案控制生成长度
+- 输出预算：媒体按档案的提问长度上限（avg_question_length × 1.3，即提示词中的 length_max），用户按提示词要求的
+  评论长度上限（150字），换算为 max_tokens 并留出余量；开启思考模式时推理内容也计入 max_tokens，不使用预算
+- 停止序列：提问/评论之后模型常另起一段附加解释，遇到空行即停止生成
+- 后处理：去掉"提问："等前缀和包裹的引号，只保留第一段；因长度截断或明显超长时在最后一个完整句子处截断
+"""
+
+import math
+import re
+from typing import Any, Dict
+
+USER_LENGTH_MAX = 150   # 用户评论提示词要求的长度上限（字）
+STOP_SEQUENCES = ["\n\n"]
+
+PREFIX_PATTERN = re.compile(r"^\s*(?:\*\*)?(?:记者提问|提问内容|提问|问题|评论内容|评论|回答)(?:\*\*)?\s*[:：]\s*")
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = "。！？!?…"
+QUOTE_PAIRS = {"“": "”", "「": "」", "\"": "\"", "『": "』"}
+MIN_CHARS = 10          # 短于该长度的片段不视为完整的提问/评论
+
+
+class OutputBudget:
+    """由字符上限换算 max_tokens：ceil(字数 × 每字token数 × 余量) + 固定余量，限制在 [min_tokens, max_tokens]"""
+
+    def __init__(self, tokens_per_char: float = 0.8, headroom: float = 1.25, extra_tokens: int = 16,
+                 min_tokens: int = 48, max_tokens: int = 512):
+        self.tokens_per_char = tokens_per_char
+        self.headroom = headroom
+        self.extra_tokens = extra_tokens
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+
+    def max_chars(self, agent_type: str, profile: Any) -> int:
+        """智能体输出的长度上限（字）"""
+        if agent_type == "media":
+            return max(MIN_CHARS, int(math.ceil(profile.length_max)))
+        return USER_LENGTH_MAX
+
+    def tokens_for(self, max_chars: int) -> int:
+        tokens = int(math.ceil(max_chars * self.tokens_per_char * self.headroom)) + self.extra_tokens
+        return min(self.max_tokens, max(self.min_tokens, tokens))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"tokens_per_char": self.tokens_per_char, "headroom": self.headroom,
+                "extra_tokens": self.extra_tokens, "min_tokens": self.min_tokens, "max_tokens": self.max_tokens}
+
+
+def _strip_quotes(text: str) -> str:
+    closing = QUOTE_PAIRS.get(text[:1])
+    if closing and text.endswith(closing) and len(text) > 2 and closing not in text[1:-1]:
+        return text[1:-1].strip()
+    return text
+
+
+def _last_sentence_end(text: str, limit: int) -> int:
+    """limit 之内最后一个句末标点的位置（没有时返回 -1）"""
+    return max(text.rfind(mark, 0, limit) for mark in SENTENCE_END)
+
+
+def trim_output(text: str, max_chars: int, truncated: bool = False) -> str:
+    """后处理：去前缀/引号，只保留第一段，因长度截断（truncated）或超出上限 1.5 倍时截到最后一个完整句子"""
+    text = PREFIX_PATTERN.sub("", text.strip(), count=1)
+    paragraphs = [p.strip() for p in PARAGRAPH_BREAK.split(text) if p.strip()]
+    if len(paragraphs) > 1 and len(paragraphs[0]) >= MIN_CHARS:
+        text = paragraphs[0]
+    text = _strip_quotes(text)
+
+    overlong = len(text) > max_chars * 1.5
+    if truncated or overlong:
+        end = _last_sentence_end(text, int(max_chars * 1.5) if overlong else len(text))
+        if end + 1 >= MIN_CHARS:
+            text = text[:end + 1]
+    return text
+
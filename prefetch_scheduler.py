@@ -0,0 +1,89 @@
+"""
+发布会提问预生成
+按计划的发言顺序，在当前提问推送期间提前在后台生成后续 N 位记者的提问，轮到时通常已生成完毕
+
+浪费上限：计划变更（发言顺序调整、客户端断开）时已发起但不再需要的预生成调用计为浪费；
+只有在"已浪费 + 尚未取用的预生成"小于上限时才发起新的预生成，保证浪费的调用数不超过上限，
+达到上限后退化为轮到时才生成
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class PrefetchScheduler:
+    """按发言顺序预生成；同一发言者只生成一次"""
+
+    def __init__(self, generate: Callable[[Hashable], Awaitable[Any]], lookahead: int = 2, max_wasted: int = 2):
+        self.generate = generate
+        self.lookahead = max(0, lookahead)
+        self.max_wasted = max(0, max_wasted)
+        self.order: List[Hashable] = []
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._speculative = set()   # 预生成且尚未取用的发言者
+        self.prefetched = 0         # 发起的预生成调用数
+        self.ready_hits = 0         # 轮到时已生成完毕的次数
+        self.wasted = 0
+
+    def _start(self, key: Hashable) -> asyncio.Task:
+        task = asyncio.ensure_future(self.generate(key))
+        # 未被取用的任务出错时也要取走异常，避免"异常未处理"警告
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._tasks[key] = task
+        return task
+
+    def _discard(self, key: Hashable):
+        task = self._tasks.pop(key)
+        if key in self._speculative:
+            self._speculative.discard(key)
+            self.wasted += 1
+        task.cancel()
+
+    def _fill(self, after: int):
+        """为 after 之后的 lookahead 位发言者发起预生成（受浪费上限约束）"""
+        for key in self.order[after + 1:after + 1 + self.lookahead]:
+            if key in self._tasks:
+                continue
+            if self.wasted + len(self._speculative) >= self.max_wasted:
+                break
+            self._speculative.add(key)
+            self.prefetched += 1
+            self._start(key)
+
+    def plan(self, order: Sequence[Hashable]):
+        """设置或更新发言顺序；已不在计划中的预生成被取消并计为浪费"""
+        self.order = list(order)
+        planned = set(self.order)
+        for key in [key for key in self._tasks if key not in planned]:
+            self._discard(key)
+        self._fill(-1)
+
+    async def get(self, key: Hashable) -> Any:
+        """取得发言者的生成结果（已预生成时直接等待其完成），并为后续发言者发起预生成"""
+        task = self._tasks.pop(key, None)
+        if task is None:
+            task = self._start(key)
+            self._tasks.pop(key)
+        elif key in self._speculative:
+            self._speculative.discard(key)
+            if task.done():
+                self.ready_hits += 1
+        if key in self.order:
+            self._fill(self.order.index(key))
+        return await task
+
+    def close(self):
+        """结束（含客户端断开）：取消所有未取用的预生成"""
+        for key in list(self._tasks):
+            self._discard(key)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "lookahead": self.lookahead,
+            "prefetched": self.prefetched,
+            "ready_on_turn": self.ready_hits,
+            "wasted": self.wasted
+        }
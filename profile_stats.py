@@ -0,0 +1,380 @@
+"""
+媒体档案在线统计
+仿真中新生成的提问逐条计入按媒体的运行统计，在线更新 taiwan_issue_analysis 中的
+计数、比例、平均长度、平均得分与议题熵，每条观测 O(1)，不回看历史、不重写档案文件
+
+衰减窗口：按媒体自身的观测条数做指数衰减，半衰期为 half_life 条（0 表示不衰减，累计全部观测）。
+实现上不逐条把所有计数乘以衰减系数，而是让新观测的权重按 1/α 递增（权重放大因子 scale），
+实际计数 = 存储值 / scale；scale 过大时整体归一化一次（摊还 O(1)）。
+
+议题熵：H = ln N − Σ nᵢ·ln nᵢ / N。维护 W = Σ wᵢ 与 S = Σ wᵢ·ln wᵢ（wᵢ 为放大后的计数），
+单个议题计数变化时 S 只需替换该项；H = ln W − S / W 与放大因子无关
+
+统计以档案中的历史指标为初值（议题分布按 issue_distribution × taiwan_issue_ratio 还原，
+其余记为"其他"），初值同样参与衰减，随新观测逐步淡出。还原的分布与档案的 issue_entropy 并不一致
+（原始数据的熵无法由汇总比例复原），因此 S 按档案熵设定初值（S = W·(ln W − H档案)），使未有新观测时的熵
+等于档案值；S 与各议题计数之差在归一化时与计数一同缩小，随初值淡出
+
+多进程：各工作进程只暂存上次写入后的新观测，写入时在 SQLite 写事务（BEGIN IMMEDIATE）中读取已存的统计、
+计入这些观测后写回，并以合并结果替换本进程的统计，各进程的观测都不会被覆盖
+"""
+
+import json
+import logging
+import math
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+STANCES = ("Counter", "Aligned", "Neutral")
+SCORE_FIELDS = ("aligned_score", "counter_score", "neutral_score")
+OTHER_CATEGORY = "其他"
+
+# 议题分布类别（与 agents_data/convert_media_data.py 的 ISSUE_COLUMNS 一致）
+ISSUE_CATEGORIES = (
+    "EI_1_外国政府涉台立法",
+    "EI_2_外国政要涉台表态或访问",
+    "EI_3_国际组织涉台表述",
+    "EI_5_外媒涉台报道争议",
+    "MS_1_外国军舰军机穿越台海",
+    "MS_2_对台军售或军事援助",
+)
+
+# 放大因子超过该值时归一化，避免浮点溢出与精度损失
+RENORMALIZE_AT = 1e12
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media_stats (
+    media_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+"""
+
+
+def _n_log_n(value: float) -> float:
+    return value * math.log(value) if value > 0 else 0.0
+
+
+def determine_stance_label(counter_ratio: float, aligned_ratio: float) -> str:
+    """根据比例判断立场标签（与档案转换规则一致）"""
+    if counter_ratio > 0.6:
+        return "Counter"
+    elif aligned_ratio > 0.6:
+        return "Aligned"
+    return "Mixed"
+
+
+class MediaStats:
+    """单个媒体的衰减运行统计（存储值均为放大后的权重）"""
+
+    __slots__ = ("decay", "scale", "observations", "total", "stances", "sums", "weights",
+                 "issues", "issue_total", "issue_n_log_n")
+
+    def __init__(self, decay: float = 1.0):
+        self.decay = decay              # 每条新观测使旧数据乘以的系数 α（1 表示不衰减）
+        self.scale = 1.0                # 当前新观测的权重
+        self.observations = 0           # 已计入的新观测条数（不含初值）
+        self.total = 0.0                # 有立场标签的提问数
+        self.stances = {label: 0.0 for label in STANCES}
+        self.sums = {}                  # 长度与得分的加权和
+        self.weights = {}               # 长度与得分的有效权重（缺失值不计入均值）
+        self.issues: Dict[str, float] = {}
+        self.issue_total = 0.0          # W = Σ wᵢ
+        self.issue_n_log_n = 0.0        # S = Σ wᵢ·ln wᵢ
+
+    @classmethod
+    def from_profile(cls, profile: Mapping[str, Any], decay: float = 1.0) -> "MediaStats":
+        """以档案中的历史指标为初值"""
+        self = cls(decay)
+        analysis = profile.get("taiwan_issue_analysis", {}) or {}
+        total = float(analysis.get("total_questions", 0) or 0)
+        self.total = total
+        for label in STANCES:
+            count = analysis.get(f"{label.lower()}_count")
+            if count is None:
+                count = float(analysis.get(f"{label.lower()}_ratio", 0) or 0) * total
+            self.stances[label] = float(count)
+        for field, key in (("question_length", "avg_question_length"),) + tuple(
+                (field, f"avg_{field}") for field in SCORE_FIELDS):
+            if key in analysis and total > 0:
+                self.sums[field] = float(analysis[key]) * total
+                self.weights[field] = total
+
+        categorized = float(analysis.get("taiwan_issue_ratio", 0) or 0) * total
+        distribution = analysis.get("issue_distribution", {}) or {}
+        for category, share in distribution.items():
+            if share:
+                self._add_issue(category, float(share) * categorized)
+        if total - categorized > 0:
+            self._add_issue(OTHER_CATEGORY, total - categorized)
+        entropy = analysis.get("issue_entropy")
+        if entropy is not None and self.issue_total > 0:
+            self.issue_n_log_n = self.issue_total * (math.log(self.issue_total) - float(entropy))
+        return self
+
+    def _add_issue(self, category: str, weight: float):
+        previous = self.issues.get(category, 0.0)
+        current = previous + weight
+        self.issues[category] = current
+        self.issue_total += weight
+        self.issue_n_log_n += _n_log_n(current) - _n_log_n(previous)
+
+    def _renormalize(self):
+        """所有存储值除以放大因子，恢复 scale = 1（仅在放大因子过大时执行）"""
+        s = self.scale
+        self.total /= s
+        self.stances = {label: value / s for label, value in self.stances.items()}
+        self.sums = {field: value / s for field, value in self.sums.items()}
+        self.weights = {field: value / s for field, value in self.weights.items()}
+        self.issues = {category: value / s for category, value in self.issues.items()}
+        # Σ (w/s)·ln(w/s) = (S − W·ln s) / s
+        self.issue_n_log_n = (self.issue_n_log_n - self.issue_total * math.log(s)) / s
+        self.issue_total /= s
+        self.scale = 1.0
+
+    def add(self, observation: Mapping[str, Any]):
+        """计入一条新提问（O(1)）"""
+        stance = observation["stance_label"]
+        if self.decay < 1.0:
+            self.scale /= self.decay
+            if self.scale > RENORMALIZE_AT:
+                self._renormalize()
+        w = self.scale
+
+        self.observations += 1
+        self.total += w
+        self.stances[stance] += w
+        for field in ("question_length",) + SCORE_FIELDS:
+            value = observation.get(field)
+            if value is not None:
+                self.sums[field] = self.sums.get(field, 0.0) + float(value) * w
+                self.weights[field] = self.weights.get(field, 0.0) + w
+        self._add_issue(observation.get("issue_category") or OTHER_CATEGORY, w)
+
+    def _mean(self, field: str, default: float) -> float:
+        weight = self.weights.get(field, 0.0)
+        return self.sums[field] / weight if weight > 0 else default
+
+    def entropy(self) -> float:
+        """议题熵：H = ln W − S / W（与放大因子无关）"""
+        if self.issue_total <= 0:
+            return 0.0
+        return max(0.0, math.log(self.issue_total) - self.issue_n_log_n / self.issue_total)
+
+    def analysis(self, base: Mapping[str, Any]) -> Dict[str, Any]:
+        """生成更新后的 taiwan_issue_analysis（未统计的字段沿用档案原值）"""
+        s = self.scale
+        total = self.total / s
+        result = dict(base)
+        # 衰减后的计数为小数，提示词中按整数展示
+        result["total_questions"] = round(total)
+        ratios = {}
+        for label in STANCES:
+            count = self.stances[label] / s
+            ratios[label] = count / total if total > 0 else 0.0
+            result[f"{label.lower()}_count"] = round(count)
+            result[f"{label.lower()}_ratio"] = ratios[label]
+        result["stance_label"] = determine_stance_label(ratios["Counter"], ratios["Aligned"])
+        result["avg_question_length"] = self._mean("question_length", base.get("avg_question_length", 100))
+        for field in SCORE_FIELDS:
+            result[f"avg_{field}"] = self._mean(field, base.get(f"avg_{field}", 0.5))
+        result["issue_entropy"] = self.entropy()
+
+        categorized = sum(self.issues.get(category, 0.0) for category in ISSUE_CATEGORIES)
+        result["taiwan_issue_ratio"] = categorized / self.total if self.total > 0 else 0.0
+        result["issue_distribution"] = {
+            category: (self.issues.get(category, 0.0) / categorized if categorized > 0 else 0.0)
+            for category in ISSUE_CATEGORIES
+        }
+        return result
+
+    def to_state(self) -> Dict[str, Any]:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_state(cls, state: Mapping[str, Any]) -> "MediaStats":
+        self = cls.__new__(cls)
+        for slot in cls.__slots__:
+            setattr(self, slot, state[slot])
+        return self
+
+
+def validate_observation(observation: Mapping[str, Any]) -> Dict[str, Any]:
+    """校验并规范化一条观测；question_length 缺失时由 question 文本长度得到"""
+    stance = observation.get("stance_label")
+    if stance not in STANCES:
+        raise ValueError(f"stance_label 必须是 {', '.join(STANCES)} 之一，实际为 {stance!r}")
+    result = {"stance_label": stance, "issue_category": observation.get("issue_category") or OTHER_CATEGORY}
+    length = observation.get("question_length")
+    if length is None and isinstance(observation.get("question"), str):
+        length = len(observation["question"])
+    for field, value in (("question_length", length),) + tuple(
+            (field, observation.get(field)) for field in SCORE_FIELDS):
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"观测字段 {field} 必须是数值，实际为 {value!r}")
+        result[field] = float(value)
+    return result
+
+
+class ProfileStatsStore:
+    """按媒体的在线统计；可选持久化到SQLite（只写入有变化的媒体行，不重写档案文件）"""
+
+    def __init__(self, half_life: float = 0, db_path: str = ""):
+        self.half_life = half_life
+        self.decay = 0.5 ** (1.0 / half_life) if half_life > 0 else 1.0
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()        # 持久化连接的独占使用（写事务期间）
+        self._stats: Dict[str, MediaStats] = {}
+        self._versions: Dict[str, int] = {}
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}    # 尚未写入的新观测
+        self._profiles: Dict[str, Mapping[str, Any]] = {}      # 统计初值所用的档案（存储中没有该媒体时使用）
+        self._overlays: Dict[str, Any] = {}     # media_id -> (统计版本, 档案对象, 叠加后的档案对象)
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # 自动提交模式，写事务由 flush 显式开启
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def load(self):
+        """从持久化文件恢复统计（未配置路径时不做任何事）"""
+        if not self.db_path:
+            return
+        with self._db_lock:
+            rows = self._connection().execute("SELECT media_id, state FROM media_stats").fetchall()
+        with self._lock:
+            for media_id, state in rows:
+                stats = MediaStats.from_state(json.loads(state))
+                stats.decay = self.decay    # 以当前配置的衰减窗口继续更新
+                self._stats[media_id] = stats
+                self._versions[media_id] = 1
+        if rows:
+            logger.info(f"已恢复 {len(rows)} 个媒体的在线统计")
+
+    def _merge(self, conn: sqlite3.Connection, media_id: str, observations: List[Dict[str, Any]],
+               profile: Mapping[str, Any]) -> MediaStats:
+        """在写事务中把新观测计入已存的统计（其他进程写入的观测一并保留）"""
+        row = conn.execute("SELECT state FROM media_stats WHERE media_id = ?", (media_id,)).fetchone()
+        if row is not None:
+            stats = MediaStats.from_state(json.loads(row[0]))
+            stats.decay = self.decay
+        else:
+            stats = MediaStats.from_profile(profile, self.decay)
+        for observation in observations:
+            stats.add(observation)
+        conn.execute("INSERT OR REPLACE INTO media_stats (media_id, state) VALUES (?, ?)",
+                     (media_id, json.dumps(stats.to_state(), ensure_ascii=False)))
+        return stats
+
+    def flush(self):
+        """将新观测合并写入持久化文件，并以合并结果（含其他进程的观测）更新本进程的统计"""
+        if not self.db_path or not self._pending:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            profiles = {media_id: self._profiles[media_id] for media_id in pending}
+        merged = {}
+        with self._db_lock:
+            conn = self._connection()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for media_id, observations in pending.items():
+                    merged[media_id] = self._merge(conn, media_id, observations, profiles[media_id])
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                # 写入失败的观测放回队列，下次重试
+                with self._lock:
+                    for media_id, observations in pending.items():
+                        self._pending[media_id] = observations + self._pending.get(media_id, [])
+                raise
+        with self._lock:
+            for media_id, stats in merged.items():
+                if media_id not in self._stats:
+                    continue    # 写入期间已被重置
+                # 写入期间新到的观测尚未持久化，继续计入本进程的统计
+                for observation in self._pending.get(media_id, ()):
+                    stats.add(observation)
+                self._stats[media_id] = stats
+                self._versions[media_id] = self._versions.get(media_id, 0) + 1
+
+    def observe(self, media_id: str, profile: Mapping[str, Any],
+                observations: Iterable[Mapping[str, Any]]) -> int:
+        """计入一批已校验的观测，返回该媒体累计的新观测条数"""
+        with self._lock:
+            stats = self._stats.get(media_id)
+            if stats is None:
+                stats = self._stats[media_id] = MediaStats.from_profile(profile, self.decay)
+            observations = list(observations)
+            for observation in observations:
+                stats.add(observation)
+            self._versions[media_id] = self._versions.get(media_id, 0) + 1
+            if self.db_path:
+                self._pending.setdefault(media_id, []).extend(observations)
+                self._profiles[media_id] = profile
+            return stats.observations
+
+    def reset(self, media_id: str) -> bool:
+        """清除媒体的在线统计，恢复使用档案原值"""
+        with self._lock:
+            removed = self._stats.pop(media_id, None) is not None
+            self._versions.pop(media_id, None)
+            self._overlays.pop(media_id, None)
+            self._pending.pop(media_id, None)
+            self._profiles.pop(media_id, None)
+        if self.db_path:
+            # 统计可能只存在于其他进程写入的存储中
+            with self._db_lock:
+                deleted = self._connection().execute("DELETE FROM media_stats WHERE media_id = ?",
+                                                     (media_id,)).rowcount
+            removed = removed or deleted > 0
+        return removed
+
+    def analysis(self, media_id: str, profile: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+        """更新后的 taiwan_issue_analysis；没有新观测时返回 None"""
+        with self._lock:
+            stats = self._stats.get(media_id)
+            if stats is None:
+                return None
+            return stats.analysis(profile.get("taiwan_issue_analysis", {}) or {})
+
+    def info(self, media_id: str) -> Dict[str, Any]:
+        with self._lock:
+            stats = self._stats.get(media_id)
+            return {
+                "observations": stats.observations if stats else 0,
+                "effective_weight": round(stats.total / stats.scale, 2) if stats else 0.0,
+                "half_life": self.half_life
+            }
+
+    def overlay(self, media_id: str, model):
+        """返回叠加在线统计后的档案对象；统计或档案未变化时复用上次结果，只在有新观测后重建一次"""
+        version = self._versions.get(media_id)
+        if version is None:
+            return model
+        cached = self._overlays.get(media_id)
+        if cached is not None and cached[0] == version and cached[1] is model:
+            return cached[2]
+        analysis = self.analysis(media_id, model.raw)
+        if analysis is None:
+            return model
+        overlaid = model.with_overrides({"taiwan_issue_analysis": analysis})
+        self._overlays[media_id] = (version, model, overlaid)
+        return overlaid
+
+    def version(self, media_id: str) -> int:
+        """媒体统计的版本号（每计入一批观测加一，没有统计时为 0）"""
+        return self._versions.get(media_id, 0)
+
+    def media_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._stats)
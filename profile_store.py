@@ -0,0 +1,381 @@
+"""
+智能体档案存储
+在请求路径之外解析、校验档案并构建查找索引，构建完成后整体原子替换，支持热加载；
+多进程部署时档案导出为共享文件，各工作进程以只读内存映射方式按需解码
+"""
+
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from response_utils import dumps_bytes, loads_bytes, make_etag
+
+logger = logging.getLogger(__name__)
+
+# 派生数据构建函数：接收新快照，返回派生结果（在后台线程中执行）
+DerivedBuilder = Callable[["ProfileSnapshot"], Any]
+
+# 额外校验函数：接收 (媒体档案, 用户档案)，校验失败时抛出异常
+ProfileValidator = Callable[[Dict[str, Dict], Dict[str, Dict]], None]
+
+# 共享档案文件格式：魔数 | 索引长度(uint64) | 索引JSON | 各档案的JSON字节
+SHARED_MAGIC = b"PROFSHM1"
+SHARED_HEADER = struct.Struct("<8sQ")
+
+
+def clean_media_name(name: str) -> str:
+    """清理媒体名称/标识（去除书名号和空格，不区分大小写）"""
+    return name.lower().replace('《', '').replace('》', '').replace(' ', '')
+
+
+def validate_profiles(data: Any, kind: str) -> Dict[str, Dict]:
+    """校验档案文件结构：顶层为 {id: 档案对象}，每个档案为对象且各分区为对象"""
+    if not isinstance(data, dict):
+        raise ValueError(f"{kind}档案文件顶层必须是对象")
+    for agent_id, profile in data.items():
+        if not isinstance(profile, dict):
+            raise ValueError(f"{kind}档案 '{agent_id}' 必须是对象")
+        if kind == "媒体":
+            for section in ("basic_info", "taiwan_issue_analysis",
+                            "overall_performance", "generation_parameters"):
+                if section in profile and not isinstance(profile[section], dict):
+                    raise ValueError(f"媒体档案 '{agent_id}' 的 {section} 必须是对象")
+    return data
+
+
+class MappedProfiles(Mapping):
+    """
+    共享档案文件中的一类档案（只读映射）
+    
+    档案以预序列化的JSON字节保存在内存映射中，按需解码且不缓存，
+    多个进程映射同一文件时共用操作系统页缓存
+    """
+
+    def __init__(self, buffer: mmap.mmap, base: int, entries: Dict[str, List]):
+        self._buffer = buffer
+        self._base = base
+        # {档案ID: [偏移, 长度, ETag]}，保持导出时的顺序
+        self._entries = entries
+
+    def raw(self, key: str) -> Tuple[bytes, str]:
+        """档案的JSON字节与ETag（即档案接口的响应体，无需重新序列化）"""
+        offset, length, etag = self._entries[key]
+        start = self._base + offset
+        return self._buffer[start:start + length], etag
+
+    def __getitem__(self, key: str) -> Dict:
+        return loads_bytes(self.raw(key)[0])
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def payloads(self) -> "MappedPayloads":
+        return MappedPayloads(self)
+
+
+class MappedPayloads(Mapping):
+    """共享档案的 {档案ID: (JSON字节, ETag)} 视图"""
+
+    def __init__(self, profiles: MappedProfiles):
+        self._profiles = profiles
+
+    def __getitem__(self, key: str) -> Tuple[bytes, str]:
+        return self._profiles.raw(key)
+
+    def __contains__(self, key) -> bool:
+        return key in self._profiles
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._profiles)
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+
+class LazyModelMap(Mapping):
+    """按需将档案解析为类型化对象并缓存（共享模式下避免每个进程预先解析全部档案）"""
+
+    def __init__(self, profiles: Mapping, factory: Callable[[Dict], Any]):
+        self._profiles = profiles
+        self._factory = factory
+        self._cache: Dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        model = self._cache.get(key)
+        if model is None:
+            model = self._factory(self._profiles[key])
+            self._cache[key] = model
+        return model
+
+    def __contains__(self, key) -> bool:
+        return key in self._profiles
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._profiles)
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+
+def export_shared_profiles(path: str, media: Dict[str, Dict], users: Dict[str, Dict], sources: Any = None):
+    """将档案导出为共享文件（先写临时文件再原子替换，已映射旧文件的进程不受影响）"""
+    body = bytearray()
+    index: Dict[str, Any] = {"sources": sources, "media": {}, "users": {}}
+    for kind, profiles in (("media", media), ("users", users)):
+        for agent_id, profile in profiles.items():
+            data = dumps_bytes(profile)
+            index[kind][agent_id] = [len(body), len(data), make_etag(data)]
+            body += data
+
+    header = json.dumps(index, ensure_ascii=False).encode("utf-8")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SHARED_HEADER.pack(SHARED_MAGIC, len(header)))
+        f.write(header)
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def open_shared_profiles(path: str) -> Tuple[MappedProfiles, MappedProfiles, Any]:
+    """映射共享档案文件，返回 (媒体档案, 用户档案, 导出时的源文件标记)"""
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, header_length = SHARED_HEADER.unpack_from(buffer, 0)
+    if magic != SHARED_MAGIC:
+        buffer.close()
+        raise ValueError(f"共享档案文件格式无效: {path}")
+    start = SHARED_HEADER.size
+    index = json.loads(buffer[start:start + header_length])
+    base = start + header_length
+    return (MappedProfiles(buffer, base, index["media"]),
+            MappedProfiles(buffer, base, index["users"]),
+            index.get("sources"))
+
+
+class ProfileSnapshot:
+    """某一版本的完整档案数据及其索引（构建完成后只读）"""
+
+    __slots__ = ("version", "loaded_at", "media", "users", "media_index", "derived", "_lookup_memo")
+
+    def __init__(self, version: int, media: Mapping, users: Mapping):
+        self.version = version
+        self.loaded_at = time.time()
+        self.media = media
+        self.users = users
+        # 模糊查找索引：(媒体ID, 清理后的ID, 清理后的名称)，保持文件中的顺序
+        self.media_index: List[Tuple[str, str, str]] = [
+            (media_id, media_id.lower(), clean_media_name(profile.get("basic_info", {}).get("name", "")))
+            for media_id, profile in media.items()
+        ]
+        self.derived: Dict[str, Any] = {}
+        self._lookup_memo: Dict[str, Optional[str]] = {}
+
+    def resolve_media_id(self, identifier: str) -> Optional[str]:
+        """根据ID或名称解析媒体ID（模糊匹配结果按快照缓存）"""
+        # 直接匹配ID
+        if identifier in self.media:
+            return identifier
+        if identifier in self._lookup_memo:
+            return self._lookup_memo[identifier]
+
+        # 尝试模糊匹配（去除特殊字符，不区分大小写）
+        clean_identifier = clean_media_name(identifier)
+        found = None
+        for media_id, clean_id, clean_name in self.media_index:
+            if clean_identifier in clean_name or clean_name in clean_identifier:
+                found = media_id
+                break
+            if clean_identifier in clean_id:
+                found = media_id
+                break
+
+        if len(self._lookup_memo) < 10000:
+            self._lookup_memo[identifier] = found
+        return found
+
+    def find_media(self, identifier: str) -> Optional[Dict]:
+        """根据ID或名称查找媒体档案"""
+        media_id = self.resolve_media_id(identifier)
+        return self.media[media_id] if media_id is not None else None
+
+    def get_derived(self, name: str) -> Any:
+        """获取派生数据"""
+        return self.derived[name]
+
+
+class ProfileStore:
+    """
+    档案存储：持有当前快照，热加载时在后台构建新快照后整体替换
+    
+    指定 shared_path 时为共享模式：源文件解析校验后导出为共享文件，快照中的档案为只读映射；
+    任一进程重新导出后，其他进程通过文件监听切换到新文件
+    """
+
+    def __init__(self, media_path: str, user_path: str, shared_path: Optional[str] = None,
+                 validator: Optional[ProfileValidator] = None):
+        self.media_path = media_path
+        self.user_path = user_path
+        self.shared_path = shared_path or None
+        self.validator = validator
+        self._snapshot: Optional[ProfileSnapshot] = None
+        self._builders: Dict[str, DerivedBuilder] = {}
+        self._reload_lock = threading.Lock()
+        self._version = 0
+        self._file_stamps: Tuple = ()
+        self._watch_task: Optional[asyncio.Task] = None
+
+    @property
+    def snapshot(self) -> ProfileSnapshot:
+        """当前快照；请求处理中应先取出快照再使用，保证同一请求看到一致的数据"""
+        if self._snapshot is None:
+            self.load()
+        return self._snapshot
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    def register_derived(self, name: str, builder: DerivedBuilder):
+        """注册派生数据构建函数，每次加载新快照时随之重建"""
+        self._builders[name] = builder
+        if self._snapshot is not None:
+            self._snapshot.derived[name] = builder(self._snapshot)
+
+    def _read_file(self, path: str, kind: str) -> Dict[str, Dict]:
+        if not os.path.exists(path):
+            logger.warning(f"{kind}数据文件不存在: {path}")
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            data = validate_profiles(json.load(f), kind)
+        logger.info(f"已加载 {len(data)} 个{kind}档案")
+        return data
+
+    def _source_stamp(self) -> List:
+        stamps = []
+        for path in (self.media_path, self.user_path):
+            try:
+                st = os.stat(path)
+                stamps.append([st.st_mtime_ns, st.st_size])
+            except OSError:
+                stamps.append(None)
+        return stamps
+
+    def _stamp(self) -> Tuple:
+        stamps = [tuple(s) if s else None for s in self._source_stamp()]
+        if self.shared_path:
+            # 共享模式下同时关注共享文件（可能由其他进程重新导出）
+            try:
+                st = os.stat(self.shared_path)
+                stamps.append((st.st_mtime_ns, st.st_ino))
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def _read_sources(self) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+        media = self._read_file(self.media_path, "媒体")
+        users = self._read_file(self.user_path, "用户")
+        if self.validator is not None:
+            self.validator(media, users)
+        return media, users
+
+    def _load_shared(self, force: bool = False) -> Tuple[MappedProfiles, MappedProfiles]:
+        """映射共享文件；文件缺失、源文件已变化或 force 时先从源文件重新导出"""
+        sources = self._source_stamp()
+        if not force and os.path.exists(self.shared_path):
+            try:
+                media, users, exported_from = open_shared_profiles(self.shared_path)
+                if exported_from == sources:
+                    return media, users
+            except (OSError, ValueError) as e:
+                logger.warning(f"共享档案文件不可用，将重新导出: {str(e)}")
+
+        media, users = self._read_sources()
+        export_shared_profiles(self.shared_path, media, users, sources)
+        logger.info(f"已导出共享档案文件: {self.shared_path}")
+        mapped_media, mapped_users, _ = open_shared_profiles(self.shared_path)
+        return mapped_media, mapped_users
+
+    def prepare_shared(self):
+        """确保共享文件与源文件一致（多进程模式下由主进程在启动工作进程前调用，不构建快照）"""
+        if self.shared_path:
+            self._load_shared()
+
+    def build_snapshot(self, force: bool = False) -> ProfileSnapshot:
+        """解析、校验档案并构建索引和全部派生数据（不影响当前快照）"""
+        if self.shared_path:
+            media, users = self._load_shared(force)
+        else:
+            media, users = self._read_sources()
+        snapshot = ProfileSnapshot(self._version + 1, media, users)
+        for name, builder in self._builders.items():
+            snapshot.derived[name] = builder(snapshot)
+        return snapshot
+
+    def load(self, force: bool = False) -> ProfileSnapshot:
+        """同步加载并替换当前快照，失败时保留旧快照并抛出异常（force 表示共享模式下强制重新导出）"""
+        with self._reload_lock:
+            stamps = self._stamp()
+            start = time.perf_counter()
+            snapshot = self.build_snapshot(force)
+            if self.shared_path:
+                # 本进程刚导出的共享文件不应再触发热加载
+                stamps = stamps[:-1] + self._stamp()[-1:]
+            # 单次引用赋值即完成替换，处理中的请求继续使用旧快照
+            self._snapshot = snapshot
+            self._version = snapshot.version
+            self._file_stamps = stamps
+            logger.info(
+                f"档案快照 v{snapshot.version} 已生效: 媒体 {len(snapshot.media)}, "
+                f"用户 {len(snapshot.users)}, 耗时 {(time.perf_counter() - start) * 1000:.1f}ms"
+            )
+            return snapshot
+
+    async def reload(self, force: bool = False) -> ProfileSnapshot:
+        """在线程池中重新加载档案，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.load, force)
+
+    def files_changed(self) -> bool:
+        """档案文件自上次加载后是否发生变化"""
+        return self._stamp() != self._file_stamps
+
+    async def _watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            if not self.files_changed():
+                continue
+            try:
+                logger.info("检测到档案文件变化，开始热加载")
+                await self.reload()
+            except Exception as e:
+                # 文件可能正在写入或内容无效：保留旧快照，待文件再次变化后重试
+                logger.error(f"档案热加载失败，继续使用 v{self._version}: {str(e)}")
+                self._file_stamps = self._stamp()
+
+    def start_watching(self, interval: float):
+        """启动文件变化轮询（需在事件循环中调用）"""
+        if interval > 0 and self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch(interval))
+            logger.info(f"档案文件监听已启动，轮询间隔: {interval}s")
+
+    async def stop_watching(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
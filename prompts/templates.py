@@ -3,111 +3,57 @@
 基于详细的媒体画像数据生成符合媒体特征的提问
 """
 
-from typing import Dict, Any, List, Optional
+from collections import ChainMap
+from typing import Dict, Any, List, Mapping, Optional, Union
 
-def get_media_prompt(topic: str, attributes: Dict[str, Any], context: str = "") -> str:
+def get_media_prompt(topic: str, attributes: Union[Mapping[str, Any], "MediaProfile"],
+                     context: str = "") -> str:
     """
     生成媒体提问的提示词 - 基于详细的媒体画像数据
     
     参数:
         topic: 议题
-        attributes: 媒体属性（包含详细指标）
+        attributes: 媒体属性（包含详细指标的字典，或已解析的 MediaProfile）
         context: 上下文信息
     
     返回:
         提示词字符串
     """
     
-    # 从属性中提取各个部分
-    basic_info = attributes.get("basic_info", {})
-    taiwan_analysis = attributes.get("taiwan_issue_analysis", {})
-    overall_performance = attributes.get("overall_performance", {})
-    generation_params = attributes.get("generation_parameters", {})
-    
-    # 1. 媒体基本信息
-    media_name = basic_info.get("name", "该媒体")
-    media_country = basic_info.get("country", "未知")
-    media_type = basic_info.get("media_type", "媒体")
-    ownership = basic_info.get("ownership", "未知")
-    political_stance = basic_info.get("political_stance", "未知")
-    language = basic_info.get("language", "中文")
-    
-    # 2. 台湾问题分析指标（核心数据）
-    total_questions = taiwan_analysis.get("total_questions", 0)
-    counter_ratio = taiwan_analysis.get("counter_ratio", 0) * 100  # 转换为百分比
-    aligned_ratio = taiwan_analysis.get("aligned_ratio", 0) * 100
-    neutral_ratio = taiwan_analysis.get("neutral_ratio", 0) * 100
-    stance_label = taiwan_analysis.get("stance_label", "未知")
-    avg_question_length = taiwan_analysis.get("avg_question_length", 100)
-    
-    # 语义强度分数
-    avg_aligned_score = taiwan_analysis.get("avg_aligned_score", 0.5)
-    avg_counter_score = taiwan_analysis.get("avg_counter_score", 0.5)
-    avg_neutral_score = taiwan_analysis.get("avg_neutral_score", 0.5)
-    
-    # 议题分布
-    issue_distribution = taiwan_analysis.get("issue_distribution", {})
-    taiwan_issue_ratio = taiwan_analysis.get("taiwan_issue_ratio", 0) * 100
-    issue_entropy = taiwan_analysis.get("issue_entropy", 0)
-    
-    # 3. 总体表现
-    media_total_questions = overall_performance.get("media_total_questions", 0)
-    media_taihai_questions = overall_performance.get("media_taihai_questions", 0)
-    taiwan_question_ratio = overall_performance.get("taiwan_question_ratio", 0) * 100
-    coverage_intensity = overall_performance.get("coverage_intensity", 0) * 100
-    topic_diversity = overall_performance.get("topic_diversity", 0)
-    
-    # 4. 生成参数
-    question_style = generation_params.get("question_style", "客观中立")
-    focus_priority = generation_params.get("focus_priority", {})
-    challenge_level = generation_params.get("challenge_level", 0) * 100
-    consistency_level = generation_params.get("consistency_level", 0) * 100
-    neutral_tendency = generation_params.get("neutral_tendency", 0) * 100
-    semantic_intensity = generation_params.get("semantic_intensity", 0.5)
-    topic_preferences = generation_params.get("topic_preferences", {})
-    
-    # 构建议题关注点描述
-    issue_focus_desc = build_issue_focus_description(issue_distribution, focus_priority)
-    
-    # 构建提问风格描述
-    style_desc = build_style_description(question_style, stance_label, challenge_level)
-    
-    # 根据指标计算推荐的temperature
-    recommended_temperature = calculate_recommended_temperature(
-        neutral_ratio, consistency_level, challenge_level
-    )
+    # 档案在加载时已解析为 MediaProfile 的直接使用，否则现场解析
+    p = attributes if isinstance(attributes, MediaProfile) else MediaProfile.from_dict(attributes)
     
     # 构建详细的提示词
     prompt = f"""# 新闻记者提问生成指令
 
 ## 一、媒体身份与背景
-你是**{media_name}**的记者，这是一家**{media_country}**的**{media_type}**（{ownership}）。
+你是**{p.name}**的记者，这是一家**{p.country}**的**{p.media_type}**（{p.ownership}）。
 
 ## 二、媒体特征分析（基于历史数据）
 
 ### 2.1 基本立场特征
-- **总体立场标签**: {stance_label}
-- **一致立场提问比例**: {aligned_ratio:.1f}%
-- **对立立场提问比例**: {counter_ratio:.1f}%
-- **中性立场提问比例**: {neutral_ratio:.1f}%
-- **政治立场**: {political_stance}
+- **总体立场标签**: {p.stance_label}
+- **一致立场提问比例**: {p.aligned_pct:.1f}%
+- **对立立场提问比例**: {p.counter_pct:.1f}%
+- **中性立场提问比例**: {p.neutral_pct:.1f}%
+- **政治立场**: {p.political_stance}
 
 ### 2.2 提问行为特征
-- **平均提问长度**: {avg_question_length:.0f}字符
-- **提问总量（涉台）**: {total_questions}个问题
-- **语义一致性强度**: {avg_aligned_score:.3f}
-- **语义对立强度**: {avg_counter_score:.3f}
-- **议题多样性指数**: {issue_entropy:.3f}
+- **平均提问长度**: {p.avg_question_length:.0f}字符
+- **提问总量（涉台）**: {p.total_questions}个问题
+- **语义一致性强度**: {p.avg_aligned_score:.3f}
+- **语义对立强度**: {p.avg_counter_score:.3f}
+- **议题多样性指数**: {p.issue_entropy:.3f}
 
 ### 2.3 议题关注偏好
-{taiwan_issue_ratio:.1f}%的问题聚焦台湾核心议题
-{issue_focus_desc}
+{p.taiwan_issue_pct:.1f}%的问题聚焦台湾核心议题
+{p.issue_focus_desc}
 
 ### 2.4 整体报道表现
-- **总提问量**: {media_total_questions}个问题
-- **涉台提问量**: {media_taihai_questions}个问题
-- **台海议题占比**: {taiwan_question_ratio:.2f}%
-- **报道强度**: {coverage_intensity:.2f}%
+- **总提问量**: {p.media_total_questions}个问题
+- **涉台提问量**: {p.media_taihai_questions}个问题
+- **台海议题占比**: {p.taiwan_question_pct:.2f}%
+- **报道强度**: {p.coverage_pct:.2f}%
 
 ## 三、当前任务情境
 **发布会议题**: {topic}
@@ -116,33 +62,33 @@ def get_media_prompt(topic: str, attributes: Dict[str, Any], context: str = "")
 ## 四、提问生成要求
 
 ### 4.1 立场与态度要求
-1. **立场体现**: 提问必须体现 **{stance_label}** 的立场特征
+1. **立场体现**: 提问必须体现 **{p.stance_label}** 的立场特征
    - 如为Aligned立场，应体现理解、支持或共识导向
    - 如为Counter立场，可体现质疑、挑战或对立视角
    - 如为Mixed立场，应保持平衡客观
 
 2. **态度强度**: 
-   - 一致性态度强度: {semantic_intensity:.3f}（{get_intensity_description(semantic_intensity)}）
-   - 挑战性程度: {challenge_level:.1f}%
-   - 中立倾向: {neutral_tendency:.1f}%
+   - 一致性态度强度: {p.semantic_intensity:.3f}（{p.intensity_desc}）
+   - 挑战性程度: {p.challenge_pct:.1f}%
+   - 中立倾向: {p.neutral_tendency_pct:.1f}%
 
 ### 4.2 内容与形式要求
-1. **提问风格**: {style_desc}
-2. **问题长度**: 控制在{avg_question_length*0.7:.0f}-{avg_question_length*1.3:.0f}字符之间
-3. **问题焦点**: 应优先关注{list(focus_priority.keys())[0] if focus_priority else "议题核心"}方面
-4. **语言要求**: 使用{language}提问
+1. **提问风格**: {p.style_desc}
+2. **问题长度**: 控制在{p.length_min:.0f}-{p.length_max:.0f}字符之间
+3. **问题焦点**: 应优先关注{p.primary_focus}方面
+4. **语言要求**: 使用{p.language}提问
 
 ### 4.3 议题相关要求
 1. **议题相关性**: 问题必须直接针对"{topic}"议题
-2. **专业性**: 体现{media_type}的专业性和深度
+2. **专业性**: 体现{p.media_type}的专业性和深度
 3. **新闻价值**: 问题要有新闻价值，能引发思考或讨论
 4. **具体性**: 避免泛泛而谈，要有具体指向
 
 ## 五、生成示例参考
-基于历史数据分析，{media_name}记者通常会：
-- 提出{avg_question_length:.0f}字符左右的问题
-- 采用{question_style}的提问方式
-- 关注{list(topic_preferences.keys())[0] if topic_preferences else "核心议题"}
+基于历史数据分析，{p.name}记者通常会：
+- 提出{p.avg_question_length:.0f}字符左右的问题
+- 采用{p.question_style}的提问方式
+- 关注{p.primary_topic}
 
 ## 六、最终输出
 请直接给出符合以上所有要求的提问内容，不要添加任何解释、前缀或后缀。
@@ -151,66 +97,38 @@ def get_media_prompt(topic: str, attributes: Dict[str, Any], context: str = "")
     return prompt.strip()
 
 
-def get_user_prompt(topic: str, attributes: Dict[str, Any], context: str = "") -> str:
+def get_user_prompt(topic: str, attributes: Union[Mapping[str, Any], "UserProfile"],
+                    context: str = "") -> str:
     """
     生成用户评论的提示词
     
     参数:
         topic: 议题
-        attributes: 用户属性
+        attributes: 用户属性（字典，或已解析的 UserProfile）
         context: 上下文信息
     
     返回:
         提示词字符串
     """
     
-    # 用户基本信息
-    nationality = attributes.get("nationality", "未知")
-    age = attributes.get("age", "未知")
-    education = attributes.get("education", "未知")
-    political_leaning = attributes.get("political_leaning", "中立")
-    attitude_to_china = attributes.get("attitude_to_china", "中立")
-    platform = attributes.get("platform", "社交媒体")
-    posting_style = attributes.get("posting_style", "一般评论")
-    
-    # 如果有数值型的对华态度，转换为描述
-    attitude_desc = attitude_to_china
-    if isinstance(attitude_to_china, (int, float)):
-        if attitude_to_china > 0.6:
-            attitude_desc = "非常友好/积极支持"
-        elif attitude_to_china > 0.3:
-            attitude_desc = "友好/支持"
-        elif attitude_to_china > -0.3:
-            attitude_desc = "中立/客观"
-        elif attitude_to_china > -0.6:
-            attitude_desc = "质疑/批评"
-        else:
-            attitude_desc = "强烈反对/批评"
-    
-    # 其他属性
-    interests = attributes.get("interests", [])
-    profession = attributes.get("profession", "未知")
-    influence_level = attributes.get("influence_followers", 0)
-    
-    # 根据平台确定表达特点
-    platform_style = get_platform_style(platform)
+    p = attributes if isinstance(attributes, UserProfile) else UserProfile.from_dict(attributes)
     
     # 构建提示词
     prompt = f"""# 社交媒体用户评论生成指令
 
 ## 一、用户身份信息
-你是一位**{nationality}**的社交媒体用户。
+你是一位**{p.nationality}**的社交媒体用户。
 
 ## 二、用户特征
-- **年龄**: {age}
-- **教育背景**: {education}
-- **职业**: {profession}
-- **政治倾向**: {political_leaning}
-- **对华态度**: {attitude_desc}
-- **活跃平台**: {platform}
-- **发帖风格**: {posting_style}
-{f"- **兴趣领域**: {', '.join(interests) if isinstance(interests, list) else interests}" if interests else ""}
-{f"- **影响力**: 约有{influence_level}名关注者" if influence_level else ""}
+- **年龄**: {p.age}
+- **教育背景**: {p.education}
+- **职业**: {p.profession}
+- **政治倾向**: {p.political_leaning}
+- **对华态度**: {p.attitude_desc}
+- **活跃平台**: {p.platform}
+- **发帖风格**: {p.posting_style}
+{p.interests_line}
+{p.influence_line}
 
 ## 三、当前情境
 **讨论议题**: {topic}
@@ -219,14 +137,14 @@ def get_user_prompt(topic: str, attributes: Dict[str, Any], context: str = "") -
 ## 四、评论生成要求
 
 ### 4.1 身份一致性要求
-1. **国籍体现**: 评论应体现{nationality}用户的视角和关切
-2. **政治倾向**: 符合{political_leaning}的政治立场
-3. **对华态度**: 体现{attitude_desc}的态度倾向
+1. **国籍体现**: 评论应体现{p.nationality}用户的视角和关切
+2. **政治倾向**: 符合{p.political_leaning}的政治立场
+3. **对华态度**: 体现{p.attitude_desc}的态度倾向
 
 ### 4.2 平台适应性要求
-1. **平台特点**: {platform_style}
-2. **表达风格**: {posting_style}
-3. **内容形式**: 适合在{platform}上传播
+1. **平台特点**: {p.platform_style}
+2. **表达风格**: {p.posting_style}
+3. **内容形式**: 适合在{p.platform}上传播
 
 ### 4.3 内容质量要求
 1. **相关性**: 直接针对"{topic}"议题
@@ -241,7 +159,7 @@ def get_user_prompt(topic: str, attributes: Dict[str, Any], context: str = "") -
 3. **可读性**: 易于理解，有传播力
 
 ## 五、生成示例
-典型的{platform}用户评论：
+典型的{p.platform}用户评论：
 - 观点明确，立场清晰
 - 语言符合平台特点
 - 有个人特色
@@ -295,6 +213,66 @@ def get_media_prompt_simple(topic: str, media_name: str, country: str = "中国"
     return prompt
 
 
+def get_spokesperson_prompt(topic: str, media_name: str, question: str) -> str:
+    """
+    发言人答问提示词（多轮发布会）
+    
+    参数:
+        topic: 议题
+        media_name: 提问记者所在媒体
+        question: 记者提问
+    
+    返回:
+        提示词字符串
+    """
+    
+    prompt = f"""你是中华人民共和国外交部发言人，正在主持关于"{topic}"的例行新闻发布会。
+
+{media_name}记者提问：
+{question}
+
+请作出回答：
+1. 立场清晰，符合中国政府的一贯立场和外交表述
+2. 回应问题中的关键事实与观点，不回避追问
+3. 与此前的回答保持一致，不重复已作出的完整表述
+4. 用中文回答，长度约100-200字
+
+请直接给出回答内容："""
+    
+    return prompt
+
+
+def get_transcript_summary_prompt(previous_summary: str, transcript: str, max_chars: int = 500) -> str:
+    """
+    发布会记录摘要提示词（多轮发布会中将较早的问答压缩为摘要）
+    
+    参数:
+        previous_summary: 已有摘要（可为空）
+        transcript: 需要并入摘要的问答记录
+        max_chars: 摘要最大长度
+    
+    返回:
+        提示词字符串
+    """
+    
+    prompt = f"""请将以下新闻发布会记录压缩为一段摘要，供后续提问的记者了解此前的问答。
+
+已有摘要：
+{previous_summary if previous_summary else "（无）"}
+
+新增问答记录：
+{transcript}
+
+要求：
+1. 合并已有摘要与新增记录，按议题归纳各媒体关注的问题及发言人的主要表态
+2. 保留媒体名称和关键立场，省略寒暄与重复表述
+3. 不超过{max_chars}字
+
+请直接给出摘要内容："""
+    
+    return prompt
+
+
 # ========== 辅助函数 ==========
 
 def build_issue_focus_description(issue_distribution: Dict[str, float], 
@@ -432,6 +410,186 @@ def get_platform_style(platform: str) -> str:
     return platform_styles.get(platform, "适应平台特点的表达方式")
 
 
+# ========== 类型化档案 ==========
+
+MEDIA_SECTIONS = ("basic_info", "taiwan_issue_analysis", "overall_performance", "generation_parameters")
+
+USER_FIELDS = ("nationality", "age", "education", "political_leaning", "attitude_to_china",
+               "platform", "posting_style", "interests", "profession", "influence_followers")
+
+
+def _section(attributes: Mapping[str, Any], key: str) -> Mapping[str, Any]:
+    """取出档案分区，缺失时为空，类型错误时报错"""
+    value = attributes.get(key, {})
+    if not isinstance(value, Mapping):
+        raise ValueError(f"档案字段 {key} 必须是对象")
+    return value
+
+
+def _number(section: Mapping[str, Any], key: str, default: float, label: str):
+    """取出数值字段（保留原始类型以保证展示格式不变），类型错误时报错"""
+    value = section.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"档案字段 {label}.{key} 必须是数值，实际为 {value!r}")
+    return value
+
+
+def describe_attitude(attitude_to_china: Any) -> Any:
+    """数值型对华态度转换为描述，非数值原样返回"""
+    if isinstance(attitude_to_china, (int, float)):
+        if attitude_to_china > 0.6:
+            return "非常友好/积极支持"
+        elif attitude_to_china > 0.3:
+            return "友好/支持"
+        elif attitude_to_china > -0.3:
+            return "中立/客观"
+        elif attitude_to_china > -0.6:
+            return "质疑/批评"
+        else:
+            return "强烈反对/批评"
+    return attitude_to_china
+
+
+class MediaProfile:
+    """媒体档案：加载时解析校验一次，并预先计算提示词所需的派生字段"""
+
+    __slots__ = (
+        "raw",
+        # 基本信息
+        "name", "country", "media_type", "ownership", "political_stance", "language",
+        # 台湾问题分析
+        "total_questions", "stance_label", "avg_question_length",
+        "counter_pct", "aligned_pct", "neutral_pct",
+        "avg_aligned_score", "avg_counter_score", "avg_neutral_score",
+        "issue_distribution", "taiwan_issue_pct", "issue_entropy",
+        # 总体表现
+        "media_total_questions", "media_taihai_questions",
+        "taiwan_question_pct", "coverage_pct", "topic_diversity",
+        # 生成参数
+        "question_style", "focus_priority", "challenge_pct", "consistency_pct",
+        "neutral_tendency_pct", "semantic_intensity", "topic_preferences",
+        # 派生字段
+        "issue_focus_desc", "style_desc", "intensity_desc", "recommended_temperature",
+        "length_min", "length_max", "primary_focus", "primary_topic",
+    )
+
+    @classmethod
+    def from_dict(cls, attributes: Mapping[str, Any]) -> "MediaProfile":
+        """从档案字典解析，字段类型不符时抛出 ValueError"""
+        self = cls.__new__(cls)
+        self.raw = attributes
+
+        basic_info = _section(attributes, "basic_info")
+        taiwan_analysis = _section(attributes, "taiwan_issue_analysis")
+        overall_performance = _section(attributes, "overall_performance")
+        generation_params = _section(attributes, "generation_parameters")
+
+        # 1. 媒体基本信息
+        self.name = basic_info.get("name", "该媒体")
+        self.country = basic_info.get("country", "未知")
+        self.media_type = basic_info.get("media_type", "媒体")
+        self.ownership = basic_info.get("ownership", "未知")
+        self.political_stance = basic_info.get("political_stance", "未知")
+        self.language = basic_info.get("language", "中文")
+
+        # 2. 台湾问题分析指标（比例预先转换为百分比）
+        t = "taiwan_issue_analysis"
+        self.total_questions = _number(taiwan_analysis, "total_questions", 0, t)
+        self.counter_pct = _number(taiwan_analysis, "counter_ratio", 0, t) * 100
+        self.aligned_pct = _number(taiwan_analysis, "aligned_ratio", 0, t) * 100
+        self.neutral_pct = _number(taiwan_analysis, "neutral_ratio", 0, t) * 100
+        self.stance_label = taiwan_analysis.get("stance_label", "未知")
+        self.avg_question_length = _number(taiwan_analysis, "avg_question_length", 100, t)
+        self.avg_aligned_score = _number(taiwan_analysis, "avg_aligned_score", 0.5, t)
+        self.avg_counter_score = _number(taiwan_analysis, "avg_counter_score", 0.5, t)
+        self.avg_neutral_score = _number(taiwan_analysis, "avg_neutral_score", 0.5, t)
+        self.issue_distribution = dict(_section(taiwan_analysis, "issue_distribution"))
+        for issue_key in self.issue_distribution:
+            _number(self.issue_distribution, issue_key, 0, f"{t}.issue_distribution")
+        self.taiwan_issue_pct = _number(taiwan_analysis, "taiwan_issue_ratio", 0, t) * 100
+        self.issue_entropy = _number(taiwan_analysis, "issue_entropy", 0, t)
+
+        # 3. 总体表现
+        o = "overall_performance"
+        self.media_total_questions = _number(overall_performance, "media_total_questions", 0, o)
+        self.media_taihai_questions = _number(overall_performance, "media_taihai_questions", 0, o)
+        self.taiwan_question_pct = _number(overall_performance, "taiwan_question_ratio", 0, o) * 100
+        self.coverage_pct = _number(overall_performance, "coverage_intensity", 0, o) * 100
+        self.topic_diversity = _number(overall_performance, "topic_diversity", 0, o)
+
+        # 4. 生成参数
+        g = "generation_parameters"
+        self.question_style = generation_params.get("question_style", "客观中立")
+        self.focus_priority = dict(_section(generation_params, "focus_priority"))
+        self.challenge_pct = _number(generation_params, "challenge_level", 0, g) * 100
+        self.consistency_pct = _number(generation_params, "consistency_level", 0, g) * 100
+        self.neutral_tendency_pct = _number(generation_params, "neutral_tendency", 0, g) * 100
+        self.semantic_intensity = _number(generation_params, "semantic_intensity", 0.5, g)
+        self.topic_preferences = dict(_section(generation_params, "topic_preferences"))
+
+        # 派生字段：与议题无关的描述只计算一次
+        self.issue_focus_desc = build_issue_focus_description(self.issue_distribution, self.focus_priority)
+        self.style_desc = build_style_description(self.question_style, self.stance_label, self.challenge_pct)
+        self.intensity_desc = get_intensity_description(self.semantic_intensity)
+        self.recommended_temperature = calculate_recommended_temperature(
+            self.neutral_pct, self.consistency_pct, self.challenge_pct
+        )
+        self.length_min = self.avg_question_length * 0.7
+        self.length_max = self.avg_question_length * 1.3
+        self.primary_focus = next(iter(self.focus_priority), "议题核心")
+        self.primary_topic = next(iter(self.topic_preferences), "核心议题")
+        return self
+
+    def with_overrides(self, overrides: Optional[Mapping[str, Any]]) -> "MediaProfile":
+        """叠加请求级属性覆盖（浅层覆盖档案分区）；未涉及档案分区时直接复用自身"""
+        if not overrides or not any(key in overrides for key in MEDIA_SECTIONS):
+            return self
+        return MediaProfile.from_dict(ChainMap(overrides, self.raw))
+
+
+class UserProfile:
+    """用户档案：加载时解析一次，并预先计算提示词所需的派生字段"""
+
+    __slots__ = USER_FIELDS + ("raw", "attitude_desc", "platform_style", "interests_line", "influence_line")
+
+    @classmethod
+    def from_dict(cls, attributes: Mapping[str, Any]) -> "UserProfile":
+        """从档案字典解析"""
+        self = cls.__new__(cls)
+        self.raw = attributes
+
+        # 用户基本信息
+        self.nationality = attributes.get("nationality", "未知")
+        self.age = attributes.get("age", "未知")
+        self.education = attributes.get("education", "未知")
+        self.political_leaning = attributes.get("political_leaning", "中立")
+        self.attitude_to_china = attributes.get("attitude_to_china", "中立")
+        self.platform = attributes.get("platform", "社交媒体")
+        self.posting_style = attributes.get("posting_style", "一般评论")
+
+        # 其他属性
+        self.interests = attributes.get("interests", [])
+        self.profession = attributes.get("profession", "未知")
+        self.influence_followers = attributes.get("influence_followers", 0)
+
+        # 派生字段
+        self.attitude_desc = describe_attitude(self.attitude_to_china)
+        self.platform_style = get_platform_style(self.platform)
+        interests = self.interests
+        self.interests_line = (
+            f"- **兴趣领域**: {', '.join(interests) if isinstance(interests, list) else interests}"
+            if interests else ""
+        )
+        self.influence_line = f"- **影响力**: 约有{self.influence_followers}名关注者" if self.influence_followers else ""
+        return self
+
+    def with_overrides(self, overrides: Optional[Mapping[str, Any]]) -> "UserProfile":
+        """叠加请求级属性覆盖；未涉及用户字段时直接复用自身"""
+        if not overrides or not any(key in overrides for key in USER_FIELDS):
+            return self
+        return UserProfile.from_dict(ChainMap(overrides, self.raw))
+
+
 # ========== 测试函数 ==========
 
 def test_media_prompt_generation():
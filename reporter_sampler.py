@@ -0,0 +1,137 @@
+"""
+发布会记者抽样
+按历史提问活跃度加权抽取参会媒体，使用预计算的别名表（Alias Method）实现O(1)单次抽样
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# 权重方案：基于 overall_performance 中的历史活跃度指标
+WEIGHT_SCHEMES = ("taihai", "total", "ratio", "blend")
+
+
+def activity_weights(media_total_questions: np.ndarray, media_taihai_questions: np.ndarray,
+                     taiwan_question_ratio: np.ndarray, scheme: str = "blend") -> np.ndarray:
+    """
+    根据历史活跃度计算抽样权重
+
+    参数:
+        scheme: taihai=涉台提问数, total=总提问数, ratio=台海议题占比,
+                blend=涉台提问数与总提问数按占比调和（默认）
+    """
+    total = np.nan_to_num(media_total_questions, nan=0.0)
+    taihai = np.nan_to_num(media_taihai_questions, nan=0.0)
+    ratio = np.nan_to_num(taiwan_question_ratio, nan=0.0)
+
+    if scheme == "taihai":
+        weights = taihai
+    elif scheme == "total":
+        weights = total
+    elif scheme == "ratio":
+        weights = ratio
+    elif scheme == "blend":
+        # 涉台提问多的媒体优先，同时保留总体活跃但涉台较少媒体的出场机会
+        weights = taihai + ratio * np.sqrt(total)
+    else:
+        raise ValueError(f"未知的权重方案: '{scheme}'，可选: {', '.join(WEIGHT_SCHEMES)}")
+
+    return np.clip(weights, 0.0, None)
+
+
+class AliasSampler:
+    """Vose别名表抽样器：O(n)构建，每次抽样O(1)"""
+
+    def __init__(self, ids: Sequence[str], weights: np.ndarray):
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(ids) != weights.size:
+            raise ValueError("ids 与 weights 长度不一致")
+        self.ids = np.array(list(ids), dtype=object)
+        self.size = weights.size
+
+        self.prob = np.ones(self.size, dtype=np.float64)
+        self.alias = np.arange(self.size, dtype=np.int64)
+        if self.size == 0:
+            return
+
+        total = weights.sum()
+        if total <= 0:
+            # 无有效权重时退化为均匀抽样
+            weights = np.ones(self.size, dtype=np.float64)
+            total = float(self.size)
+
+        scaled = weights * (self.size / total)
+
+        small = [i for i in range(self.size) if scaled[i] < 1.0]
+        large = [i for i in range(self.size) if scaled[i] >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        # 剩余项概率为1（数值误差导致的残留）
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def draw_indices(self, count: int, rng: np.random.Generator) -> np.ndarray:
+        """有放回地抽取 count 个下标（向量化，每个O(1)）"""
+        columns = rng.integers(0, self.size, size=count)
+        accept = rng.random(count) < self.prob[columns]
+        return np.where(accept, columns, self.alias[columns])
+
+    def sample(self, k: int, seed: Optional[int] = None,
+               rng: Optional[np.random.Generator] = None) -> List[str]:
+        """无放回地抽取 k 个媒体ID（按权重，重复抽中时重抽）"""
+        rng = rng if rng is not None else np.random.default_rng(seed)
+        k = min(k, self.size)
+        chosen: List[int] = []
+        seen = set()
+        # 每轮批量抽取，直到凑够k个不同媒体；权重高度集中时回退为按剩余权重抽样
+        for _ in range(32):
+            for index in self.draw_indices(max(2 * (k - len(chosen)), 8), rng).tolist():
+                if index not in seen:
+                    seen.add(index)
+                    chosen.append(index)
+                    if len(chosen) == k:
+                        return self.ids[chosen].tolist()
+        remaining = np.array([i for i in range(self.size) if i not in seen], dtype=np.int64)
+        if remaining.size:
+            remaining_probs = self._probabilities()[remaining]
+            if remaining_probs.sum() <= 0:
+                remaining_probs = np.ones(remaining.size)
+            extra = rng.choice(remaining, size=min(k - len(chosen), remaining.size), replace=False,
+                               p=remaining_probs / remaining_probs.sum())
+            chosen.extend(extra.tolist())
+        return self.ids[chosen].tolist()
+
+    def sample_batch(self, conferences: int, k: int, seed: Optional[int] = None) -> List[List[str]]:
+        """为多场发布会批量抽样，同一种子结果可复现"""
+        rng = np.random.default_rng(seed)
+        return [self.sample(k, rng=rng) for _ in range(conferences)]
+
+    def _probabilities(self) -> np.ndarray:
+        """由别名表还原各项的抽样概率"""
+        probs = self.prob.copy()
+        np.add.at(probs, self.alias, 1.0 - self.prob)
+        return probs / self.size
+
+
+def build_sampler(table, scheme: str = "blend", media_ids: Optional[Sequence[str]] = None) -> AliasSampler:
+    """基于媒体列式表构建抽样器，可限定在部分媒体中抽样"""
+    positions = np.arange(table.size)
+    if media_ids is not None:
+        lookup: Dict[str, int] = {media_id: i for i, media_id in enumerate(table.ids)}
+        positions = np.array([lookup[m] for m in media_ids if m in lookup], dtype=np.int64)
+
+    weights = activity_weights(
+        table.numeric["media_total_questions"][positions],
+        table.numeric["media_taihai_questions"][positions],
+        table.numeric["taiwan_question_ratio"][positions],
+        scheme
+    )
+    return AliasSampler([table.ids[i] for i in positions], weights)
@@ -0,0 +1,203 @@
+"""
+响应工具
+快速JSON序列化（优先使用orjson）、基于ETag的预序列化响应、边读边写的流式响应，
+以及批量接口的内容协商（JSON/MessagePack 与 zstd/gzip 压缩）
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from fastapi.responses import Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，缺失时退回标准库
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖，缺失时不提供 MessagePack 编码
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，缺失时只提供 gzip 压缩
+    zstandard = None
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPE = "application/msgpack"
+MSGPACK_ALIASES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+VARY_HEADERS = {"Vary": "Accept, Accept-Encoding"}
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """序列化为UTF-8编码的紧凑JSON字节（中文不转义）"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads_bytes(data: bytes) -> Any:
+    """解析UTF-8编码的JSON字节"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def make_etag(body: bytes) -> str:
+    """根据内容计算强ETag，内容不变则ETag不变（与档案版本号无关）"""
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def serialize_with_etag(obj: Any) -> Tuple[bytes, str]:
+    """预序列化对象，返回(字节, ETag)"""
+    body = dumps_bytes(obj)
+    return body, make_etag(body)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断 If-None-Match 请求头是否命中（支持多值、弱校验和 *）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def cached_json_response(body: bytes, etag: str, if_none_match: Optional[str] = None,
+                         headers: Optional[Dict[str, str]] = None) -> Response:
+    """返回预序列化的JSON响应；客户端缓存仍有效时返回304"""
+    response_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if headers:
+        response_headers.update(headers)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=response_headers)
+    return Response(content=body, media_type="application/json", headers=response_headers)
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """边读取请求体边推送的流式响应
+
+    StreamingResponse 推送期间会另起任务读取 receive 以监听断开，会与端点读取请求体争抢消息；
+    这里只负责推送，请求体与断开均由端点自行读取处理
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def parse_quality(header: Optional[str]) -> Dict[str, float]:
+    """解析 Accept / Accept-Encoding 请求头为 {取值: q}"""
+    values = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        values[name] = max(q, values.get(name, 0.0))
+    return values
+
+
+class ResponseEncoder:
+    """按请求头选择响应编码：Accept 含 MessagePack（且 q 不低于 JSON）时使用 MessagePack，
+    Accept-Encoding 中 q 最高的 zstd/gzip 用于压缩（q 相同时优先 zstd），小于 min_bytes 的响应不压缩
+
+    预序列化的 JSON 负载（带 ETag）按 (ETag, 编码, 压缩) 缓存各版本，各版本的 ETag 带后缀以互相区分
+    """
+
+    def __init__(self, enabled: bool = True, min_bytes: int = 1024, gzip_level: int = 5, zstd_level: int = 3,
+                 max_variants: int = 128):
+        self.enabled = enabled
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+        self.max_variants = max_variants
+        self.encodings = (["zstd"] if zstandard is not None else []) + ["gzip"]
+        self._variants: "OrderedDict[Tuple[str, str, Optional[str]], Tuple[bytes, str, Dict[str, str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._zstd = threading.local()
+
+    def negotiate(self, headers: Mapping[str, str]) -> Tuple[str, Optional[str]]:
+        """返回(媒体类型, 压缩方式或 None)"""
+        media_type = JSON_TYPE
+        accept = parse_quality(headers.get("accept"))
+        if msgpack is not None and accept:
+            msgpack_q = max(accept.get(alias, 0.0) for alias in MSGPACK_ALIASES)
+            json_q = accept.get(JSON_TYPE, accept.get("application/*", accept.get("*/*", 0.0)))
+            if msgpack_q > 0 and msgpack_q >= json_q:
+                media_type = MSGPACK_TYPE
+
+        encoding = None
+        if self.enabled:
+            accepted = parse_quality(headers.get("accept-encoding"))
+            best = 0.0
+            for name in self.encodings:
+                q = accepted.get(name, accepted.get("*", 0.0))
+                if q > best:
+                    encoding, best = name, q
+        return media_type, encoding
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "zstd":
+            # ZstdCompressor 不是线程安全的，每个线程各用一个
+            compressor = getattr(self._zstd, "compressor", None)
+            if compressor is None:
+                compressor = self._zstd.compressor = zstandard.ZstdCompressor(level=self.zstd_level)
+            return compressor.compress(body)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def encode(self, obj: Any, media_type: str = JSON_TYPE, encoding: Optional[str] = None,
+               json_body: Optional[bytes] = None) -> Tuple[bytes, Dict[str, str]]:
+        """序列化并按需压缩，返回(响应体, 响应头)；json_body 为已序列化的 JSON（obj 可为 None）"""
+        if media_type == MSGPACK_TYPE:
+            body = msgpack.packb(loads_bytes(json_body) if obj is None else obj, use_bin_type=True)
+        else:
+            body = json_body if json_body is not None else dumps_bytes(obj)
+        headers = {"Content-Type": media_type, **VARY_HEADERS}
+        if encoding is not None and len(body) >= self.min_bytes:
+            body = self.compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+        return body, headers
+
+    def variant(self, json_body: bytes, etag: str, media_type: str,
+                encoding: Optional[str]) -> Tuple[bytes, str, Dict[str, str]]:
+        """预序列化负载的编码版本，返回(响应体, ETag, 响应头)"""
+        key = (etag, media_type, encoding)
+        with self._lock:
+            cached = self._variants.get(key)
+            if cached is not None:
+                self._variants.move_to_end(key)
+                return cached
+        body, headers = self.encode(None, media_type, encoding, json_body=json_body)
+        suffix = "+".join(part for part in ("msgpack" if media_type == MSGPACK_TYPE else "",
+                                            headers.get("Content-Encoding", "")) if part)
+        variant_etag = f'{etag[:-1]}-{suffix}"' if suffix else etag
+        with self._lock:
+            self._variants[key] = (body, variant_etag, headers)
+            while len(self._variants) > self.max_variants:
+                self._variants.popitem(last=False)
+        return body, variant_etag, headers
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "min_bytes": self.min_bytes, "encodings": self.encodings,
+                "msgpack": msgpack is not None, "cached_variants": len(self._variants)}
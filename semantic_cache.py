@@ -0,0 +1,223 @@
+"""
+语义缓存
+议题仅有措辞差异（如"朝韩关系紧张"与"朝韩局势紧张"）或背景信息相差一两句的生成请求复用已有结果，
+避免每次都完整调用模型
+
+- 文本向量：字符 1~3 元组哈希到固定维度后归一化（纯CPU、无需模型文件）；议题与背景信息分别编码后按权重拼接，
+  两个向量的余弦相似度 = 议题权重 × 议题相似度 + (1 − 议题权重) × 背景相似度
+- 议题守卫：字符元组无法区分"措辞不同"与"对象/倾向不同"（朝韩关系紧张 与 中美关系紧张、朝韩关系缓和 的相似度
+  反而高于 朝韩局势紧张），因此议题先去掉"关系""局势"等泛化措辞再编码，且命中还要求去除后的议题相似度
+  不低于 topic_threshold（默认 0.95，实际上要求关键词一致），阈值只用于容忍背景信息的差异
+- 近邻索引：按智能体（及生成参数）分区，每个分区用随机超平面 LSH 分桶，只对同桶候选计算精确余弦相似度
+- 淘汰：超过有效期的条目在查询时丢弃，总条目数超出上限时淘汰最久未命中的条目（LRU）
+
+所有操作在事件循环线程内同步执行，无需加锁
+"""
+
+import itertools
+import logging
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZES = (1, 2, 3)
+
+# 议题中不改变所指对象与倾向的泛化措辞（按长度从长到短去除）
+GENERIC_TERMS = ("最新进展", "关系", "局势", "形势", "态势", "情势", "状况", "情况", "问题", "事件", "议题", "话题",
+                 "最新", "进展", "动态", "方面")
+PUNCTUATION = set("，。、；：？！“”‘’（）《》【】,.;:?!\"'()[]<>-—…·")
+
+# 校准用例：(议题, 背景信息, 是否应命中)，与 CALIBRATION_BASE 比较
+CALIBRATION_BASE = ("朝韩关系紧张", "朝鲜发射卫星")
+CALIBRATION_CASES = (
+    ("朝韩局势紧张", "朝鲜发射卫星", True),
+    ("朝韩关系紧张", "朝鲜发射卫星。", True),
+    ("中美关系紧张", "朝鲜发射卫星", False),
+    ("中日关系紧张", "朝鲜发射卫星", False),
+    ("朝韩关系缓和", "朝鲜发射卫星", False),
+)
+
+
+def hashed_ngrams(text: str, dim: int) -> np.ndarray:
+    """字符 n 元组哈希计数向量（L2 归一化；空文本返回零向量）"""
+    vector = np.zeros(dim, dtype=np.float32)
+    text = "".join(text.split())
+    for n in NGRAM_SIZES:
+        for i in range(len(text) - n + 1):
+            vector[zlib.crc32(text[i:i + n].encode("utf-8")) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def topic_terms(topic: str) -> str:
+    """去掉空白、标点与泛化措辞后的议题关键词（全部去掉时保留原文）"""
+    text = "".join(ch for ch in "".join(topic.split()) if ch not in PUNCTUATION)
+    stripped = text
+    for term in sorted(GENERIC_TERMS, key=len, reverse=True):
+        stripped = stripped.replace(term, "")
+    return stripped or text
+
+
+class TextEmbedder:
+    """议题与背景信息的联合向量"""
+
+    def __init__(self, dim: int = 1024, topic_weight: float = 0.7):
+        self.dim = dim
+        self.topic_scale = np.float32(topic_weight ** 0.5)
+        self.context_scale = np.float32((1.0 - topic_weight) ** 0.5)
+
+    def embed(self, topic: str, context: str) -> Tuple[np.ndarray, np.ndarray]:
+        """返回(联合向量, 议题关键词向量)"""
+        topic_vec = hashed_ngrams(topic_terms(topic), self.dim)
+        context_vec = hashed_ngrams(context, self.dim)
+        # 背景信息为空时使用独立的一维，两个空背景视为相同
+        empty = np.float32(0.0 if context_vec.any() else 1.0)
+        vector = np.concatenate([topic_vec * self.topic_scale,
+                                 context_vec * self.context_scale,
+                                 [empty * self.context_scale]])
+        return vector, topic_vec
+
+
+class _Entry:
+    __slots__ = ("partition", "vector", "topic_vector", "value", "expires_at", "buckets", "label")
+
+    def __init__(self, partition, vector, topic_vector, value, expires_at, buckets, label):
+        self.partition = partition
+        self.vector = vector
+        self.topic_vector = topic_vector
+        self.value = value
+        self.expires_at = expires_at
+        self.buckets = buckets
+        self.label = label
+
+
+class SemanticCache:
+    """按智能体分区的近似近邻缓存"""
+
+    def __init__(self, threshold: float = 0.9, max_entries: int = 10000, ttl: float = 3600,
+                 dim: int = 1024, topic_weight: float = 0.7, tables: int = 8, bits: int = 8, seed: int = 0,
+                 topic_threshold: float = 0.95):
+        self.threshold = threshold
+        self.topic_threshold = topic_threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.tables = tables
+        self.bits = bits
+        self.embedder = TextEmbedder(dim, topic_weight)
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((tables * bits, 2 * dim + 1)).astype(np.float32)
+        self._powers = (1 << np.arange(bits)).astype(np.int64)
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._index: Dict[Hashable, Dict[Tuple[int, int], set]] = {}
+        self._ids = itertools.count()
+        self.hits = 0
+        self.misses = 0
+
+    def _signatures(self, vector: np.ndarray) -> Tuple[Tuple[int, int], ...]:
+        bits = (self._planes @ vector > 0).reshape(self.tables, self.bits)
+        return tuple(enumerate((bits @ self._powers).tolist()))
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        index = self._index.get(entry.partition)
+        if index is None:
+            return
+        for bucket in entry.buckets:
+            members = index.get(bucket)
+            if members is not None:
+                members.discard(entry_id)
+                if not members:
+                    del index[bucket]
+        if not index:
+            del self._index[entry.partition]
+
+    def lookup(self, partition: Hashable, topic: str, context: str) -> Optional[Tuple[Any, float, str]]:
+        """查找相似度不低于阈值的最近条目，返回(缓存值, 相似度, 原议题)"""
+        index = self._index.get(partition)
+        if index is None:
+            self.misses += 1
+            return None
+        vector, topic_vector = self.embedder.embed(topic, context)
+        candidates = set()
+        for bucket in self._signatures(vector):
+            candidates.update(index.get(bucket, ()))
+
+        now = time.time()
+        best_id, best_similarity = None, -1.0
+        for entry_id in list(candidates):
+            entry = self._entries[entry_id]
+            if entry.expires_at and entry.expires_at <= now:
+                self._remove(entry_id)
+                continue
+            if float(entry.topic_vector @ topic_vector) < self.topic_threshold:
+                continue
+            similarity = float(entry.vector @ vector)
+            if similarity > best_similarity:
+                best_id, best_similarity = entry_id, similarity
+
+        if best_id is None or best_similarity < self.threshold:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(best_id)
+        entry = self._entries[best_id]
+        return entry.value, best_similarity, entry.label
+
+    def insert(self, partition: Hashable, topic: str, context: str, value: Any):
+        """写入条目，超出容量时淘汰最久未命中的条目"""
+        vector, topic_vector = self.embedder.embed(topic, context)
+        buckets = self._signatures(vector)
+        entry_id = next(self._ids)
+        expires_at = time.time() + self.ttl if self.ttl > 0 else 0.0
+        self._entries[entry_id] = _Entry(partition, vector, topic_vector, value, expires_at, buckets, topic)
+        index = self._index.setdefault(partition, {})
+        for bucket in buckets:
+            index.setdefault(bucket, set()).add(entry_id)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        self._entries.clear()
+        self._index.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold": self.threshold,
+            "topic_threshold": self.topic_threshold,
+            "entries": len(self._entries),
+            "partitions": len(self._index),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+def calibrate(threshold: float = 0.9, topic_threshold: float = 0.95) -> bool:
+    """用 CALIBRATION_CASES 检查阈值：措辞不同应命中，对象或倾向不同不应命中"""
+    cache = SemanticCache(threshold=threshold, topic_threshold=topic_threshold, ttl=0)
+    cache.insert("calibration", *CALIBRATION_BASE, value=CALIBRATION_BASE[0])
+    ok = True
+    for topic, context, expected in CALIBRATION_CASES:
+        vector, topic_vector = cache.embedder.embed(topic, context)
+        base_vector, base_topic_vector = cache.embedder.embed(*CALIBRATION_BASE)
+        hit = cache.lookup("calibration", topic, context) is not None
+        ok = ok and hit == expected
+        print(f"{'✓' if hit == expected else '✗'} {topic} / {context}: 相似度 {float(vector @ base_vector):.3f}，"
+              f"议题相似度 {float(topic_vector @ base_topic_vector):.3f}，{'命中' if hit else '未命中'}"
+              f"（应{'命中' if expected else '未命中'}）")
+    return ok
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="语义缓存阈值校准")
+    parser.add_argument("--threshold", type=float, default=0.9)
+    parser.add_argument("--topic-threshold", type=float, default=0.95)
+    args = parser.parse_args()
+    sys.exit(0 if calibrate(args.threshold, args.topic_threshold) else 1)
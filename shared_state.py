@@ -0,0 +1,124 @@
+"""
+跨进程共享状态
+多个工作进程通过本地SQLite（WAL模式）共享生成缓存与计数器
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache(expires_at);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def cache_key(*parts: Any) -> str:
+    """由请求参数计算缓存键"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class SharedState:
+    """共享缓存与计数器；每个进程各自持有连接，计数增量在本地累积后批量写入"""
+
+    def __init__(self, db_path: str = "shared_state.db", max_cache_entries: int = 100000):
+        self.db_path = db_path
+        self.max_cache_entries = max_cache_entries
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._pending: Counter = Counter()
+
+    def _connection(self) -> sqlite3.Connection:
+        # fork出的子进程不能复用父进程的连接
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+            self._pid = os.getpid()
+            self._pending = Counter()
+        return self._conn
+
+    # ---------- 缓存 ----------
+
+    def cache_get(self, key: str) -> Optional[Any]:
+        """读取未过期的缓存值"""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def cache_set(self, key: str, value: Any, ttl: float):
+        """写入缓存值（ttl 秒后过期）"""
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time() + ttl)
+            )
+
+    def evict_expired(self) -> int:
+        """清理过期缓存，并在超出容量时删除最早过期的条目"""
+        with self._lock:
+            conn = self._connection()
+            removed = conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),)).rowcount
+            overflow = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_cache_entries
+            if overflow > 0:
+                removed += conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires_at LIMIT ?)",
+                    (overflow,)
+                ).rowcount
+        return removed
+
+    # ---------- 计数器 ----------
+
+    def incr(self, name: str, amount: int = 1):
+        """计数累加（仅写入本地缓冲，由 flush 批量落库）"""
+        self._pending[name] += amount
+
+    def flush(self):
+        """将本地计数增量写入共享存储"""
+        if not self._pending:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO counters (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    list(pending.items())
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                self._pending.update(pending)
+                raise
+
+    def counters(self) -> Dict[str, int]:
+        """所有进程的计数汇总（含本进程尚未落库的增量）"""
+        with self._lock:
+            rows = self._connection().execute("SELECT name, value FROM counters").fetchall()
+            result = Counter(dict(rows))
+            result.update(self._pending)
+        return dict(result)
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+无界面仿真运行器
+在Python中复现 news_simulation.nlogo 的仿真循环（每个仿真步：选出媒体提问 → 用户对提问发表评论 → 进入下一步），
+按 BehaviorSpace 方式对参数组合做扫描实验，各组合（含重复）分配到进程池并行运行，每次运行写出一张结果表
+
+- 生成流程与API服务器相同（进程内调用 generate_content），不经过HTTP与文件桥接
+- 各工作进程共用 api_server 的共享生成缓存（SHARED_STATE_PATH，SQLite），参数组合之间相同的生成请求只调用一次模型；
+  重复实验以 variant（重复序号）区分，同一序号的相同请求才复用
+- 每次运行的结果写入 <输出目录>/run_<编号>.csv（先写临时文件再替换），已存在的运行在重新执行时跳过；
+  runs.csv 汇总各运行的参数与统计。目录中已有结果且 experiment.json 展开的运行与本次不同时拒绝运行，
+  避免旧结果挂在含义已改变的运行编号下
+
+实验配置（JSON）:
+    {
+      "name": "taiwan-sweep",
+      "repetitions": 2,
+      "seed": 1,
+      "constants": {"ticks": 5, "context": "...", "users_per_question": 2},
+      "variables": {
+        "topic": ["美国对台军售", "外国军舰穿越台湾海峡"],
+        "temperature": {"first": 0.3, "step": 0.2, "last": 0.9},
+        "media_ids": [["人民日报", "中国日报"], 3]
+      }
+    }
+
+运行参数: topic, context, ticks, temperature, media_ids（名称/ID列表，或整数表示随机抽取的媒体数，缺省为发布会默认媒体）,
+questions_per_tick（每步提问的媒体数，默认1）, user_ids（列表或整数，缺省为全部用户）, users_per_question（默认2）,
+score_stance
+
+用法:
+    python simulation_runner.py experiment.json --output runs/ --processes 8
+    python simulation_runner.py --topic 美国对台军售 --temperature 0.5 --temperature 0.9 --ticks 3 --output runs/
+    python simulation_runner.py experiment.json --dry-run
+"""
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+DEFAULT_PARAMS = {
+    "topic": None,
+    "context": "",
+    "ticks": 3,
+    "temperature": 0.7,
+    "media_ids": None,
+    "questions_per_tick": 1,
+    "user_ids": None,
+    "users_per_question": 2,
+    "score_stance": False
+}
+
+RESULT_COLUMNS = ["run", "repetition", "tick", "agent_type", "agent_id", "in_reply_to", "content",
+                  "stance_label", "cache", "latency_ms", "completion_tokens", "error"]
+INDEX_COLUMNS = ["run", "repetition", "rows", "errors", "cache_hits", "duration_s", "file"]
+
+
+def expand_values(spec):
+    """变量取值：列表原样使用；{"first", "step", "last"} 按步长展开（同 BehaviorSpace 的 steppedValueSet）"""
+    if isinstance(spec, dict) and {"first", "step", "last"} <= set(spec):
+        if not spec["step"] > 0:
+            raise ValueError(f"步长必须大于0: {spec}")
+        values, value, i = [], spec["first"], 0
+        while value <= spec["last"] + 1e-9:
+            values.append(round(value, 10))
+            i += 1
+            value = spec["first"] + i * spec["step"]
+        return values
+    return spec if isinstance(spec, list) else [spec]
+
+
+def expand_experiment(experiment):
+    """展开为运行列表：变量的笛卡尔积 × 重复次数，运行编号从1开始"""
+    constants = experiment.get("constants", {})
+    variables = {name: expand_values(spec) for name, spec in experiment.get("variables", {}).items()}
+    unknown = (set(constants) | set(variables)) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"未知的运行参数: {', '.join(sorted(unknown))}")
+
+    runs = []
+    names = list(variables)
+    seed = experiment.get("seed", 0)
+    for combination in itertools.product(*(variables[name] for name in names)):
+        for repetition in range(max(1, experiment.get("repetitions", 1))):
+            params = {**DEFAULT_PARAMS, **constants, **dict(zip(names, combination))}
+            if not params["topic"]:
+                raise ValueError("topic 必须在 constants 或 variables 中给出")
+            number = len(runs) + 1
+            runs.append({"run": number, "repetition": repetition, "seed": seed * 1000003 + number,
+                         "variables": dict(zip(names, combination)), "params": params})
+    return runs
+
+
+def result_path(output_dir, run):
+    return os.path.join(output_dir, f"run_{run['run']:04d}.csv")
+
+
+def index_path(output_dir):
+    return os.path.join(output_dir, "runs.csv")
+
+
+def table_values(variables):
+    """结果表中的变量取值（列表写为JSON）"""
+    return {name: json.dumps(value, ensure_ascii=False) if isinstance(value, list) else value
+            for name, value in variables.items()}
+
+
+def load_index(output_dir):
+    """读取已有汇总表中各运行的统计（用于续跑时保留已完成运行的统计）"""
+    path = index_path(output_dir)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return {int(row["run"]): {column: row[column] for column in INDEX_COLUMNS[2:]}
+                for row in csv.DictReader(f) if row.get("rows")}
+
+
+def init_worker(env):
+    """工作进程初始化：先设置环境变量再导入 api_server（档案与共享缓存在每个进程中加载一次）"""
+    os.environ.update(env)
+    import api_server  # noqa: F401
+
+
+def resolve_agents(snapshot, requested, pool, rng, kind):
+    """列表按名称/ID解析；整数表示从 pool 中随机抽取的个数；None 表示全部"""
+    if requested is None:
+        return list(pool)
+    if isinstance(requested, int):
+        return rng.sample(list(pool), min(requested, len(pool)))
+    resolved = []
+    for agent in requested:
+        agent_id = snapshot.resolve_media_id(agent) if kind == "media" else (agent if agent in pool else None)
+        if agent_id is None:
+            raise ValueError(f"{'媒体' if kind == 'media' else '用户'} '{agent}' 不存在")
+        resolved.append(agent_id)
+    return resolved
+
+
+async def simulate(run, concurrency):
+    """运行一次仿真，返回结果行"""
+    import api_server
+    from api_server import AgentRequest, generate_content
+    from conference_transcript import truncate
+
+    params = run["params"]
+    rng = random.Random(run["seed"])
+    snapshot = api_server.profile_store.snapshot
+    if params["media_ids"] is None:
+        medias = api_server.default_conference_media_ids()
+    else:
+        medias = resolve_agents(snapshot, params["media_ids"], list(snapshot.media), rng, "media")
+    users = resolve_agents(snapshot, params["user_ids"], list(snapshot.users), rng, "user")
+    if not medias:
+        raise ValueError("没有可用的媒体")
+
+    session_id = f"sim-{run['run']:04d}"
+    semaphore = asyncio.Semaphore(concurrency)
+    rows = []
+
+    async def generate(tick, agent_type, agent_id, context, in_reply_to=None):
+        request = AgentRequest(agent_type=agent_type, agent_id=agent_id, topic=params["topic"], context=context,
+                               temperature=params["temperature"], stream=False, session_id=session_id, tick=tick,
+                               score_stance=bool(params["score_stance"]), variant=run["repetition"])
+        row = {"run": run["run"], "repetition": run["repetition"], "tick": tick, "agent_type": agent_type,
+               "agent_id": agent_id, "in_reply_to": in_reply_to}
+        async with semaphore:
+            # 计时从取得并发名额开始，不含排队时间
+            started = time.perf_counter()
+            try:
+                result = await generate_content(request)
+                metadata = result["metadata"]
+                row.update(content=result["content"], stance_label=(result.get("stance") or {}).get("stance_label"),
+                           cache=metadata.get("cache"),
+                           completion_tokens=(metadata.get("tokens_used") or {}).get("completion_tokens"))
+            except Exception as e:
+                row["error"] = str(getattr(e, "detail", None) or e)
+            row["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        rows.append(row)
+        return row
+
+    previous = []
+    for tick in range(params["ticks"]):
+        # 1. 选出本步提问的媒体（同 ask-one-media，可一步多家），上一步的提问作为背景
+        askers = rng.sample(medias, min(params["questions_per_tick"], len(medias)))
+        context = params["context"]
+        if previous:
+            context = (context + "\n" if context else "") + "上一轮提问：" + " ".join(
+                f"【{agent_id}】{truncate(text, 80)}" for agent_id, text in previous)
+        questions = await asyncio.gather(*(generate(tick, "media", media_id, context) for media_id in askers))
+
+        # 2. 用户对本步的提问发表评论
+        reactions = []
+        for question in questions:
+            if question.get("error") or not users:
+                continue
+            reply_context = f"{question['agent_id']}记者在发布会上提问：{question['content']}"
+            for user_id in rng.sample(users, min(params["users_per_question"], len(users))):
+                reactions.append(generate(tick, "user", user_id, reply_context, in_reply_to=question["agent_id"]))
+        await asyncio.gather(*reactions)
+
+        # 3. 进入下一步
+        previous = [(q["agent_id"], q["content"]) for q in questions if not q.get("error")]
+
+    if api_server.content_store is not None:
+        api_server.content_store.flush()
+    return rows
+
+
+def execute_run(run, output_dir, concurrency):
+    """工作进程中执行一次运行并写出结果表，返回统计"""
+    started = time.perf_counter()
+    rows = asyncio.run(simulate(run, concurrency))
+    path = result_path(output_dir, run)
+    columns = RESULT_COLUMNS + sorted(run["variables"])
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for row in sorted(rows, key=lambda r: (r["tick"], r["agent_type"] != "media", r["agent_id"])):
+            writer.writerow({**table_values(run["variables"]), **row})
+    os.replace(tmp_path, path)
+    return {
+        "run": run["run"],
+        "repetition": run["repetition"],
+        "rows": len(rows),
+        "errors": sum(1 for row in rows if row.get("error")),
+        "cache_hits": sum(1 for row in rows if row.get("cache")),
+        "duration_s": round(time.perf_counter() - started, 2),
+        "file": os.path.basename(path)
+    }
+
+
+def write_index(output_dir, runs, stats):
+    """汇总表：每次运行一行（参数 + 统计），未完成的运行统计为空"""
+    variable_names = sorted({name for run in runs for name in run["variables"]})
+    tmp_path = f"{index_path(output_dir)}.tmp"
+    with open(tmp_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=INDEX_COLUMNS + variable_names, extrasaction="ignore")
+        writer.writeheader()
+        for run in runs:
+            writer.writerow({**table_values(run["variables"]), "run": run["run"], "repetition": run["repetition"],
+                             **stats.get(run["run"], {})})
+    os.replace(tmp_path, index_path(output_dir))
+
+
+def run_signature(runs):
+    """决定运行结果的部分：编号、重复序号、随机种子与参数"""
+    return [(run["run"], run["repetition"], run["seed"], json.dumps(run["params"], sort_keys=True, ensure_ascii=False))
+            for run in runs]
+
+
+def check_output_dir(output_dir, runs):
+    """目录中已有运行结果时，要求其 experiment.json 展开的运行与本次一致"""
+    if not any(os.path.exists(result_path(output_dir, run)) for run in runs):
+        return
+    path = os.path.join(output_dir, "experiment.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            stored = expand_experiment(json.load(f))
+    except (OSError, ValueError) as e:
+        raise ValueError(f"结果目录 {output_dir} 已有运行结果，但无法读取其实验配置（{e}），请使用新的结果目录")
+    if run_signature(stored) != run_signature(runs):
+        raise ValueError(f"结果目录 {output_dir} 中的实验配置与本次不同，已有结果的运行编号对应的参数已改变，"
+                         f"请使用新的结果目录")
+
+
+def run_experiment(experiment, output_dir, processes, concurrency, env):
+    runs = expand_experiment(experiment)
+    os.makedirs(output_dir, exist_ok=True)
+    check_output_dir(output_dir, runs)
+    with open(os.path.join(output_dir, "experiment.json"), "w", encoding="utf-8") as f:
+        json.dump(experiment, f, ensure_ascii=False, indent=2)
+
+    previous = load_index(output_dir)
+    stats = {}
+    pending = []
+    for run in runs:
+        if os.path.exists(result_path(output_dir, run)):
+            stats[run["run"]] = previous.get(run["run"]) or {"file": os.path.basename(result_path(output_dir, run))}
+        else:
+            pending.append(run)
+    print(f"共 {len(runs)} 次运行，已完成 {len(runs) - len(pending)}，本次运行 {len(pending)}（{processes} 个进程）",
+          file=sys.stderr)
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker, initargs=(env,)) as pool:
+        futures = {pool.submit(execute_run, run, output_dir, concurrency): run for run in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            run = futures[future]
+            try:
+                stats[run["run"]] = future.result()
+                result = stats[run["run"]]
+                print(f"[{done}/{len(pending)}] 运行 {run['run']}: {result['rows']} 行, 错误 {result['errors']}, "
+                      f"缓存命中 {result['cache_hits']}, {result['duration_s']}s", file=sys.stderr)
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{len(pending)}] 运行 {run['run']} 失败: {e}", file=sys.stderr)
+            write_index(output_dir, runs, stats)
+    write_index(output_dir, runs, stats)
+    return len(pending) - failed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无界面仿真运行器（BehaviorSpace式参数扫描，进程池并行）")
+    parser.add_argument("experiment", nargs="?", help="实验配置JSON文件")
+    parser.add_argument("--output", default="simulation_runs", help="结果目录（默认 simulation_runs）")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="进程数（默认CPU核数）")
+    parser.add_argument("--concurrency", type=int, default=8, help="每次运行同时进行的生成请求数（默认8）")
+    parser.add_argument("--cache-ttl", type=float, default=7 * 86400,
+                        help="共享生成缓存有效期（秒，默认7天，0表示不缓存）")
+    parser.add_argument("--topic", action="append", default=[], help="议题（可重复，未给出配置文件时使用）")
+    parser.add_argument("--temperature", type=float, action="append", default=[], help="温度（可重复）")
+    parser.add_argument("--ticks", type=int, help="仿真步数")
+    parser.add_argument("--repetitions", type=int, default=1, help="每个参数组合的重复次数")
+    parser.add_argument("--dry-run", action="store_true", help="只列出展开后的运行")
+    args = parser.parse_args()
+
+    if args.experiment:
+        with open(args.experiment, "r", encoding="utf-8") as f:
+            experiment = json.load(f)
+    elif args.topic:
+        experiment = {"name": "cli", "repetitions": args.repetitions, "constants": {}, "variables": {"topic": args.topic}}
+    else:
+        parser.error("需要实验配置文件或 --topic")
+    if args.temperature:
+        experiment.setdefault("variables", {})["temperature"] = args.temperature
+    if args.ticks is not None:
+        experiment.setdefault("constants", {})["ticks"] = args.ticks
+
+    try:
+        runs = expand_experiment(experiment)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.dry_run:
+        for run in runs:
+            print(json.dumps({"run": run["run"], "repetition": run["repetition"], **run["variables"]},
+                             ensure_ascii=False))
+        return
+
+    # 工作进程不启动服务，关闭仅服务端使用的功能；共享缓存与服务器默认使用同一文件
+    env = {"GENERATION_CACHE_TTL": str(args.cache_ttl), "JOB_WORKERS": "0", "PROVIDER_WARMUP": "false"}
+    start = time.time()
+    try:
+        completed, failed = run_experiment(experiment, args.output, max(1, args.processes),
+                                           max(1, args.concurrency), env)
+    except ValueError as e:
+        parser.error(str(e))
+    except KeyboardInterrupt:
+        print("\n已中断，已完成的运行结果已写出，重新运行相同命令即可继续", file=sys.stderr)
+        sys.exit(130)
+    print(f"完成: {completed} 次运行, 失败 {failed}, 耗时 {time.time() - start:.1f}s，结果目录 {args.output}",
+          file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+生成内容立场打分
+纯CPU的词典线性模型：文本中的立场提示词（字符 n 元组）计数 × 权重矩阵 → softmax 得到
+aligned / counter / neutral 三项得分（三项之和为 1），最高项为立场标签；
+同时按关键词粗分议题类别（与档案 issue_distribution 的类别一致）
+
+注意：得分是三类之间的相对概率，与档案中 avg_*_score（三项各自独立的相似度，之和通常大于 1）不同口径，
+回写档案在线统计时只使用立场标签与议题类别
+
+批量打分时所有提示词编译为一个正则（长词优先，"不支持"先于"支持"匹配），每条文本扫描一次，
+命中以 (文本, 词) 坐标列表保存（稀疏形式），按文本累加命中词的权重得到全部得分，内存与命中数成正比，与词典大小无关
+
+词典可通过 JSON 文件替换（如用标注数据训练得到的线性模型权重）：
+    {"bias": [a, c, n], "terms": {"词": [a, c, n], ...}, "issues": {"类别": ["关键词", ...], ...}}
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+STANCE_LABELS = ("Aligned", "Counter", "Neutral")
+
+# (一致, 对立, 中立) 权重
+DEFAULT_BIAS = (0.0, 0.0, 0.6)
+DEFAULT_TERMS: Dict[str, Sequence[float]] = {
+    # 一致立场：认同、支持、合作导向
+    "一个中国原则": (2.0, 0.0, 0.0),
+    "一个中国政策": (1.2, 0.0, 0.2),
+    "九二共识": (1.5, 0.0, 0.0),
+    "和平统一": (1.8, 0.0, 0.0),
+    "祖国统一": (1.8, 0.0, 0.0),
+    "两岸同胞": (1.2, 0.0, 0.0),
+    "反对台独": (2.0, 0.0, 0.0),
+    "台独分裂": (1.5, 0.2, 0.0),
+    "外部势力": (1.2, 0.0, 0.0),
+    "干涉中国内政": (1.8, 0.0, 0.0),
+    "内政": (0.8, 0.0, 0.0),
+    "坚定支持": (1.5, 0.0, 0.0),
+    "支持": (0.6, 0.0, 0.0),
+    "赞赏": (1.0, 0.0, 0.0),
+    "共识": (0.8, 0.0, 0.0),
+    "合作": (0.6, 0.0, 0.1),
+    "共赢": (1.0, 0.0, 0.0),
+    "友好": (0.8, 0.0, 0.0),
+    "积极": (0.5, 0.0, 0.1),
+    "维护": (0.6, 0.0, 0.0),
+    "主权和领土完整": (1.8, 0.0, 0.0),
+    "国际社会普遍": (1.0, 0.0, 0.0),
+    "挑衅": (0.8, 0.4, 0.0),
+    # 对立立场：质疑、挑战、施压导向
+    "不支持": (0.0, 1.0, 0.0),
+    "质疑": (0.0, 1.5, 0.0),
+    "批评": (0.0, 1.2, 0.0),
+    "指责": (0.0, 1.2, 0.0),
+    "担忧": (0.0, 1.0, 0.1),
+    "担心": (0.0, 1.0, 0.1),
+    "施压": (0.0, 1.5, 0.0),
+    "胁迫": (0.0, 1.8, 0.0),
+    "威胁": (0.0, 1.2, 0.0),
+    "恐吓": (0.0, 1.5, 0.0),
+    "军事压力": (0.0, 1.5, 0.0),
+    "武力": (0.0, 1.0, 0.0),
+    "紧张局势": (0.0, 0.8, 0.2),
+    "升级": (0.0, 0.6, 0.1),
+    "台湾人民的意愿": (0.0, 1.5, 0.0),
+    "民主": (0.0, 0.8, 0.0),
+    "人权": (0.0, 1.0, 0.0),
+    "自由": (0.0, 0.6, 0.0),
+    "现状": (0.0, 0.6, 0.2),
+    "单方面改变": (0.0, 1.2, 0.0),
+    "是否意味着": (0.0, 0.8, 0.3),
+    "难道": (0.0, 1.0, 0.0),
+    "为何": (0.0, 0.6, 0.2),
+    "如何回应": (0.0, 0.8, 0.3),
+    "有人认为": (0.0, 0.8, 0.2),
+    "被指": (0.0, 1.0, 0.0),
+    "制裁": (0.0, 0.8, 0.2),
+    # 中立：信息询问导向
+    "请问": (0.0, 0.0, 0.4),
+    "能否介绍": (0.0, 0.0, 1.2),
+    "介绍一下": (0.0, 0.0, 1.0),
+    "具体": (0.0, 0.0, 0.6),
+    "进展": (0.0, 0.0, 0.8),
+    "安排": (0.0, 0.0, 0.8),
+    "情况": (0.0, 0.0, 0.5),
+    "细节": (0.0, 0.0, 0.8),
+    "时间表": (0.0, 0.0, 0.8),
+    "是否有": (0.0, 0.1, 0.6),
+    "评论": (0.0, 0.1, 0.5),
+    "看法": (0.0, 0.1, 0.5),
+}
+
+# 议题类别关键词（类别名与 agents_data/convert_media_data.py 的 ISSUE_COLUMNS 一致，未命中记为"其他"）
+DEFAULT_ISSUES: Dict[str, Sequence[str]] = {
+    "EI_1_外国政府涉台立法": ("法案", "立法", "国会", "议会", "通过"),
+    "EI_2_外国政要涉台表态或访问": ("访台", "窜访", "访问台湾", "政要", "议员", "表态", "过境"),
+    "EI_3_国际组织涉台表述": ("世卫", "世界卫生大会", "联合国", "国际组织", "国际民航", "2758"),
+    "EI_5_外媒涉台报道争议": ("报道", "媒体", "外媒", "社论", "记者"),
+    "MS_1_外国军舰军机穿越台海": ("军舰", "军机", "驱逐舰", "穿越", "过航", "巡航", "台湾海峡", "海峡"),
+    "MS_2_对台军售或军事援助": ("军售", "售台", "武器", "军事援助", "导弹", "战机"),
+}
+OTHER_CATEGORY = "其他"
+
+
+class StanceScorer:
+    """词典线性立场打分器"""
+
+    def __init__(self, terms: Optional[Mapping[str, Sequence[float]]] = None,
+                 bias: Optional[Sequence[float]] = None,
+                 issues: Optional[Mapping[str, Sequence[str]]] = None):
+        terms = dict(DEFAULT_TERMS if terms is None else terms)
+        issues = dict(DEFAULT_ISSUES if issues is None else issues)
+        self.vocabulary = sorted(terms, key=len, reverse=True)
+        self.term_index = {term: i for i, term in enumerate(self.vocabulary)}
+        self.weights = np.array([terms[term] for term in self.vocabulary], dtype=np.float64).reshape(-1, 3)
+        self.bias = np.array(DEFAULT_BIAS if bias is None else bias, dtype=np.float64)
+        self.pattern = re.compile("|".join(re.escape(term) for term in self.vocabulary)) if self.vocabulary else None
+
+        self.issue_names = list(issues)
+        keyword_issue = {}
+        for i, name in enumerate(self.issue_names):
+            for keyword in issues[name]:
+                keyword_issue.setdefault(keyword, i)
+        self.keyword_issue = keyword_issue
+        keywords = sorted(keyword_issue, key=len, reverse=True)
+        self.issue_pattern = re.compile("|".join(re.escape(k) for k in keywords)) if keywords else None
+
+    @classmethod
+    def from_file(cls, path: str) -> "StanceScorer":
+        """从 JSON 词典文件创建（缺省的部分使用内置词典）"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(terms=data.get("terms"), bias=data.get("bias"), issues=data.get("issues"))
+
+    @staticmethod
+    def _hits(pattern, index: Mapping[str, int], texts: Sequence[str]):
+        """每条文本扫描一次，返回命中的 (文本行号, 词序号) 坐标数组"""
+        rows, cols = [], []
+        if pattern is not None:
+            for row, text in enumerate(texts):
+                hits = [index[match] for match in pattern.findall(text)]
+                rows.extend([row] * len(hits))
+                cols.extend(hits)
+        return np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+
+    def score_batch(self, texts: Sequence[str]) -> List[Dict[str, Any]]:
+        """批量打分，返回每条文本的立场标签、三项得分与议题类别"""
+        if not texts:
+            return []
+        n = len(texts)
+        rows, cols = self._hits(self.pattern, self.term_index, texts)
+        # 稀疏计数 × 权重：按行累加每个命中词的权重
+        hit_weights = self.weights[cols]
+        # 没有任何命中时 bincount 返回整数数组，统一转为浮点
+        logits = np.column_stack([np.bincount(rows, weights=hit_weights[:, k], minlength=n)
+                                  for k in range(3)]).astype(np.float64)
+        logits += self.bias
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        labels = probs.argmax(axis=1)
+        matched = np.bincount(rows, minlength=n)
+
+        # 议题类别数很少，按 文本 × 类别 直接计数
+        width = len(self.issue_names)
+        issue_rows, issue_cols = self._hits(self.issue_pattern, self.keyword_issue, texts)
+        issue_counts = np.bincount(issue_rows * width + issue_cols, minlength=n * width).reshape(n, width) \
+            if width else np.zeros((n, 0))
+        issue_best = issue_counts.argmax(axis=1) if self.issue_names else np.zeros(len(texts), dtype=np.int64)
+        issue_hit = issue_counts.max(axis=1) > 0 if self.issue_names else np.zeros(len(texts), dtype=bool)
+
+        probs = np.round(probs, 4).tolist()
+        return [
+            {
+                "stance_label": STANCE_LABELS[label],
+                "aligned_score": p[0],
+                "counter_score": p[1],
+                "neutral_score": p[2],
+                "matched_terms": int(n),
+                "issue_category": self.issue_names[issue] if hit else OTHER_CATEGORY
+            }
+            for label, p, n, issue, hit in zip(labels.tolist(), probs, matched.tolist(),
+                                               issue_best.tolist(), issue_hit.tolist())
+        ]
+
+    def score(self, text: str) -> Dict[str, Any]:
+        return self.score_batch([text])[0]
+
+
+def self_check() -> bool:
+    """检查边界情况：没有命中任何提示词的文本（含空文本）得到只由偏置决定的中立结果"""
+    scorer = StanceScorer()
+    results = scorer.score_batch(["今天天气不错", ""])
+    ok = True
+    for text, result in zip(["今天天气不错", ""], results):
+        passed = result["stance_label"] == "Neutral" and result["matched_terms"] == 0
+        ok = ok and passed
+        print(f"{'✓' if passed else '✗'} {text!r}: {result}")
+    mixed = scorer.score_batch(["今天天气不错", "请问能否介绍一下进展"])
+    passed = mixed[0] == results[0] and mixed[1]["matched_terms"] > 0
+    ok = ok and passed
+    print(f"{'✓' if passed else '✗'} 与有命中的文本同批打分时结果不变")
+    return ok
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(0 if self_check() else 1)
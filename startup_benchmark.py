@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+启动耗时基准
+多次冷启动测量 api_server 的模块导入耗时与服务就绪耗时，可与基线结果比较以发现启动退化
+
+用法:
+    python startup_benchmark.py --runs 5
+    python startup_benchmark.py --runs 5 --output startup.json
+    python startup_benchmark.py --runs 5 --baseline startup.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_SNIPPET = (
+    "import time, json; t = time.perf_counter(); import api_server; "
+    "print(json.dumps({'import_ms': (time.perf_counter() - t) * 1000, "
+    "'phases': api_server.STARTUP_PHASES}))"
+)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import(env):
+    """子进程中冷导入 api_server，返回(进程总耗时, 模块导入耗时)，单位毫秒"""
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    wall_ms = (time.perf_counter() - start) * 1000
+    data = json.loads(output.strip().splitlines()[-1])
+    return wall_ms, data["import_ms"]
+
+
+def measure_ready(env, timeout):
+    """启动服务并轮询 /startup 直到就绪，返回(从启动进程到就绪的耗时, 服务端记录的各阶段耗时)"""
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api_server:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = start + timeout
+        while time.perf_counter() < deadline:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/startup", timeout=1) as response:
+                    info = json.load(response)
+                if info.get("ready"):
+                    return (time.perf_counter() - start) * 1000, info["phases"]
+            except OSError:
+                pass
+            if process.poll() is not None:
+                raise RuntimeError(f"服务进程异常退出，退出码: {process.returncode}")
+            time.sleep(0.02)
+        raise TimeoutError(f"服务在 {timeout}s 内未就绪")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def summarize(values):
+    return {
+        "median": round(statistics.median(values), 1),
+        "min": round(min(values), 1),
+        "max": round(max(values), 1)
+    }
+
+
+def run_benchmark(runs, timeout):
+    env = dict(os.environ)
+    # 后台预热客户端不计入就绪耗时，关闭以免干扰测量
+    env.setdefault("PROVIDER_WARMUP", "false")
+    env.setdefault("JOB_WORKERS", "0")
+
+    import_wall, import_module, ready_wall = [], [], []
+    phases = {}
+    for i in range(runs):
+        wall_ms, import_ms = measure_import(env)
+        import_wall.append(wall_ms)
+        import_module.append(import_ms)
+        ready_ms, server_phases = measure_ready(env, timeout)
+        ready_wall.append(ready_ms)
+        for name, value in server_phases.items():
+            phases.setdefault(name, []).append(value)
+        print(f"第 {i + 1}/{runs} 次: 导入 {import_ms:.0f}ms (进程 {wall_ms:.0f}ms), 就绪 {ready_ms:.0f}ms",
+              file=sys.stderr)
+
+    return {
+        "runs": runs,
+        "python": sys.version.split()[0],
+        "import_process_ms": summarize(import_wall),
+        "import_module_ms": summarize(import_module),
+        "ready_ms": summarize(ready_wall),
+        "server_phases_ms": {name: summarize(values) for name, values in phases.items()}
+    }
+
+
+def compare_with_baseline(result, baseline, tolerance):
+    """与基线比较中位数，超出容差的指标视为退化"""
+    regressions = []
+    for metric in ("import_module_ms", "ready_ms"):
+        current = result[metric]["median"]
+        previous = baseline.get(metric, {}).get("median")
+        if previous and current > previous * (1 + tolerance):
+            regressions.append(f"{metric}: {previous}ms -> {current}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="api_server 启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="冷启动次数（默认5）")
+    parser.add_argument("--timeout", type=float, default=60, help="单次等待就绪的超时秒数")
+    parser.add_argument("--output", help="将结果写入JSON文件（可作为后续比较的基线）")
+    parser.add_argument("--baseline", help="基线结果JSON文件")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="相对基线允许的增幅（默认0.2）")
+    args = parser.parse_args()
+
+    result = run_benchmark(max(1, args.runs), args.timeout)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_with_baseline(result, json.load(f), args.tolerance)
+        if regressions:
+            print("启动耗时退化: " + "; ".join(regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+线上流量录制
+ASGI中间件记录每个请求的到达时间、方法、路径、查询参数、请求体与响应状态/耗时，写入 gzip 压缩的 JSONL 轨迹文件，
+供 trace_replay.py 按原始时间间隔回放
+
+- 请求线程只把记录放入内存队列，由后台线程写出；队列满时丢弃并计数，不阻塞请求处理
+- 不记录请求头；请求体中 redact_fields 指定的字段（任意嵌套层级）替换为等长的占位符，保留负载大小
+- 流式响应的耗时记到最后一个分片发出为止，另记首字节耗时
+
+轨迹格式：第一行为文件头 {"trace": 1, "started_at": 时间戳}，其后每行一个请求：
+    {"t": 相对开始的秒数, "method": ..., "path": ..., "query": ..., "body": ..., "status": ..,
+     "latency_ms": .., "ttfb_ms": .., "response_bytes": ..}
+"""
+
+import gzip
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+REDACTED_CHAR = "*"
+DEFAULT_REDACT_FIELDS = ("api_key", "token", "password", "secret", "admin_token")
+
+
+def redact(value: Any, fields: frozenset) -> Any:
+    """替换需要脱敏的字段：字符串替换为等长占位符，其他类型替换为 None"""
+    if isinstance(value, dict):
+        return {
+            key: ((REDACTED_CHAR * len(item) if isinstance(item, str) else None) if key in fields
+                  else redact(item, fields))
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item, fields) for item in value]
+    return value
+
+
+def read_trace(path: str) -> Iterator[Dict[str, Any]]:
+    """逐条读取轨迹文件中的请求记录（支持 gzip 与未压缩文件）
+
+    每条记录附加 "at"（按文件头换算的绝对时间戳），多个进程的轨迹可据此合并
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    started_at = 0.0
+    with opener(path, "rt", encoding="utf-8") as f:
+        lines = iter(f)
+        while True:
+            try:
+                line = next(lines)
+            except StopIteration:
+                return
+            except EOFError:
+                # 录制中（或异常退出）的文件末尾压缩流不完整，读到已落盘的部分为止
+                return
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                return
+            if "trace" in record:
+                started_at = record.get("started_at", 0.0)
+                continue
+            record["at"] = started_at + record["t"]
+            yield record
+
+
+class TraceRecorder:
+    """轨迹写出器（后台线程，gzip JSONL）"""
+
+    def __init__(self, path: str, redact_fields: Iterable[str] = DEFAULT_REDACT_FIELDS,
+                 exclude_paths: Iterable[str] = (), max_body_bytes: int = 1 << 20, queue_size: int = 10000):
+        self.path = path
+        self.redact_fields = frozenset(redact_fields)
+        self.exclude_paths = tuple(exclude_paths)
+        self.max_body_bytes = max_body_bytes
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.recorded = 0
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+
+    def wants(self, path: str) -> bool:
+        return not path.startswith(self.exclude_paths) if self.exclude_paths else True
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-recorder", daemon=True)
+            self._thread.start()
+            logger.info(f"流量录制已开启: {self.path}")
+
+    def record(self, entry: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with opener(self.path, "at", encoding="utf-8") as f:
+            f.write(json.dumps({"trace": 1, "started_at": self.started_at}) + "\n")
+            while True:
+                entry = self._queue.get()
+                if entry is None:
+                    break
+                try:
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+                    self.recorded += 1
+                except (TypeError, ValueError) as e:
+                    logger.warning(f"轨迹记录序列化失败: {e}")
+                # 队列暂时为空时落盘，保证异常退出时丢失的记录有限
+                if self._queue.empty():
+                    f.flush()
+
+    def close(self):
+        """写出队列中剩余的记录并关闭文件"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def body_for(self, raw: bytes, size: int) -> Any:
+        """请求体：JSON按字段脱敏，非JSON或超出长度的只记录大小"""
+        if not size:
+            return None
+        if size > len(raw):
+            return {"_bytes": size, "_truncated": True}
+        try:
+            return redact(json.loads(raw), self.redact_fields)
+        except ValueError:
+            return {"_bytes": len(raw)}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "recorded": self.recorded, "dropped": self.dropped,
+                "queued": self._queue.qsize()}
+
+
+class TraceMiddleware:
+    """纯ASGI中间件（不缓冲响应，流式接口不受影响）"""
+
+    def __init__(self, app, recorder: TraceRecorder):
+        self.app = app
+        self.recorder = recorder
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.recorder.wants(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        recorder = self.recorder
+        started = time.perf_counter()
+        body = bytearray()
+        state = {"status": None, "ttfb": None, "bytes": 0, "body_bytes": 0}
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                state["body_bytes"] += len(chunk)
+                if state["body_bytes"] <= recorder.max_body_bytes:
+                    body.extend(chunk)
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                if state["ttfb"] is None:
+                    state["ttfb"] = time.perf_counter()
+                state["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            finished = time.perf_counter()
+            recorder.record({
+                "t": round(started - recorder.started, 6),
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "body": recorder.body_for(bytes(body), state["body_bytes"]),
+                "status": state["status"] or 500,
+                "latency_ms": round((finished - started) * 1000, 2),
+                "ttfb_ms": round((state["ttfb"] - started) * 1000, 2) if state["ttfb"] else None,
+                "response_bytes": state["bytes"]
+            })
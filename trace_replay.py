@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+流量回放
+按录制的时间间隔将轨迹（trace_recorder 写出的 JSONL/gzip 文件，可多个，按绝对时间合并）中的请求重新发往服务，
+统计各接口的延迟分位数、吞吐量与状态码，并与录制时的延迟对比
+
+用法:
+    python trace_replay.py trace.jsonl.gz --target http://127.0.0.1:8000              # 原速回放
+    python trace_replay.py trace.jsonl.gz --speed 4                                     # 4倍速
+    python trace_replay.py trace-*.jsonl.gz --speed 0 --concurrency 32                  # 尽快发出
+    python trace_replay.py trace.jsonl.gz --output replay.json
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import httpx
+
+from trace_recorder import read_trace
+
+# 路径中的标识段归并为模板，便于按接口统计
+ID_SEGMENTS = {"media": 1, "user": 1, "jobs": 1}
+
+
+def endpoint_of(method, path):
+    """按接口归类：/media/人民日报/stats -> POST /media/{id}/stats"""
+    parts = path.strip("/").split("/")
+    if parts and parts[0] in ID_SEGMENTS and len(parts) > ID_SEGMENTS[parts[0]]:
+        parts[ID_SEGMENTS[parts[0]]] = "{id}"
+    return f"{method} /" + "/".join(parts)
+
+
+def percentiles(values):
+    """延迟分位数（最近秩法），单位毫秒"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+
+    return {"count": len(ordered), "p50": rank(0.5), "p90": rank(0.9), "p95": rank(0.95),
+            "p99": rank(0.99), "max": round(ordered[-1], 1)}
+
+
+def load_records(paths, limit=None, prefixes=()):
+    """读取并按绝对时间合并多个轨迹文件，跳过请求体超出录制上限的记录"""
+    records, skipped = [], 0
+    for path in paths:
+        for record in read_trace(path):
+            if prefixes and not record["path"].startswith(tuple(prefixes)):
+                continue
+            body = record.get("body")
+            if isinstance(body, dict) and "_bytes" in body:
+                skipped += 1
+                continue
+            records.append(record)
+    records.sort(key=lambda r: r["at"])
+    return (records[:limit] if limit else records), skipped
+
+
+async def replay(records, target, speed, concurrency, timeout):
+    """回放请求：speed>0 时按原始时间间隔/speed 发出，speed=0 时在并发上限内尽快发出"""
+    results = []
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=target, timeout=timeout, limits=limits) as client:
+        async def send(record, scheduled):
+            async with semaphore:
+                started = time.perf_counter()
+                lag = (started - scheduled) * 1000 if scheduled is not None else 0.0
+                try:
+                    response = await client.request(
+                        record["method"], record["path"] + (f"?{record['query']}" if record.get("query") else ""),
+                        json=record.get("body")
+                    )
+                    status, error = response.status_code, None
+                except httpx.HTTPError as e:
+                    status, error = None, type(e).__name__
+                results.append({
+                    "endpoint": endpoint_of(record["method"], record["path"]),
+                    "status": status,
+                    "error": error,
+                    "latency_ms": (time.perf_counter() - started) * 1000,
+                    "recorded_ms": record.get("latency_ms"),
+                    "recorded_status": record.get("status"),
+                    "lag_ms": lag
+                })
+
+        tasks = []
+        start = time.perf_counter()
+        origin = records[0]["at"] if records else 0.0
+        for record in records:
+            scheduled = None
+            if speed > 0:
+                scheduled = start + (record["at"] - origin) / speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(record, scheduled)))
+        await asyncio.gather(*tasks)
+        duration = time.perf_counter() - start
+    return results, duration
+
+
+def build_report(results, duration, speed, recorded_span):
+    endpoints = {}
+    for item in results:
+        endpoints.setdefault(item["endpoint"], []).append(item)
+
+    def summary(items):
+        statuses = {}
+        for item in items:
+            key = str(item["status"]) if item["status"] is not None else item["error"]
+            statuses[key] = statuses.get(key, 0) + 1
+        recorded = [item["recorded_ms"] for item in items if item["recorded_ms"] is not None]
+        return {
+            "requests": len(items),
+            "errors": sum(1 for item in items if item["status"] is None or item["status"] >= 400),
+            "status_changed": sum(1 for item in items if item["status"] != item["recorded_status"]),
+            "statuses": statuses,
+            "latency_ms": percentiles([item["latency_ms"] for item in items]),
+            "recorded_latency_ms": percentiles(recorded)
+        }
+
+    return {
+        "speed": speed if speed > 0 else "max",
+        "duration_s": round(duration, 2),
+        "recorded_span_s": round(recorded_span, 2),
+        "throughput_rps": round(len(results) / duration, 2) if duration > 0 else None,
+        "dispatch_lag_ms": percentiles([item["lag_ms"] for item in results]) if speed > 0 else None,
+        "total": summary(results),
+        "endpoints": {name: summary(items) for name, items in sorted(endpoints.items())}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按录制的时间间隔回放流量轨迹并统计延迟与吞吐量")
+    parser.add_argument("traces", nargs="+", help="轨迹文件（.jsonl 或 .jsonl.gz，可多个）")
+    parser.add_argument("--target", default="http://127.0.0.1:8000", help="服务地址（默认 http://127.0.0.1:8000）")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速（默认1，0表示尽快发出）")
+    parser.add_argument("--concurrency", type=int, default=256, help="同时进行的请求数上限（默认256）")
+    parser.add_argument("--timeout", type=float, default=120, help="单个请求的超时秒数")
+    parser.add_argument("--limit", type=int, help="只回放前N条请求")
+    parser.add_argument("--path", action="append", default=[], help="只回放以该前缀开头的路径（可重复）")
+    parser.add_argument("--output", help="将报告写入JSON文件")
+    args = parser.parse_args()
+
+    records, skipped = load_records(args.traces, args.limit, args.path)
+    if not records:
+        print("轨迹中没有可回放的请求", file=sys.stderr)
+        sys.exit(1)
+    span = records[-1]["at"] - records[0]["at"]
+    print(f"回放 {len(records)} 条请求（录制跨度 {span:.1f}s，跳过 {skipped} 条），目标 {args.target}，"
+          f"{'尽快发出' if args.speed <= 0 else f'{args.speed:g}倍速'}", file=sys.stderr)
+
+    try:
+        results, duration = asyncio.run(replay(records, args.target, max(0.0, args.speed),
+                                               max(1, args.concurrency), args.timeout))
+    except KeyboardInterrupt:
+        print("\n已中断", file=sys.stderr)
+        sys.exit(130)
+
+    report = build_report(results, duration, args.speed, span)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()